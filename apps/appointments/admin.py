@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment
+from .models import Appointment, AppointmentSeries
 
 
 @admin.register(Appointment)
@@ -12,13 +12,25 @@ class AppointmentAdmin(admin.ModelAdmin):
     ordering = ['appointment_date', 'appointment_time']
     
     def get_services_display(self, obj):
-        return obj.get_services_list()
+        return obj.services_summary
     get_services_display.short_description = 'Services'
     
     def get_total_duration(self, obj):
-        duration = obj.calculate_total_duration()
+        duration = obj.total_duration_minutes
         return f"{duration} min" if duration else "0 min"
     get_total_duration.short_description = 'Duration'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('client', 'team_member').prefetch_related('services')
+        return super().get_queryset(request).select_related('client', 'team_member')
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ['client', 'team_member', 'frequency', 'start_date', 'appointment_time', 'until', 'count', 'materialized_until', 'is_active']
+    list_filter = ['frequency', 'is_active', 'team_member']
+    search_fields = ['client__name', 'team_member__name']
+    filter_horizontal = ['services']
+    readonly_fields = ['materialized_until']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('client', 'team_member')
@@ -0,0 +1,234 @@
+"""
+Bitmap availability engine.
+
+Each team member's day is a 1440-bit integer where bit ``m`` is set when
+minute ``m`` after midnight is occupied by an active appointment. Python
+integers are arbitrary precision, so OR-ing appointments together, masking
+opening hours and finding every start where a service fits are a handful of
+whole-day bit operations instead of per-slot loops.
+
+The masks are materialized in ``TeamDayAvailability``: every appointment
+write refreshes the rows of the days it touches (see signals.py), so reads
+are a lookup on the (team_member, date) key and never recompute occupancy
+from the appointments.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ACTIVE_STATUSES, Appointment, TeamDayAvailability
+
+
+MINUTES_PER_DAY = 24 * 60
+MASK_BYTES = MINUTES_PER_DAY // 8
+
+# Largest number of days loaded at once by iter_available_starts
+MAX_SEARCH_WINDOW_DAYS = 8
+
+
+def _minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def working_hours():
+    """Return (opening minute, closing minute, slot interval) from settings"""
+    opening = datetime.strptime(settings.SALON_OPENING_TIME, '%H:%M').time()
+    closing = datetime.strptime(settings.SALON_CLOSING_TIME, '%H:%M').time()
+    return _minute_of_day(opening), _minute_of_day(closing), settings.SALON_SLOT_INTERVAL_MINUTES
+
+
+def interval_mask(start_minute, end_minute):
+    """Bits set for minutes in [start_minute, end_minute), clipped to the day"""
+    start = max(start_minute, 0)
+    end = min(end_minute, MINUTES_PER_DAY)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def grid_mask(opening, closing, interval):
+    """Bits set at every candidate start time: opening, opening + interval, ..."""
+    mask = 0
+    for minute in range(opening, closing, interval):
+        mask |= 1 << minute
+    return mask
+
+
+def fitting_starts(free_mask, duration):
+    """
+    Bit ``p`` of the result is set when minutes ``p .. p + duration - 1`` are
+    all free. Each step doubles the verified run length, so this takes
+    O(log duration) shifts and ANDs.
+    """
+    fits = free_mask
+    span = 1
+    while span < duration:
+        step = min(span, duration - span)
+        fits &= fits >> step
+        span += step
+    return fits
+
+
+def iter_bits(mask):
+    """Yield the positions of set bits in increasing order"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def format_minute(minute):
+    return f'{minute // 60:02d}:{minute % 60:02d}'
+
+
+def available_starts(occupied_mask, duration, hours=None):
+    """Start minutes on the slot grid where ``duration`` minutes fit in opening hours"""
+    opening, closing, interval = hours or working_hours()
+    free = interval_mask(opening, closing) & ~occupied_mask
+    starts = fitting_starts(free, max(duration, 1)) & grid_mask(opening, closing, interval)
+    return list(iter_bits(starts))
+
+
+def encode_mask(mask):
+    return mask.to_bytes(MASK_BYTES, 'little')
+
+
+def decode_mask(data):
+    return int.from_bytes(data, 'little') if data else 0
+
+
+def _occupancy_from_appointments(appointments):
+    masks = defaultdict(int)
+    rows = appointments.filter(
+        status__in=ACTIVE_STATUSES,
+        total_duration_minutes__gt=0,
+    ).values_list('team_member_id', 'appointment_date', 'appointment_time', 'total_duration_minutes')
+
+    for team_member_id, appointment_date, appointment_time, duration in rows:
+        start = _minute_of_day(appointment_time)
+        masks[(team_member_id, appointment_date)] |= interval_mask(start, start + duration)
+    return masks
+
+
+def load_occupancy(team_member_ids, start_date, end_date):
+    """Stored occupancy masks for every (team_member_id, date) in the range"""
+    rows = TeamDayAvailability.objects.filter(
+        team_member_id__in=team_member_ids,
+        date__range=(start_date, end_date),
+    ).values_list('team_member_id', 'date', 'occupancy')
+    masks = defaultdict(int)
+    for team_member_id, date, occupancy in rows:
+        masks[(team_member_id, date)] = decode_mask(occupancy)
+    return masks
+
+
+def load_day_occupancy(team_member_id, date):
+    """Stored occupancy mask of one team member's day: a single key lookup"""
+    occupancy = (
+        TeamDayAvailability.objects
+        .filter(team_member_id=team_member_id, date=date)
+        .values_list('occupancy', flat=True)
+        .first()
+    )
+    return decode_mask(occupancy)
+
+
+def _keys_filter(keys):
+    dates_by_member = defaultdict(set)
+    for team_member_id, date in keys:
+        dates_by_member[team_member_id].add(date)
+    condition = Q()
+    for team_member_id, dates in dates_by_member.items():
+        condition |= Q(team_member_id=team_member_id, date__in=dates)
+    return condition
+
+
+def refresh_day_availability(keys):
+    """
+    Recompute the stored masks of the given (team_member_id, date) days.
+
+    The rows are created if needed and locked before the appointments are
+    read, so two concurrent writes on the same day serialize here and the
+    second one always sees the first one's appointment.
+    """
+    keys = {(team_member_id, date) for team_member_id, date in keys if team_member_id is not None}
+    if not keys:
+        return
+
+    with transaction.atomic():
+        TeamDayAvailability.objects.bulk_create(
+            [TeamDayAvailability(team_member_id=member, date=date, occupancy=encode_mask(0)) for member, date in keys],
+            ignore_conflicts=True,
+        )
+        rows = list(
+            TeamDayAvailability.objects.select_for_update()
+            .filter(_keys_filter(keys))
+            .order_by('team_member_id', 'date')
+        )
+
+        member_ids = {member for member, _ in keys}
+        dates = {date for _, date in keys}
+        masks = _occupancy_from_appointments(Appointment.objects.filter(
+            team_member_id__in=member_ids,
+            appointment_date__in=dates,
+        ))
+        now = timezone.now()
+        for row in rows:
+            row.occupancy = encode_mask(masks.get((row.team_member_id, row.date), 0))
+            row.updated_at = now
+        TeamDayAvailability.objects.bulk_update(rows, ['occupancy', 'updated_at'])
+
+
+def rebuild_day_availability(start_date, end_date, team_member_ids=None):
+    """Regenerate every stored mask in a date range from the appointments"""
+    appointments = Appointment.objects.filter(appointment_date__range=(start_date, end_date))
+    stored = TeamDayAvailability.objects.filter(date__range=(start_date, end_date))
+    if team_member_ids is not None:
+        appointments = appointments.filter(team_member_id__in=team_member_ids)
+        stored = stored.filter(team_member_id__in=team_member_ids)
+
+    with transaction.atomic():
+        stored.delete()
+        masks = _occupancy_from_appointments(appointments.exclude(team_member__isnull=True))
+        TeamDayAvailability.objects.bulk_create(
+            [
+                TeamDayAvailability(team_member_id=member, date=date, occupancy=encode_mask(mask))
+                for (member, date), mask in masks.items()
+            ],
+            batch_size=1000,
+        )
+    return len(masks)
+
+
+def iter_available_starts(team_member_ids, duration, first_day, last_day, earliest_minute=0):
+    """
+    Yield (date, start minute, team_member_id) in chronological order across
+    all the given team members, ties broken by their order in the list.
+
+    Occupancy is loaded in windows that start at one day and double up to
+    MAX_SEARCH_WINDOW_DAYS, so a search that finds what it needs early only
+    queries the first few days of the horizon. ``earliest_minute`` excludes
+    starts before that minute on ``first_day`` (e.g. times already past today).
+    """
+    hours = working_hours()
+    position = {team_member_id: index for index, team_member_id in enumerate(team_member_ids)}
+    day = first_day
+    window = 1
+    while day <= last_day:
+        window_end = min(day + timedelta(days=window - 1), last_day)
+        occupied = load_occupancy(team_member_ids, day, window_end)
+        while day <= window_end:
+            starts = [
+                (minute, position[team_member_id], team_member_id)
+                for team_member_id in team_member_ids
+                for minute in available_starts(occupied[(team_member_id, day)], duration, hours)
+                if day != first_day or minute >= earliest_minute
+            ]
+            for minute, _, team_member_id in sorted(starts):
+                yield day, minute, team_member_id
+            day += timedelta(days=1)
+        window = min(window * 2, MAX_SEARCH_WINDOW_DAYS)
@@ -0,0 +1,231 @@
+"""
+Batch booking.
+
+``book_appointments`` validates and inserts a list of appointments with a
+fixed number of queries regardless of the batch size: clients, team members,
+specialties and services are each loaded once into maps, conflicts are found
+by sorting the existing and requested intervals of every team member, and the
+rows and their services are written with ``bulk_create`` in one transaction,
+which also updates the availability bitmaps and the daily rollups (bulk
+inserts send no signals).
+
+The (team_member, date, time) unique key also covers cancelled and completed
+appointments, so the same query collects the slots taken by rows of any
+status and an item on one of them gets its own error rather than making the
+insert fail.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.services.models import Service
+from apps.team.models import Team
+from .availability import refresh_day_availability
+from .models import ACTIVE_STATUSES, Appointment, appointment_range, summarize_services
+from .rollups import apply_rollup_changes, rollup_state
+
+
+# Zero-length intervals still claim their start minute, like the
+# (team_member, date, time) unique constraint does
+MIN_INTERVAL = timedelta(minutes=1)
+
+
+SLOT_TAKEN_MESSAGE = (
+    "Já existe um agendamento (mesmo que cancelado ou concluído) deste profissional "
+    "nesse dia e horário."
+)
+
+
+def conflict_message(start, end):
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    return (
+        f"Conflito de agendamento. O profissional já tem um compromisso das "
+        f"{start.strftime('%H:%M')} às {end.strftime('%H:%M')}."
+    )
+
+
+class BookingResult:
+    def __init__(self):
+        self.created = []
+        self.errors = {}
+
+    def add_error(self, index, message):
+        self.errors.setdefault(index, []).append(message)
+
+
+def _load_references(items):
+    """Every client, active team member (with specialties) and active service the batch refers to"""
+    client_ids = {item['client'] for item in items}
+    team_ids = {item['team_member'] for item in items}
+    service_ids = {service_id for item in items for service_id in item['services']}
+
+    clients = set(Client.objects.filter(id__in=client_ids).values_list('id', flat=True))
+    teams = set(Team.objects.filter(id__in=team_ids, is_active=True).values_list('id', flat=True))
+    specialties = defaultdict(set)
+    for team_id, service_id in Team.specialties.through.objects.filter(team_id__in=teams).values_list(
+        'team_id', 'service_id'
+    ):
+        specialties[team_id].add(service_id)
+    services = Service.objects.filter(id__in=service_ids, is_active=True).in_bulk()
+    return clients, teams, specialties, services
+
+
+def _existing_intervals(keys, exclude_ids=()):
+    """
+    Per team member, the (start, end) of its active appointments around the
+    batch days sorted by start, and for each position the interval ending
+    last among those up to it; and the (team_member, date, time) slots taken
+    by appointments of any status, which the unique constraint reserves.
+    """
+    days_by_member = defaultdict(set)
+    for team_member_id, date in keys:
+        # Appointments of the previous day may run past midnight
+        days_by_member[team_member_id].update({date, date - timedelta(days=1)})
+
+    condition = Q()
+    for team_member_id, days in days_by_member.items():
+        condition |= Q(team_member_id=team_member_id, appointment_date__in=days)
+
+    intervals = defaultdict(list)
+    slots = set()
+    if days_by_member:
+        rows = Appointment.objects.filter(condition).exclude(id__in=exclude_ids).values_list(
+            'team_member_id', 'appointment_date', 'appointment_time', 'status', 'starts_at', 'ends_at'
+        )
+        for team_member_id, appointment_date, appointment_time, status, start, end in rows:
+            slots.add((team_member_id, appointment_date, appointment_time))
+            if status in ACTIVE_STATUSES and start is not None:
+                intervals[team_member_id].append((start, max(end, start + MIN_INTERVAL)))
+
+    existing = defaultdict(lambda: ([], []))
+    for team_member_id, member_intervals in intervals.items():
+        member_intervals.sort()
+        latest = []
+        for interval in member_intervals:
+            latest.append(interval if not latest or interval[1] > latest[-1][1] else latest[-1])
+        existing[team_member_id] = (member_intervals, latest)
+    return existing, slots
+
+
+def _overlapping_existing(existing, start, end):
+    """
+    The existing interval overlapping [start, end), if any: among the ones
+    starting before ``end`` (a bisect), the one ending last decides.
+    """
+    intervals, latest = existing
+    position = bisect_left(intervals, (end,))
+    if position and latest[position - 1][1] > start:
+        return latest[position - 1]
+    return None
+
+
+def check_conflicts(pending, result, exclude_ids=()):
+    """
+    Return the (index, appointment) pairs of ``pending`` that overlap neither
+    an existing appointment (other than ``exclude_ids``) nor an earlier
+    starting appointment of ``pending`` and whose slot is not taken by an
+    appointment of any status, recording an error for the others. One query,
+    then one sort per team member.
+    """
+    intervals, slots = _existing_intervals(
+        {(appointment.team_member_id, appointment.appointment_date) for _, appointment in pending},
+        exclude_ids,
+    )
+
+    by_member = defaultdict(list)
+    for index, appointment in pending:
+        end = max(appointment.ends_at, appointment.starts_at + MIN_INTERVAL)
+        by_member[appointment.team_member_id].append((appointment.starts_at, end, index, appointment))
+
+    accepted = []
+    for team_member_id, requested in by_member.items():
+        existing = intervals[team_member_id]
+        busy_until = None
+        blocking = None
+        for start, end, index, appointment in sorted(requested, key=lambda entry: (entry[0], entry[2])):
+            slot = (team_member_id, appointment.appointment_date, appointment.appointment_time)
+            if slot in slots:
+                result.add_error(index, SLOT_TAKEN_MESSAGE)
+                continue
+            overlap = _overlapping_existing(existing, start, end)
+            if overlap is None and busy_until is not None and start < busy_until:
+                overlap = blocking
+            if overlap is not None:
+                result.add_error(index, conflict_message(*overlap))
+                continue
+            accepted.append((index, appointment))
+            slots.add(slot)
+            if busy_until is None or end > busy_until:
+                busy_until, blocking = end, (appointment.starts_at, appointment.ends_at)
+    return sorted(accepted, key=lambda entry: entry[0])
+
+
+def book_appointments(items, atomic=False):
+    """
+    Validate and create appointments from already-parsed items (see
+    ``AppointmentBulkItemSerializer``). Items with errors are skipped; with
+    ``atomic=True`` a single error cancels the whole batch.
+    """
+    result = BookingResult()
+    clients, teams, specialties, services = _load_references(items)
+
+    pending = []
+    for index, item in enumerate(items):
+        if item['client'] not in clients:
+            result.add_error(index, "Cliente não encontrado.")
+        if item['team_member'] not in teams:
+            result.add_error(index, "Profissional não encontrado ou inativo.")
+        missing = [service_id for service_id in item['services'] if service_id not in services]
+        if missing:
+            result.add_error(index, f"Serviços não encontrados ou inativos: {missing}.")
+        if index in result.errors:
+            continue
+
+        item_services = [services[service_id] for service_id in dict.fromkeys(item['services'])]
+        if not {service.id for service in item_services}.issubset(specialties[item['team_member']]):
+            result.add_error(index, "O profissional selecionado não oferece todos os serviços solicitados.")
+            continue
+
+        duration, summary = summarize_services(item_services)
+        appointment = Appointment(
+            client_id=item['client'],
+            team_member_id=item['team_member'],
+            appointment_date=item['appointment_date'],
+            appointment_time=item['appointment_time'],
+            status=item['status'],
+            notes=item.get('notes'),
+            series_id=item.get('series'),
+            total_price=sum(service.price for service in item_services),
+            total_duration_minutes=duration,
+            services_summary=summary,
+        )
+        appointment.starts_at, appointment.ends_at = appointment_range(
+            appointment.appointment_date, appointment.appointment_time, duration
+        )
+        appointment._service_ids = [service.id for service in item_services]
+        pending.append((index, appointment))
+
+    accepted = check_conflicts(pending, result)
+    if (atomic and result.errors) or not accepted:
+        return result
+
+    appointments = [appointment for _, appointment in accepted]
+    with transaction.atomic():
+        Appointment.objects.bulk_create(appointments)
+        Appointment.services.through.objects.bulk_create([
+            Appointment.services.through(appointment_id=appointment.id, service_id=service_id)
+            for appointment in appointments
+            for service_id in appointment._service_ids
+        ])
+        refresh_day_availability(
+            (appointment.team_member_id, appointment.appointment_date) for appointment in appointments
+        )
+        apply_rollup_changes(added=[rollup_state(appointment) for appointment in appointments])
+
+    result.created = accepted
+    return result
@@ -0,0 +1,102 @@
+"""
+PostgreSQL exclusion constraint that forbids double bookings.
+
+Two active appointments of the same team member may not have overlapping
+[starts_at, ends_at) ranges. The constraint is backed by a GiST index, so it
+holds under concurrent booking load where the serializer's overlap check
+alone could let two simultaneous requests through. Other databases rely on
+the indexed overlap query in ``conflicting_appointments``.
+
+The constraint is declared in ``Appointment.Meta.constraints`` through
+``PostgresExclusionConstraint``, which emits no SQL and skips validation on
+other databases, so it is part of the migration state everywhere.
+"""
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Func
+from django.utils import timezone
+
+
+CONSTRAINT_NAME = 'appointment_no_double_booking'
+
+OVERLAPS_SQL = """
+SELECT a.team_member_id, a.id, a.starts_at, a.ends_at, b.id, b.starts_at, b.ends_at
+FROM appointments_appointment a
+JOIN appointments_appointment b
+    ON a.team_member_id = b.team_member_id
+    AND a.id < b.id
+    AND a.starts_at < b.ends_at
+    AND b.starts_at < a.ends_at
+WHERE a.status IN %(statuses)s AND b.status IN %(statuses)s
+ORDER BY a.starts_at, a.id, b.id
+LIMIT 20;
+"""
+
+
+class TsTzRange(Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class PostgresExclusionConstraint(ExclusionConstraint):
+    """An ``ExclusionConstraint`` that is a no-op on databases other than PostgreSQL"""
+
+    def constraint_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        return super().constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        return super().create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        return super().remove_sql(model, schema_editor)
+
+    def validate(self, model, instance, exclude=None, using=DEFAULT_DB_ALIAS):
+        if connections[using].vendor != 'postgresql':
+            return
+        super().validate(model, instance, exclude=exclude, using=using)
+
+
+class PostgresBtreeGistExtension(BtreeGistExtension):
+    """``BtreeGistExtension`` that can also be unapplied on other databases"""
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def find_existing_overlaps(connection, statuses):
+    """
+    Return up to 20 overlapping pairs of appointments in ``statuses`` that
+    would violate the constraint, as (team_member_id, id, starts_at, ends_at,
+    other id, other starts_at, other ends_at) rows.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(OVERLAPS_SQL, {'statuses': tuple(statuses)})
+        return cursor.fetchall()
+
+
+def describe_overlaps(overlaps):
+    """One line per pair returned by ``find_existing_overlaps``, in local time"""
+    def span(start, end):
+        start, end = timezone.localtime(start), timezone.localtime(end)
+        return f"{start:%Y-%m-%d %H:%M}-{end:%H:%M}"
+
+    return '\n'.join(
+        f'  team member {team_member_id}: appointment {first_id} ({span(first_start, first_end)}) '
+        f'overlaps appointment {second_id} ({span(second_start, second_end)})'
+        for team_member_id, first_id, first_start, first_end, second_id, second_start, second_end in overlaps
+    )
+
+
+def is_double_booking_violation(error):
+    """Whether an ``IntegrityError`` was raised by the double-booking constraint"""
+    return CONSTRAINT_NAME in str(error)
@@ -0,0 +1,54 @@
+"""
+Streaming export of appointments for accounting.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)``, which uses a named
+server-side cursor on PostgreSQL, and service names and durations come from
+the denormalized ``services_summary``/``total_duration_minutes`` columns, so
+the whole export is a single query. Memory use depends on the chunk size
+only, not on the size of the exported range.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'id', 'appointment_date', 'appointment_time', 'status',
+    'client_id', 'client_name', 'team_member_id', 'team_member_name',
+    'services_list', 'total_price', 'total_duration',
+]
+
+ROW_FIELDS = [
+    'id', 'appointment_date', 'appointment_time', 'status',
+    'client_id', 'client__name', 'team_member_id', 'team_member__name',
+    'services_summary', 'total_price', 'total_duration_minutes',
+]
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one dict per appointment, keyed by ``EXPORT_COLUMNS``."""
+    rows = queryset.values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dict(zip(EXPORT_COLUMNS, row))
+
+
+def stream_ndjson(queryset):
+    for record in iter_export_records(queryset):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_csv(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for record in iter_export_records(queryset):
+        yield writer.writerow([record[column] for column in EXPORT_COLUMNS])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from apps.appointments.availability import refresh_day_availability
+from apps.appointments.models import Appointment, refresh_service_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized total_duration_minutes and services_summary columns of appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of appointments recomputed per query batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        appointment_ids = Appointment.objects.order_by("id").values_list("id", flat=True)
+
+        total = 0
+        updated = 0
+        batch = []
+        for appointment_id in appointment_ids.iterator(chunk_size=batch_size):
+            batch.append(appointment_id)
+            if len(batch) == batch_size:
+                updated += self.refresh_batch(batch, batch_size)
+                total += len(batch)
+                batch = []
+        if batch:
+            updated += self.refresh_batch(batch, batch_size)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {total} appointments, updated {updated}."))
+
+    def refresh_batch(self, appointment_ids, batch_size):
+        updated = refresh_service_summaries(appointment_ids, batch_size=batch_size)
+        if updated:
+            # Durations changed, so the stored occupancy of those days is stale
+            refresh_day_availability(
+                Appointment.objects.filter(id__in=appointment_ids).values_list("team_member_id", "appointment_date")
+            )
+        return updated
@@ -0,0 +1,328 @@
+import http.client
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.utils import timezone
+
+from apps.appointments.models import Appointment
+from apps.clients.models import Client
+from apps.team.models import Team
+
+
+FLOWS = ('dashboard', 'calendar', 'booking', 'search')
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-api',
+    }
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint throughput and latency percentiles (ms) from (ok, seconds) samples"""
+    report = {}
+    for endpoint, results in sorted(samples.items()):
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        report[endpoint] = {
+            'requests': len(results),
+            'errors': sum(1 for ok, _ in results if not ok),
+            'throughput_rps': round(len(results) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2),
+        }
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API over HTTP: create a throwaway test database, seed a salon (bulk mode of "
+        "seed_demo_salon), serve the app "
+        "on a local port and drive the dashboard, calendar, booking and client search flows with "
+        "concurrent workers. Prints throughput and p50/p95/p99 latency per endpoint as JSON; "
+        "--compare prints the change against a previous report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=500, help="Clients to seed (default 500)")
+        parser.add_argument("--team", type=int, default=10, help="Team members to seed (default 10)")
+        parser.add_argument(
+            "--days", type=int, default=30,
+            help="Days of appointments to seed, half before and half after today (default 30)",
+        )
+        parser.add_argument(
+            "--appointments-per-day", type=int,
+            help="Appointments to seed per day across the salon (default: 6 per team member)",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent workers (default 8)")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to run the flows (default 30)")
+        parser.add_argument(
+            "--flows", default=','.join(FLOWS), help=f"Comma-separated flows to run (default {','.join(FLOWS)})"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the data and the flows")
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+        parser.add_argument(
+            "--compare", nargs='+', metavar='REPORT',
+            help="Compare with a baseline report; with two reports, compare them without running",
+        )
+
+    def handle(self, *args, **options):
+        flows = [flow.strip() for flow in options["flows"].split(',') if flow.strip()]
+        unknown = set(flows) - set(FLOWS)
+        if unknown:
+            raise CommandError(f"Unknown flows: {', '.join(sorted(unknown))} (choose from {', '.join(FLOWS)})")
+        if options["concurrency"] < 1 or options["duration"] <= 0:
+            raise CommandError("--concurrency and --duration must be positive")
+        if options["compare"] and len(options["compare"]) > 2:
+            raise CommandError("--compare takes a baseline report and optionally a second report")
+
+        if options["compare"] and len(options["compare"]) == 2:
+            baseline, current = (self._load_report(path) for path in options["compare"])
+            self._print_comparison(baseline, current)
+            return
+
+        report = self._run(flows, options)
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], 'w') as handle:
+                handle.write(output + '\n')
+        self.stdout.write(output)
+        if options["compare"]:
+            self._print_comparison(self._load_report(options["compare"][0]), report)
+
+    def _load_report(self, path):
+        try:
+            with open(path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Cannot read report {path}: {error}")
+
+    def _run(self, flows, options):
+        database = connections['default'].settings_dict
+        sqlite_file = None
+        if database['ENGINE'].endswith('sqlite3') and not database.get('TEST', {}).get('NAME'):
+            # A file rather than the default in-memory test database, so the
+            # server threads each get their own connection
+            handle, sqlite_file = tempfile.mkstemp(prefix='benchmark-', suffix='.sqlite3')
+            os.close(handle)
+            database.setdefault('TEST', {})['NAME'] = sqlite_file
+
+        self.stderr.write("Creating the benchmark database...")
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        server = None
+        try:
+            # A private in-memory cache, so the run neither reads nor wipes the
+            # configured one, which may be shared with a live deployment
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1'], CACHES=BENCHMARK_CACHES):
+                started = time.perf_counter()
+                size = self._seed(options)
+                self.stderr.write(f"Seeded {size} in {time.perf_counter() - started:.1f}s")
+                fixtures = self._fixtures()
+
+                server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+                server.daemon_threads = True
+                server.set_app(get_internal_wsgi_application())
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                port = server.server_address[1]
+
+                self.stderr.write(
+                    f"Running {', '.join(flows)} with {options['concurrency']} workers for {options['duration']}s..."
+                )
+                samples, iterations, elapsed = self._drive(port, flows, fixtures, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            if sqlite_file:
+                database['TEST']['NAME'] = None
+                if os.path.exists(sqlite_file):
+                    os.remove(sqlite_file)
+
+        return {
+            'run_at': timezone.now().isoformat(),
+            'database': database['ENGINE'].rsplit('.', 1)[-1],
+            'size': size,
+            'concurrency': options['concurrency'],
+            'duration_seconds': round(elapsed, 2),
+            'flows': {
+                flow: {'iterations': count, 'throughput_per_second': round(count / elapsed, 2)}
+                for flow, count in sorted(iterations.items())
+            },
+            'endpoints': summarize(samples, elapsed),
+        }
+
+    def _seed(self, options):
+        """A salon of the requested size, from the bulk mode of seed_demo_salon"""
+        call_command(
+            'seed_demo_salon',
+            clients=options['clients'],
+            team=options['team'],
+            days=options['days'],
+            appointments_per_day=options['appointments_per_day'],
+            seed=options['seed'],
+            stdout=io.StringIO(),
+        )
+        return {
+            'clients': Client.objects.count(),
+            'team': Team.objects.count(),
+            'days': options['days'],
+            'appointments': Appointment.objects.count(),
+        }
+
+    def _fixtures(self):
+        """What the flows pick their parameters from"""
+        specialties = defaultdict(list)
+        for team_id, service_id in Team.specialties.through.objects.values_list('team_id', 'service_id'):
+            specialties[team_id].append(service_id)
+        return {
+            'members': list(Team.objects.values_list('id', flat=True)),
+            'specialties': specialties,
+            'clients': list(Client.objects.values_list('id', flat=True)),
+            'names': list(Client.objects.values_list('name', flat=True).distinct()),
+            'today': timezone.localdate(),
+        }
+
+    def _drive(self, port, flows, fixtures, options):
+        samples = defaultdict(list)
+        iterations = defaultdict(int)
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["duration"]
+
+        def worker(index):
+            rng = random.Random(f'{options["seed"]}-{index}')
+            local_samples = defaultdict(list)
+            local_iterations = defaultdict(int)
+            position = index
+            while time.perf_counter() < deadline:
+                flow = flows[position % len(flows)]
+                position += 1
+                getattr(self, f'_flow_{flow}')(port, rng, fixtures, local_samples)
+                local_iterations[flow] += 1
+            with lock:
+                for endpoint, results in local_samples.items():
+                    samples[endpoint].extend(results)
+                for flow, count in local_iterations.items():
+                    iterations[flow] += count
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(options["concurrency"])]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return samples, iterations, time.perf_counter() - started
+
+    def _request(self, port, samples, endpoint, method, path, body=None, expected=(200,)):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+            ok = response.status in expected
+        except OSError:
+            payload, ok = b'', False
+        finally:
+            connection.close()
+        samples[endpoint].append((ok, time.perf_counter() - started))
+        return payload if ok else None
+
+    def _flow_dashboard(self, port, rng, fixtures, samples):
+        for name in ('today', 'stats', 'section_stats', 'upcoming'):
+            self._request(port, samples, f'GET /api/appointments/{name}/', 'GET', f'/api/appointments/{name}/')
+
+    def _flow_calendar(self, port, rng, fixtures, samples):
+        week_start = fixtures['today'] + timedelta(days=7 * rng.randint(-2, 2))
+        week_start -= timedelta(days=week_start.weekday())
+        week_end = week_start + timedelta(days=6)
+        self._request(
+            port, samples, 'GET /api/appointments/?start_date&end_date', 'GET',
+            f'/api/appointments/?start_date={week_start}&end_date={week_end}',
+        )
+        self._request(port, samples, 'GET /api/team/', 'GET', '/api/team/')
+        self._request(port, samples, 'GET /api/services/', 'GET', '/api/services/')
+
+    def _flow_booking(self, port, rng, fixtures, samples):
+        member = rng.choice(fixtures['members'])
+        day = fixtures['today'] + timedelta(days=rng.randint(1, 14))
+        payload = self._request(
+            port, samples, 'GET /api/appointments/available_slots/', 'GET',
+            f'/api/appointments/available_slots/?team_member={member}&date={day}',
+        )
+        slots = json.loads(payload)['available_slots'] if payload else []
+        if not slots or not fixtures['specialties'][member]:
+            return
+        # A 400 is the conflict check rejecting a slot another worker just took
+        self._request(
+            port, samples, 'POST /api/appointments/', 'POST', '/api/appointments/',
+            body={
+                'client': rng.choice(fixtures['clients']),
+                'team_member': member,
+                'services': [rng.choice(fixtures['specialties'][member])],
+                'appointment_date': str(day),
+                'appointment_time': rng.choice(slots),
+                'status': 'scheduled',
+            },
+            expected=(201, 400),
+        )
+
+    def _flow_search(self, port, rng, fixtures, samples):
+        name = rng.choice(fixtures['names'])
+        query = name[:rng.randint(3, len(name))]
+        self._request(
+            port, samples, 'GET /api/clients/search/', 'GET',
+            '/api/clients/search/?' + urlencode({'q': query}),
+        )
+
+    def _print_comparison(self, baseline, current):
+        self.stdout.write("")
+        self.stdout.write(f"{'endpoint':50} {'rps':>18} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+
+        def change(old, new):
+            if old is None or new is None:
+                return f"{'-':>18}"
+            delta = f"{(new - old) / old * 100:+.0f}%" if old else ''
+            return f"{new:>10.1f} {delta:>7}"
+
+        for endpoint in sorted(set(baseline['endpoints']) | set(current['endpoints'])):
+            old = baseline['endpoints'].get(endpoint, {})
+            new = current['endpoints'].get(endpoint, {})
+            self.stdout.write(
+                f"{endpoint:50} "
+                f"{change(old.get('throughput_rps'), new.get('throughput_rps'))} "
+                f"{change(old.get('p50_ms'), new.get('p50_ms'))} "
+                f"{change(old.get('p95_ms'), new.get('p95_ms'))} "
+                f"{change(old.get('p99_ms'), new.get('p99_ms'))}"
+            )
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.appointments.recurrence import default_horizon, materialize_series, series_due_for_extension
+
+
+class Command(BaseCommand):
+    help = "Book the occurrences of recurring appointments up to the rolling horizon (run daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Horizon in days from today (default: SALON_SERIES_WINDOW_DAYS)",
+        )
+
+    def handle(self, *args, **options):
+        horizon = timezone.localdate() + timedelta(days=options["days"]) if options["days"] else default_horizon()
+
+        series_count = 0
+        created = 0
+        skipped = 0
+        for series in series_due_for_extension(horizon).iterator():
+            dates, result = materialize_series(series, horizon)
+            series_count += 1
+            created += len(result.created)
+            skipped += len(result.errors)
+            for index, errors in result.errors.items():
+                self.stdout.write(self.style.WARNING(f"Series {series.id}: {dates[index]} skipped: {' '.join(errors)}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Extended {series_count} series up to {horizon}: {created} appointments booked, {skipped} skipped."
+        ))
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.appointments.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily appointment rollups used by the stats endpoints from the appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First date to recompute (YYYY-MM-DD, default: whole history)")
+        parser.add_argument("--end", help="Last date to recompute (YYYY-MM-DD, default: whole history)")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError:
+            raise CommandError("Dates must use the YYYY-MM-DD format")
+        if start and end and end < start:
+            raise CommandError("--end must not be before --start")
+
+        rows = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows between {start or 'the start'} and {end or 'the end'}."))
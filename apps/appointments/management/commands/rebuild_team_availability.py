@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.appointments.availability import rebuild_day_availability
+
+
+class Command(BaseCommand):
+    help = "Regenerate the stored per-day occupancy bitmaps (TeamDayAvailability) from the appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First date to rebuild (YYYY-MM-DD, default: today)")
+        parser.add_argument("--end", help="Last date to rebuild (YYYY-MM-DD, default: start + 365 days)")
+        parser.add_argument(
+            "--team-member",
+            type=int,
+            action="append",
+            dest="team_members",
+            help="Only rebuild this team member (may be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else timezone.localdate()
+            end = date.fromisoformat(options["end"]) if options["end"] else start + timedelta(days=365)
+        except ValueError:
+            raise CommandError("Dates must use the YYYY-MM-DD format")
+        if end < start:
+            raise CommandError("--end must not be before --start")
+
+        days = rebuild_day_availability(start, end, options["team_members"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt availability of {days} team member days between {start} and {end}."))
@@ -1,12 +1,36 @@
 import random
 from datetime import date, timedelta, time, datetime
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from core.cache import bump_generation
 from apps.clients.models import Client
+from apps.clients.registrations import apply_registration_changes, registration_state
+from apps.clients.search import normalize_search_text
 from apps.services.models import Service
 from apps.team.models import Team
-from apps.appointments.models import Appointment
+from apps.appointments.availability import rebuild_day_availability, working_hours
+from apps.appointments.models import (
+    ACTIVE_STATUSES,
+    Appointment,
+    appointment_range,
+    conflicting_appointments,
+    summarize_services,
+)
+from apps.appointments.rollups import rebuild_rollups
+
+
+BULK_BATCH_SIZE = 2000
+BULK_DEFAULTS = {"clients": 500, "team": 10, "days": 30}
+# Appointments per team member and day when --appointments-per-day is not given
+BULK_APPOINTMENTS_PER_MEMBER = 6
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Hugo", "Isabela", "João",
+    "Karina", "Lucas", "Mariana", "Nicolas", "Olívia", "Paulo", "Rafaela", "Sérgio", "Tatiana", "Vitor",
+]
+LAST_NAMES = ["Souza", "Lima", "Ferreira", "Santos", "Almeida", "Oliveira", "Costa", "Silva", "Pereira", "Rodrigues"]
 
 
 class Command(BaseCommand):
@@ -18,9 +42,27 @@ class Command(BaseCommand):
             action="store_true",
             help="Delete existing salon data before seeding",
         )
+        # Any of these switches to the bulk mode, which generates a whole salon
+        # in memory and writes it with bulk_create
+        parser.add_argument("--clients", type=int, help="Bulk mode: clients to create (default 500)")
+        parser.add_argument("--team", type=int, help="Bulk mode: team members (chairs) to create (default 10)")
+        parser.add_argument(
+            "--days", type=int,
+            help="Bulk mode: days of appointments, half before and half after today (default 30)",
+        )
+        parser.add_argument(
+            "--appointments-per-day", type=int,
+            help=f"Bulk mode: appointments per day across the salon (default {BULK_APPOINTMENTS_PER_MEMBER} per team member)",
+        )
+        parser.add_argument("--seed", type=int, help="Random seed, for reproducible data")
 
     def handle(self, *args, **options):
         delete_existing = options.get("delete_existing", False)
+        bulk = any(options.get(name) is not None for name in ("clients", "team", "days", "appointments_per_day"))
+        if bulk and any((options.get(name) or 0) < 0 for name in ("clients", "team", "days", "appointments_per_day")):
+            raise CommandError("Bulk seeding sizes must not be negative")
+        if options.get("seed") is not None:
+            random.seed(options["seed"])
 
         if delete_existing:
             self.stdout.write(self.style.WARNING("Deleting existing salon data (appointments, team, clients, services)..."))
@@ -30,9 +72,12 @@ class Command(BaseCommand):
             Service.objects.all().delete()
 
         svc_created, services = self._seed_services()
-        cli_created, clients = self._seed_clients()
-        team_created, team_members = self._seed_team(services)
-        appt_created = self._seed_appointments(clients, team_members, services)
+        if bulk:
+            cli_created, team_created, appt_created = self._seed_bulk(services, options)
+        else:
+            cli_created, clients = self._seed_clients()
+            team_created, team_members = self._seed_team(services)
+            appt_created = self._seed_appointments(clients, team_members, services)
 
         self.stdout.write("")
         self.stdout.write(self.style.SUCCESS("Seeding summary:"))
@@ -179,6 +224,19 @@ class Command(BaseCommand):
                 return False
             client = random.choice(clients)
             status = random.choice(statuses)
+            specialties_qs = team_member.specialties.all()
+            specialties = list(specialties_qs)
+            source_pool = specialties if len(specialties) > 0 else services
+            k_max = min(3, len(source_pool))
+            k = random.randint(1, k_max) if k_max > 0 else 0
+            chosen_services = random.sample(source_pool, k=k) if k > 0 else []
+
+            # Skip slots that would overlap another active appointment of this professional
+            duration = sum(service.duration_minutes for service in chosen_services)
+            starts_at, ends_at = appointment_range(appt_date, appt_time, duration)
+            if status in ACTIVE_STATUSES and conflicting_appointments(team_member.id, starts_at, ends_at).exists():
+                return False
+
             appointment = Appointment.objects.create(
                 client=client,
                 team_member=team_member,
@@ -186,12 +244,6 @@ class Command(BaseCommand):
                 appointment_time=appt_time,
                 status=status,
             )
-            specialties_qs = team_member.specialties.all()
-            specialties = list(specialties_qs)
-            source_pool = specialties if len(specialties) > 0 else services
-            k_max = min(3, len(source_pool))
-            k = random.randint(1, k_max) if k_max > 0 else 0
-            chosen_services = random.sample(source_pool, k=k) if k > 0 else []
             appointment.services.set(chosen_services)
             appointment.total_price = appointment.calculate_total_price()
             appointment.save(update_fields=["total_price"])
@@ -214,3 +266,123 @@ class Command(BaseCommand):
                     created_count += 1
 
         return created_count
+
+    def _seed_bulk(self, services, options):
+        client_count = options["clients"] if options["clients"] is not None else BULK_DEFAULTS["clients"]
+        team_count = options["team"] if options["team"] is not None else BULK_DEFAULTS["team"]
+        days = options["days"] if options["days"] is not None else BULK_DEFAULTS["days"]
+        per_day = options["appointments_per_day"]
+        if per_day is None:
+            per_day = team_count * BULK_APPOINTMENTS_PER_MEMBER
+
+        today = date.today()
+        first_day = today - timedelta(days=days // 2)
+        last_day = first_day + timedelta(days=max(days - 1, 0))
+
+        with transaction.atomic():
+            first_client = Client.objects.count()
+            names = [f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}" for _ in range(client_count)]
+            clients = Client.objects.bulk_create(
+                [
+                    # bulk_create skips save(), which fills search_name
+                    Client(
+                        name=name,
+                        search_name=normalize_search_text(name),
+                        phone=f"119{(first_client + index) % 10 ** 8:08d}",
+                        gender=random.choice("MFO"),
+                    )
+                    for index, name in enumerate(names)
+                ],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            first_member = Team.objects.count()
+            members = Team.objects.bulk_create([
+                Team(
+                    name=f"Profissional {first_member + index + 1}",
+                    phone=f"118{(first_member + index) % 10 ** 8:08d}",
+                    hire_date=today - timedelta(days=random.randint(30, 3650)),
+                    is_active=True,
+                )
+                for index in range(team_count)
+            ])
+            specialties = {
+                member.id: random.sample(services, k=random.randint(min(3, len(services)), min(5, len(services))))
+                for member in members
+            }
+            Team.specialties.through.objects.bulk_create([
+                Team.specialties.through(team_id=member_id, service_id=service.id)
+                for member_id, member_services in specialties.items()
+                for service in member_services
+            ])
+
+            appointments = []
+            if clients and members and services:
+                for offset in range(days):
+                    appointments += self._plan_day(
+                        first_day + timedelta(days=offset), today, per_day, clients, members, specialties
+                    )
+            Appointment.objects.bulk_create(appointments, batch_size=BULK_BATCH_SIZE)
+            Appointment.services.through.objects.bulk_create(
+                [
+                    Appointment.services.through(appointment_id=appointment.id, service_id=service.id)
+                    for appointment in appointments
+                    for service in appointment._services
+                ],
+                batch_size=BULK_BATCH_SIZE,
+            )
+
+            # Bulk inserts send no signals: count the new clients and derive
+            # the availability bitmaps and the daily rollups of the period in
+            # one pass each
+            apply_registration_changes(added=[registration_state(c.created_at, c.gender) for c in clients])
+            if appointments:
+                rebuild_day_availability(first_day, last_day, [member.id for member in members])
+                rebuild_rollups(first_day, last_day)
+
+        bump_generation("appointments", "team", "clients")
+        return len(clients), len(members), len(appointments)
+
+    def _plan_day(self, day, today, quota, clients, members, specialties):
+        """
+        Up to ``quota`` appointments on ``day``, handed out to the team members
+        in turn. Each member's day is filled from opening time with random
+        gaps, so the schedule has no conflicts by construction.
+        """
+        opening, closing, interval = working_hours()
+        next_free = {member.id: opening for member in members}
+        order = random.sample(members, k=len(members))
+        planned = []
+        while len(planned) < quota and order:
+            for member in list(order):
+                if len(planned) >= quota:
+                    break
+                chosen = random.sample(specialties[member.id], k=random.randint(1, min(2, len(specialties[member.id]))))
+                duration, summary = summarize_services(chosen)
+                start = next_free[member.id] + interval * random.choice((0, 0, 1))
+                if start + duration > closing:
+                    order.remove(member)
+                    continue
+                # Next appointment starts on the slot grid after this one
+                next_free[member.id] = start + -(-duration // interval) * interval
+
+                if day < today:
+                    status = random.choices(("completed", "cancelled", "no_show"), weights=(85, 10, 5))[0]
+                elif day == today:
+                    status = random.choice(("confirmed", "in_progress", "completed"))
+                else:
+                    status = random.choice(("scheduled", "confirmed"))
+                appointment_time = time(hour=start // 60, minute=start % 60)
+                appointment = Appointment(
+                    client=random.choice(clients),
+                    team_member=member,
+                    appointment_date=day,
+                    appointment_time=appointment_time,
+                    status=status,
+                    total_price=sum(service.price for service in chosen),
+                    total_duration_minutes=duration,
+                    services_summary=summary,
+                )
+                appointment.starts_at, appointment.ends_at = appointment_range(day, appointment_time, duration)
+                appointment._services = chosen
+                planned.append(appointment)
+        return planned
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:37
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def populate_service_columns(apps, schema_editor):
+    """
+    Fill total_duration_minutes and services_summary of the existing rows
+    from their services, as summarize_services does: services ordered by
+    (service_type, name), durations summed and names joined with ", ".
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    through = Appointment.services.through
+
+    links = through.objects.order_by('appointment_id', 'service__service_type', 'service__name').values_list(
+        'appointment_id', 'service__name', 'service__duration_minutes'
+    )
+    batch = []
+    for appointment_id, services in groupby(links.iterator(chunk_size=2000), key=itemgetter(0)):
+        services = list(services)
+        batch.append(Appointment(
+            id=appointment_id,
+            total_duration_minutes=sum(duration for _, _, duration in services),
+            services_summary=', '.join(name for _, name, _ in services),
+        ))
+        if len(batch) == BATCH_SIZE:
+            Appointment.objects.bulk_update(batch, ['total_duration_minutes', 'services_summary'])
+            batch = []
+    Appointment.objects.bulk_update(batch, ['total_duration_minutes', 'services_summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_alter_appointment_team_member'),
+        ('services', '0002_alter_service_service_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='services_summary',
+            field=models.TextField(blank=True, default='', help_text='Comma-separated names of the services'),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='total_duration_minutes',
+            field=models.PositiveIntegerField(default=0, help_text="Sum of the services' durations in minutes"),
+        ),
+        migrations.RunPython(populate_service_columns, migrations.RunPython.noop),
+    ]
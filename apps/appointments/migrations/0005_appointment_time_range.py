@@ -0,0 +1,100 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:39
+
+from datetime import datetime, timedelta
+
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+import apps.appointments.constraints
+
+
+ACTIVE_STATUSES = ('scheduled', 'confirmed', 'in_progress')
+
+
+def populate_ranges(apps, schema_editor):
+    """
+    Derive starts_at/ends_at from the services' durations, summed from the
+    through table rather than read from total_duration_minutes, which a
+    database migrated past 0004 before it filled the column still has at 0;
+    the column is rewritten with the same sum.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    rows = Appointment.objects.annotate(
+        duration=Coalesce(Sum('services__duration_minutes'), 0)
+    ).values_list('id', 'appointment_date', 'appointment_time', 'duration').order_by('id')
+    batch = []
+    for appointment_id, appointment_date, appointment_time, duration in rows.iterator(chunk_size=1000):
+        starts_at = timezone.make_aware(datetime.combine(appointment_date, appointment_time))
+        batch.append(Appointment(
+            id=appointment_id,
+            total_duration_minutes=duration,
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(minutes=duration),
+        ))
+        if len(batch) == 1000:
+            Appointment.objects.bulk_update(batch, ['total_duration_minutes', 'starts_at', 'ends_at'])
+            batch = []
+    Appointment.objects.bulk_update(batch, ['total_duration_minutes', 'starts_at', 'ends_at'])
+
+
+def check_no_overlaps(apps, schema_editor):
+    """Fail listing the overlapping rows rather than let the constraint's DDL fail on them"""
+    from apps.appointments.constraints import describe_overlaps, find_existing_overlaps
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    overlaps = find_existing_overlaps(schema_editor.connection, ACTIVE_STATUSES)
+    if overlaps:
+        raise RuntimeError(
+            'Existing overlapping active appointments prevent the double-booking constraint:\n'
+            f'{describe_overlaps(overlaps)}\nCancel or move them and run migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_services_summary'),
+        ('clients', '0006_client_clients_cli_name_5ab7bc_idx_and_more'),
+        ('services', '0002_alter_service_service_type'),
+        ('team', '0004_alter_team_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['team_member', 'starts_at'], name='appointment_team_me_31df0e_idx'),
+        ),
+        migrations.RunPython(populate_ranges, migrations.RunPython.noop),
+        migrations.RunPython(check_no_overlaps, migrations.RunPython.noop),
+        apps.appointments.constraints.PostgresBtreeGistExtension(),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=apps.appointments.constraints.PostgresExclusionConstraint(
+                condition=models.Q(('starts_at__isnull', False), ('status__in', ACTIVE_STATUSES)),
+                expressions=[
+                    ('team_member', '='),
+                    (
+                        apps.appointments.constraints.TsTzRange(
+                            'starts_at', 'ends_at', django.contrib.postgres.fields.ranges.RangeBoundary()
+                        ),
+                        '&&',
+                    ),
+                ],
+                name='appointment_no_double_booking',
+            ),
+        ),
+    ]
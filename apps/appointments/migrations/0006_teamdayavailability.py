@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:42
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+
+ACTIVE_STATUSES = ('scheduled', 'confirmed', 'in_progress')
+MINUTES_PER_DAY = 24 * 60
+
+
+def populate_day_availability(apps, schema_editor):
+    """
+    Build the masks from the services' durations summed from the through
+    table, so rows whose total_duration_minutes was never filled (a database
+    migrated past 0004/0005 before they filled it) still occupy their time.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    TeamDayAvailability = apps.get_model('appointments', 'TeamDayAvailability')
+
+    masks = defaultdict(int)
+    rows = Appointment.objects.filter(
+        status__in=ACTIVE_STATUSES,
+        team_member__isnull=False,
+    ).annotate(
+        duration=Coalesce(Sum('services__duration_minutes'), 0)
+    ).filter(duration__gt=0).values_list('team_member_id', 'appointment_date', 'appointment_time', 'duration')
+    for team_member_id, appointment_date, appointment_time, duration in rows.iterator(chunk_size=2000):
+        start = appointment_time.hour * 60 + appointment_time.minute
+        end = min(start + duration, MINUTES_PER_DAY)
+        masks[(team_member_id, appointment_date)] |= ((1 << (end - start)) - 1) << start
+
+    TeamDayAvailability.objects.bulk_create(
+        [
+            TeamDayAvailability(
+                team_member_id=team_member_id,
+                date=date,
+                occupancy=mask.to_bytes(MINUTES_PER_DAY // 8, 'little'),
+            )
+            for (team_member_id, date), mask in masks.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_time_range'),
+        ('team', '0004_alter_team_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamDayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('occupancy', models.BinaryField(help_text='Little-endian bitmap, one bit per minute of the day')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('team_member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to='team.team')),
+            ],
+            options={
+                'verbose_name_plural': 'Team day availability',
+                'unique_together': {('team_member', 'date')},
+            },
+        ),
+        migrations.RunPython(populate_day_availability, migrations.RunPython.noop),
+    ]
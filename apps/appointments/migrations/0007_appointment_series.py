@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_teamdayavailability'),
+        ('clients', '0006_client_clients_cli_name_5ab7bc_idx_and_more'),
+        ('services', '0002_alter_service_service_type'),
+        ('team', '0004_alter_team_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_time', models.TimeField()),
+                ('frequency', models.CharField(choices=[('weekly', 'Weekly'), ('biweekly', 'Biweekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('start_date', models.DateField(help_text='Date of the first occurrence')),
+                ('until', models.DateField(blank=True, help_text='Last date an occurrence may fall on', null=True)),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Total number of occurrences', null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('materialized_until', models.DateField(blank=True, editable=False, help_text='Occurrences up to this date exist as appointments', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_series', to='clients.client')),
+                ('services', models.ManyToManyField(related_name='appointment_series', to='services.service')),
+                ('team_member', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointment_series', to='team.team')),
+            ],
+            options={
+                'verbose_name_plural': 'Appointment series',
+                'ordering': ['start_date', 'appointment_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='appointments.appointmentseries'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['is_active', 'materialized_until'], name='appointment_is_acti_09a104_idx'),
+        ),
+    ]
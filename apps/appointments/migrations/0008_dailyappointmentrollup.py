@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:49
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    DailyAppointmentRollup = apps.get_model('appointments', 'DailyAppointmentRollup')
+
+    groups = (
+        Appointment.objects.order_by()
+        .values('appointment_date', 'status', 'team_member_id')
+        .annotate(appointment_count=Count('id'), revenue=Sum('total_price'))
+    )
+    DailyAppointmentRollup.objects.bulk_create(
+        [
+            DailyAppointmentRollup(
+                date=group['appointment_date'],
+                status=group['status'],
+                team_member_id=group['team_member_id'] or 0,
+                appointment_count=group['appointment_count'],
+                revenue=group['revenue'] or 0,
+            )
+            for group in groups
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_appointment_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAppointmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('no_show', 'No Show')], max_length=20)),
+                ('team_member_id', models.PositiveIntegerField(default=0)),
+                ('appointment_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'date'], name='appointment_status_863b2a_idx')],
+                'unique_together': {('date', 'status', 'team_member_id')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
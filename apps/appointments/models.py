@@ -1,12 +1,153 @@
+from datetime import datetime, timedelta
+
+from django.contrib.postgres.fields import RangeBoundary, RangeOperators
 from django.db import models
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Q
+from django.utils import timezone
 from apps.clients.models import Client
 from apps.services.models import Service
 from apps.team.models import Team
+from .constraints import CONSTRAINT_NAME, PostgresExclusionConstraint, TsTzRange
+
+
+# Statuses that occupy the team member's agenda
+ACTIVE_STATUSES = ('scheduled', 'confirmed', 'in_progress')
+
+# Fields starts_at/ends_at are derived from
+RANGE_SOURCE_FIELDS = {'appointment_date', 'appointment_time', 'total_duration_minutes'}
+
+# Upper bound on an appointment's length, used to bound overlap lookups from below
+MAX_APPOINTMENT_SPAN = timedelta(hours=24)
+
+
+def appointment_range(appointment_date, appointment_time, duration_minutes):
+    """Return the aware (start, end) datetimes of an appointment"""
+    starts_at = timezone.make_aware(datetime.combine(appointment_date, appointment_time))
+    return starts_at, starts_at + timedelta(minutes=duration_minutes)
+
+
+def conflicting_appointments(team_member_id, starts_at, ends_at, exclude_id=None):
+    """
+    Active appointments of a team member overlapping [starts_at, ends_at).
+    The lower bound on starts_at keeps this an index range scan over
+    (team_member, starts_at) instead of every earlier appointment.
+    """
+    queryset = Appointment.objects.filter(
+        team_member_id=team_member_id,
+        status__in=ACTIVE_STATUSES,
+        starts_at__gt=starts_at - MAX_APPOINTMENT_SPAN,
+        starts_at__lt=ends_at,
+        ends_at__gt=starts_at,
+    )
+    if exclude_id is not None:
+        queryset = queryset.exclude(pk=exclude_id)
+    return queryset
+
+
+def summarize_services(services):
+    """Return (total duration in minutes, comma-separated names) for some services"""
+    services = sorted(services, key=lambda service: (service.service_type, service.name))
+    duration = sum(service.duration_minutes for service in services)
+    return duration, ", ".join(service.name for service in services)
+
+
+def refresh_service_summaries(appointment_ids, batch_size=1000):
+    """
+    Recompute the denormalized service columns of many appointments: one read
+    of the through table and one bulk update per batch, whatever the batch size.
+    """
+    appointment_ids = list(appointment_ids)
+    through = Appointment.services.through
+    updated = 0
+    for start in range(0, len(appointment_ids), batch_size):
+        batch = appointment_ids[start:start + batch_size]
+        services = {appointment_id: [] for appointment_id in batch}
+        links = (
+            through.objects
+            .filter(appointment_id__in=batch)
+            .select_related('service')
+            .only('appointment', 'service__name', 'service__service_type', 'service__duration_minutes')
+        )
+        for link in links:
+            services[link.appointment_id].append(link.service)
+
+        changed = []
+        for appointment in Appointment.objects.filter(pk__in=batch).only(
+            'id', 'appointment_date', 'appointment_time', 'total_duration_minutes',
+            'services_summary', 'starts_at', 'ends_at'
+        ):
+            current = (appointment.total_duration_minutes, appointment.services_summary, appointment.ends_at)
+            appointment.total_duration_minutes, appointment.services_summary = summarize_services(
+                services[appointment.pk]
+            )
+            appointment.sync_range()
+            if (appointment.total_duration_minutes, appointment.services_summary, appointment.ends_at) != current:
+                changed.append(appointment)
+        Appointment.objects.bulk_update(
+            changed, ['total_duration_minutes', 'services_summary', 'starts_at', 'ends_at']
+        )
+        updated += len(changed)
+    return updated
+
+
+class AppointmentSeries(models.Model):
+    """
+    Recurring booking: the same client, professional, services and time every
+    week, every other week or every month, until a date or for a number of
+    occurrences. Occurrences become Appointment rows only up to a rolling
+    horizon, tracked in materialized_until (see recurrence.py).
+    """
+    FREQUENCY_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('biweekly', 'Biweekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    client = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='appointment_series'
+    )
+    team_member = models.ForeignKey(
+        Team,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='appointment_series'
+    )
+    services = models.ManyToManyField(
+        Service,
+        related_name='appointment_series'
+    )
+    appointment_time = models.TimeField()
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    start_date = models.DateField(help_text="Date of the first occurrence")
+    until = models.DateField(blank=True, null=True, help_text="Last date an occurrence may fall on")
+    count = models.PositiveIntegerField(blank=True, null=True, help_text="Total number of occurrences")
+    notes = models.TextField(blank=True, null=True)
+    materialized_until = models.DateField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Occurrences up to this date exist as appointments"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.client} - {self.get_frequency_display()} {self.start_date} {self.appointment_time}"
+
+    class Meta:
+        ordering = ['start_date', 'appointment_time']
+        verbose_name_plural = "Appointment series"
+        indexes = [
+            models.Index(fields=['is_active', 'materialized_until']),
+        ]
 
 
 class Appointment(models.Model):
     """Model for salon appointments"""
+    ACTIVE_STATUSES = ACTIVE_STATUSES
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
         ('confirmed', 'Confirmed'),
@@ -40,12 +181,34 @@ class Appointment(models.Model):
         default='scheduled'
     )
     notes = models.TextField(blank=True, null=True)
+    series = models.ForeignKey(
+        AppointmentSeries,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments'
+    )
     total_price = models.DecimalField(
         max_digits=8,
         decimal_places=2,
         blank=True,
         null=True
     )
+    # Denormalized from services, kept in sync by the m2m_changed signal
+    total_duration_minutes = models.PositiveIntegerField(
+        default=0,
+        help_text="Sum of the services' durations in minutes"
+    )
+    services_summary = models.TextField(
+        blank=True,
+        default='',
+        help_text="Comma-separated names of the services"
+    )
+    # Stored [start, end) range used for index-backed conflict detection; on
+    # PostgreSQL an exclusion constraint also forbids overlaps between active
+    # appointments of the same team member (see migration 0005)
+    starts_at = models.DateTimeField(null=True, editable=False)
+    ends_at = models.DateTimeField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -64,15 +227,49 @@ class Appointment(models.Model):
         service_names = self.services.values_list('name', flat=True)
         return ", ".join(service_names)
 
+    def refresh_services_summary(self):
+        """
+        Recompute the denormalized service columns from the current services.
+        Returns whether anything changed.
+        """
+        duration, summary = summarize_services(
+            self.services.only('name', 'service_type', 'duration_minutes')
+        )
+        if (duration, summary) != (self.total_duration_minutes, self.services_summary):
+            self.total_duration_minutes = duration
+            self.services_summary = summary
+            self.sync_range()
+            Appointment.objects.filter(pk=self.pk).update(
+                total_duration_minutes=duration,
+                services_summary=summary,
+                starts_at=self.starts_at,
+                ends_at=self.ends_at,
+            )
+            return True
+        return False
+
+    def sync_range(self):
+        """Recompute starts_at/ends_at from the date, time and total duration"""
+        self.starts_at, self.ends_at = appointment_range(
+            self.appointment_date, self.appointment_time, self.total_duration_minutes
+        )
+
     def save(self, *args, **kwargs):
+        self.sync_range()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and RANGE_SOURCE_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'starts_at', 'ends_at'}
+
         # Save first, then calculate total price from services
+        # (a row that is being inserted cannot have services yet)
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        if not self.total_price and self.services.exists():
+        if not adding and not self.total_price and self.services.exists():
             self.total_price = self.calculate_total_price()
             super().save(update_fields=['total_price'])
 
     def __str__(self):
-        services_str = self.get_services_list() or "No services"
+        services_str = self.services_summary or "No services"
         team_name = self.team_member.name if self.team_member else ""
         return f"{self.client.name} - {team_name} - {services_str} - {self.appointment_date} {self.appointment_time}"
 
@@ -86,4 +283,66 @@ class Appointment(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['client']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['team_member', 'starts_at']),
+        ]
+        constraints = [
+            # PostgreSQL only, see constraints.py
+            PostgresExclusionConstraint(
+                name=CONSTRAINT_NAME,
+                expressions=[
+                    ('team_member', RangeOperators.EQUAL),
+                    (TsTzRange('starts_at', 'ends_at', RangeBoundary()), RangeOperators.OVERLAPS),
+                ],
+                condition=Q(status__in=ACTIVE_STATUSES, starts_at__isnull=False),
+            ),
+        ]
+
+
+class TeamDayAvailability(models.Model):
+    """
+    Materialized occupancy of a team member's day: a 1440-bit minute mask
+    (see availability.py) rewritten in the same transaction as every
+    appointment write that touches the day. A missing row means the day has
+    no active appointments.
+    """
+    team_member = models.ForeignKey(
+        Team,
+        on_delete=models.CASCADE,
+        related_name='day_availability'
+    )
+    date = models.DateField()
+    occupancy = models.BinaryField(help_text="Little-endian bitmap, one bit per minute of the day")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.team_member_id} - {self.date}"
+
+    class Meta:
+        unique_together = ['team_member', 'date']
+        verbose_name_plural = "Team day availability"
+
+
+class DailyAppointmentRollup(models.Model):
+    """
+    Number of appointments and sum of their prices per day, status and team
+    member, kept up to date by every appointment write (see rollups.py) so
+    dashboard stats never scan the appointments table.
+
+    team_member_id is a plain column rather than a foreign key: 0 stands for
+    appointments without a professional, and the rows of a deleted team
+    member are folded into it like its appointments are.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    team_member_id = models.PositiveIntegerField(default=0)
+    appointment_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.status} {self.team_member_id}: {self.appointment_count}"
+
+    class Meta:
+        unique_together = ['date', 'status', 'team_member_id']
+        indexes = [
+            models.Index(fields=['status', 'date']),
         ]
@@ -0,0 +1,248 @@
+"""
+Recurring appointments.
+
+An ``AppointmentSeries`` describes its occurrences like an RRULE (weekly,
+biweekly or monthly from ``start_date``, bounded by ``until`` and/or
+``count``). Occurrences are turned into Appointment rows only up to a
+rolling horizon of ``SALON_SERIES_WINDOW_DAYS`` days: ``materialize_series``
+books the dates past ``materialized_until`` with the batch booking engine,
+and the ``extend_appointment_series`` command advances every series daily.
+
+"This and following" edits split the series at that date, like calendar
+apps do, and change the following rows with a single UPDATE statement.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from core.cache import bump_generation
+from .availability import refresh_day_availability
+from .booking import BookingResult, book_appointments, check_conflicts
+from .models import ACTIVE_STATUSES, Appointment, AppointmentSeries, appointment_range
+from .rollups import apply_rollup_changes
+
+
+WEEKS_BETWEEN = {'weekly': 1, 'biweekly': 2}
+
+
+def default_horizon():
+    return timezone.localdate() + timedelta(days=settings.SALON_SERIES_WINDOW_DAYS)
+
+
+def _add_months(day, months):
+    """Same day of the month ``months`` later, or None when that month is too short"""
+    month_index = day.month - 1 + months
+    try:
+        return day.replace(year=day.year + month_index // 12, month=month_index % 12 + 1)
+    except ValueError:
+        return None
+
+
+def occurrence_dates(series, last_date):
+    """
+    Yield the series' occurrence dates up to ``last_date``. As in RRULE, a
+    monthly series starting on the 31st skips the months without one, and
+    skipped months do not count towards ``count``.
+    """
+    step = 0
+    produced = 0
+    while series.count is None or produced < series.count:
+        if series.frequency == 'monthly':
+            day = _add_months(series.start_date, step)
+        else:
+            day = series.start_date + timedelta(weeks=step * WEEKS_BETWEEN[series.frequency])
+        step += 1
+        if day is None:
+            continue
+        if day > last_date or (series.until and day > series.until):
+            return
+        produced += 1
+        yield day
+
+
+def materialize_series(series, horizon=None):
+    """
+    Book the occurrences of ``series`` between its ``materialized_until`` and
+    ``horizon`` (default: today + SALON_SERIES_WINDOW_DAYS). Occurrences that
+    conflict with other appointments, or fall on the slot of a cancelled or
+    completed one, are skipped and reported in the result, whose indexes
+    refer to the returned dates.
+    """
+    horizon = horizon or default_horizon()
+    with transaction.atomic():
+        # Serialize concurrent extensions of the same series
+        series = AppointmentSeries.objects.select_for_update().get(pk=series.pk)
+        if not series.is_active or (series.materialized_until and series.materialized_until >= horizon):
+            return [], BookingResult()
+
+        after = series.materialized_until
+        dates = [day for day in occurrence_dates(series, horizon) if after is None or day > after]
+        result = BookingResult()
+        if dates and series.team_member_id is not None:
+            service_ids = list(series.services.values_list('id', flat=True))
+            result = book_appointments([
+                {
+                    'client': series.client_id,
+                    'team_member': series.team_member_id,
+                    'services': service_ids,
+                    'appointment_date': day,
+                    'appointment_time': series.appointment_time,
+                    'status': 'scheduled',
+                    'notes': series.notes,
+                    'series': series.id,
+                }
+                for day in dates
+            ])
+
+        series.materialized_until = horizon
+        series.save(update_fields=['materialized_until', 'updated_at'])
+
+    if result.created:
+        bump_generation('appointments', 'clients')
+    return dates, result
+
+
+def series_due_for_extension(horizon):
+    """Active series whose occurrences may still need to be booked up to ``horizon``"""
+    return AppointmentSeries.objects.filter(
+        Q(materialized_until__isnull=True) | Q(materialized_until__lt=horizon),
+        Q(until__isnull=True) | Q(until__gt=F('materialized_until')) | Q(materialized_until__isnull=True),
+        is_active=True,
+    )
+
+
+def _following(series, from_date):
+    return Appointment.objects.filter(series=series, appointment_date__gte=from_date, status__in=ACTIVE_STATUSES)
+
+
+def _split_series(series, from_date):
+    """
+    End ``series`` before ``from_date`` and return a copy describing its
+    remaining occurrences, or None when there are none. The copy starts on
+    the first remaining occurrence, so weekday, fortnight phase and day of
+    the month are kept.
+    """
+    remaining = (day for day in occurrence_dates(series, date.max) if day >= from_date)
+    first = next(remaining, None)
+    if first is None:
+        return None
+
+    services = list(series.services.all())
+    earlier = sum(1 for _ in occurrence_dates(series, from_date - timedelta(days=1)))
+    successor = AppointmentSeries.objects.create(
+        client_id=series.client_id,
+        team_member_id=series.team_member_id,
+        appointment_time=series.appointment_time,
+        frequency=series.frequency,
+        start_date=first,
+        until=series.until,
+        count=series.count - earlier if series.count is not None else None,
+        notes=series.notes,
+        materialized_until=series.materialized_until,
+    )
+    successor.services.set(services)
+
+    series.until = from_date - timedelta(days=1)
+    series.save(update_fields=['until', 'updated_at'])
+    return successor
+
+
+def reschedule_following(series, from_date, appointment_time=None, notes=None):
+    """
+    Change the time and/or notes of the occurrences on or after
+    ``from_date``. Unless ``from_date`` is the start of the series, the
+    series is split there so that each series describes its own rows; the
+    following rows are then re-pointed and updated in one UPDATE.
+    Occurrences rescheduled individually keep their own time.
+
+    Returns (series now holding the following occurrences, updated row
+    count, BookingResult with the conflicts); nothing is changed when the new
+    time conflicts with another appointment or lands on the slot of one in
+    any status.
+    """
+    result = BookingResult()
+    with transaction.atomic():
+        series = AppointmentSeries.objects.select_for_update().get(pk=series.pk)
+        old_time = series.appointment_time
+        rows = Appointment.objects.filter(series=series, appointment_date__gte=from_date)
+        retime = appointment_time is not None and appointment_time != old_time
+
+        keys = set()
+        if retime:
+            affected = list(
+                _following(series, from_date).filter(appointment_time=old_time)
+                .values_list('id', 'team_member_id', 'appointment_date', 'total_duration_minutes')
+            )
+            pending = []
+            for appointment_id, team_member_id, appointment_date, duration in affected:
+                moved = Appointment(
+                    id=appointment_id, team_member_id=team_member_id,
+                    appointment_date=appointment_date, appointment_time=appointment_time,
+                )
+                moved.starts_at, moved.ends_at = appointment_range(appointment_date, appointment_time, duration)
+                pending.append((appointment_date, moved))
+            check_conflicts(pending, result, exclude_ids=[appointment_id for appointment_id, *_ in affected])
+            if result.errors:
+                return series, 0, result
+            keys = {(team_member_id, appointment_date) for _, team_member_id, appointment_date, _ in affected}
+
+        target = series
+        if from_date > series.start_date:
+            target = _split_series(series, from_date)
+            if target is None:
+                return series, 0, result
+
+        changes = {'series': target, 'updated_at': timezone.now()}
+        if notes is not None:
+            changes['notes'] = notes
+            target.notes = notes
+        if retime:
+            # Rows at the series' time all move by the same offset
+            old_start, _ = appointment_range(from_date, old_time, 0)
+            new_start, _ = appointment_range(from_date, appointment_time, 0)
+            offset = new_start - old_start
+            at_series_time = Q(appointment_time=old_time)
+            changes.update(
+                appointment_time=Case(When(at_series_time, then=Value(appointment_time)), default=F('appointment_time')),
+                starts_at=Case(When(at_series_time, then=F('starts_at') + offset), default=F('starts_at')),
+                ends_at=Case(When(at_series_time, then=F('ends_at') + offset), default=F('ends_at')),
+            )
+            target.appointment_time = appointment_time
+
+        updated = rows.update(**changes)
+        target.save(update_fields=['appointment_time', 'notes', 'updated_at'])
+        refresh_day_availability(keys)
+
+    if updated:
+        bump_generation('appointments')
+    return target, updated, result
+
+
+def cancel_following(series, from_date):
+    """
+    End the series before ``from_date`` and cancel its active occurrences
+    from that date on, in one UPDATE. Returns the number of cancelled rows.
+    """
+    with transaction.atomic():
+        series = AppointmentSeries.objects.select_for_update().get(pk=series.pk)
+        rows = _following(series, from_date)
+        states = list(rows.select_for_update().values_list('team_member_id', 'appointment_date', 'status', 'total_price'))
+        cancelled = rows.update(status='cancelled', updated_at=timezone.now())
+        apply_rollup_changes(
+            removed=states,
+            added=[(team_member_id, day, 'cancelled', price) for team_member_id, day, _, price in states],
+        )
+
+        if from_date <= series.start_date:
+            series.is_active = False
+        else:
+            series.until = min(series.until or from_date, from_date - timedelta(days=1))
+        series.save(update_fields=['is_active', 'until', 'updated_at'])
+        refresh_day_availability((team_member_id, day) for team_member_id, day, _, _ in states)
+
+    if cancelled:
+        bump_generation('appointments')
+    return cancelled
@@ -0,0 +1,114 @@
+"""
+Daily appointment rollups.
+
+``DailyAppointmentRollup`` holds, per (date, status, team member), how many
+appointments there are and the sum of their prices. Writes never recompute
+a day: each appointment change is turned into deltas (-1 and -price on the
+old key, +1 and +price on the new one) applied with ``F()`` expressions in
+the same transaction as the change. ``rebuild_rollups`` recomputes a date
+range from scratch for repairs.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Appointment, DailyAppointmentRollup
+
+
+# Appointment fields the rollup keys and sums are made of
+ROLLUP_FIELDS = {'team_member', 'appointment_date', 'status', 'total_price'}
+
+
+def rollup_state(appointment):
+    """The (team_member_id, date, status, price) an appointment counts under"""
+    return (
+        appointment.team_member_id,
+        appointment.appointment_date,
+        appointment.status,
+        appointment.total_price,
+    )
+
+
+def apply_rollup_changes(removed=(), added=()):
+    """
+    Move appointments out of and into the rollups. Both arguments are
+    iterables of (team_member_id, date, status, total_price) states.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for sign, states in ((-1, removed), (1, added)):
+        for team_member_id, date, status, price in states:
+            delta = deltas[(date, status, team_member_id or 0)]
+            delta[0] += sign
+            delta[1] += sign * Decimal(price or 0)
+    _apply_deltas(deltas)
+
+
+def _apply_deltas(deltas):
+    changes = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not changes:
+        return
+
+    with transaction.atomic():
+        DailyAppointmentRollup.objects.bulk_create(
+            [
+                DailyAppointmentRollup(date=date, status=status, team_member_id=team_member_id)
+                for date, status, team_member_id in changes
+            ],
+            ignore_conflicts=True,
+        )
+        # Sorted so concurrent writers touching several keys lock them in the same order
+        for (date, status, team_member_id), (count, revenue) in sorted(changes.items()):
+            DailyAppointmentRollup.objects.filter(
+                date=date, status=status, team_member_id=team_member_id
+            ).update(
+                appointment_count=F('appointment_count') + count,
+                revenue=F('revenue') + revenue,
+            )
+
+
+def fold_team_member_rollups(team_member_id):
+    """Count a deleted team member's rollups under 'no professional' (0)"""
+    with transaction.atomic():
+        rows = DailyAppointmentRollup.objects.filter(team_member_id=team_member_id)
+        deltas = {
+            (date, status, 0): [count, revenue]
+            for date, status, count, revenue in rows.values_list('date', 'status', 'appointment_count', 'revenue')
+        }
+        rows.delete()
+        _apply_deltas(deltas)
+
+
+def rebuild_rollups(start_date=None, end_date=None):
+    """Recompute the rollups of a date range (the whole history by default) from the appointments"""
+    appointments = Appointment.objects.all()
+    rollups = DailyAppointmentRollup.objects.all()
+    if start_date:
+        appointments = appointments.filter(appointment_date__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date:
+        appointments = appointments.filter(appointment_date__lte=end_date)
+        rollups = rollups.filter(date__lte=end_date)
+
+    groups = (
+        appointments.order_by()
+        .values('appointment_date', 'status', 'team_member_id')
+        .annotate(appointment_count=Count('id'), revenue=Sum('total_price'))
+    )
+    with transaction.atomic():
+        rollups.delete()
+        DailyAppointmentRollup.objects.bulk_create(
+            [
+                DailyAppointmentRollup(
+                    date=group['appointment_date'],
+                    status=group['status'],
+                    team_member_id=group['team_member_id'] or 0,
+                    appointment_count=group['appointment_count'],
+                    revenue=group['revenue'] or 0,
+                )
+                for group in groups
+            ],
+            batch_size=1000,
+        )
+    return len(groups)
@@ -1,18 +1,19 @@
 from rest_framework import serializers
-from .models import Appointment
+from .booking import conflict_message
+from .models import Appointment, AppointmentSeries, appointment_range, conflicting_appointments, summarize_services
 from apps.clients.serializers import ClientSerializer
 from apps.services.serializers import ServiceSerializer
 from apps.team.serializers import TeamListSerializer
+from apps.clients.models import Client
+from apps.services.models import Service
+from apps.team.models import Team
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
     client = ClientSerializer(read_only=True)
     team_member = TeamListSerializer(read_only=True)
     services = ServiceSerializer(many=True, read_only=True)
-    total_duration = serializers.SerializerMethodField()
-    
-    def get_total_duration(self, obj):
-        return obj.calculate_total_duration()
+    total_duration = serializers.IntegerField(source='total_duration_minutes', read_only=True)
     
     class Meta:
         model = Appointment
@@ -41,8 +42,6 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         )
     
     def validate(self, data):
-        from datetime import datetime, timedelta
-
         team_member = data.get('team_member')
         services = data.get('services', [])
         appointment_date = data.get('appointment_date')
@@ -65,33 +64,34 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
             if new_duration <= 0:
                 return data # No duration, no conflict
 
-            new_start_dt = datetime.combine(appointment_date, appointment_time)
-            new_end_dt = new_start_dt + timedelta(minutes=new_duration)
-
-            # Fetch potentially conflicting appointments
-            conflicts = Appointment.objects.filter(
-                team_member=team_member,
-                appointment_date=appointment_date,
-                status__in=['scheduled', 'confirmed', 'in_progress']
-            ).exclude(id=instance_id)
-
-            for existing_app in conflicts:
-                # Calculate existing appointment's start and end datetimes
-                existing_duration = existing_app.calculate_total_duration()
-                if existing_duration <= 0:
-                    continue
-                
-                existing_start_dt = datetime.combine(existing_app.appointment_date, existing_app.appointment_time)
-                existing_end_dt = existing_start_dt + timedelta(minutes=existing_duration)
-
-                # The overlap condition: (StartA < EndB) and (EndA > StartB)
-                if new_start_dt < existing_end_dt and new_end_dt > existing_start_dt:
-                    raise serializers.ValidationError(
-                        f"Conflito de agendamento. O profissional já tem um compromisso das "
-                        f"{existing_start_dt.strftime('%H:%M')} às {existing_end_dt.strftime('%H:%M')}."
-                    )
+            new_start, new_end = appointment_range(appointment_date, appointment_time, new_duration)
+
+            # Single indexed lookup over the stored [starts_at, ends_at) ranges
+            conflict = (
+                conflicting_appointments(team_member.id, new_start, new_end, exclude_id=instance_id)
+                .order_by('starts_at')
+                .values_list('starts_at', 'ends_at')
+                .first()
+            )
+            if conflict:
+                raise serializers.ValidationError(conflict_message(*conflict))
 
         return data
+
+    def create(self, validated_data):
+        # Fill the price and denormalized service columns from the validated
+        # services so the row is inserted complete in a single statement
+        services = validated_data.pop('services', [])
+        if services:
+            validated_data['total_price'] = sum(service.price for service in services)
+        duration, summary = summarize_services(services)
+        instance = Appointment.objects.create(
+            total_duration_minutes=duration,
+            services_summary=summary,
+            **validated_data
+        )
+        instance.services.set(services)
+        return instance
     
     def update(self, instance, validated_data):
         print(f'🔄 AppointmentCreateSerializer.update() called')
@@ -110,6 +110,11 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             print(f'📋 Setting {attr} = {value}')
             setattr(instance, attr, value)
+
+        # Apply the new services' duration before saving so the stored time
+        # range never briefly combines the new time with the old duration
+        if services is not None:
+            instance.total_duration_minutes, instance.services_summary = summarize_services(services)
         
         # Save the instance first
         instance.save()
@@ -122,7 +127,7 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
             
             # Recalculate total price after updating services
             old_price = instance.total_price
-            instance.total_price = instance.calculate_total_price()
+            instance.total_price = sum(service.price for service in services)
             print(f'💰 Price updated from {old_price} to {instance.total_price}')
             instance.save(update_fields=['total_price'])
         
@@ -135,28 +140,70 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Appointment
-        fields = ['client', 'team_member', 'services', 'appointment_date', 'appointment_time', 'status', 'notes']
+        fields = ['id', 'client', 'team_member', 'services', 'appointment_date', 'appointment_time', 'status', 'notes']
+        read_only_fields = ['id']
+
+
+class AppointmentBulkItemSerializer(serializers.Serializer):
+    """
+    Shape of one item of a bulk booking. References are plain ids: they are
+    resolved for the whole batch at once by booking.book_appointments.
+    """
+    client = serializers.IntegerField()
+    team_member = serializers.IntegerField()
+    services = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    appointment_date = serializers.DateField()
+    appointment_time = serializers.TimeField()
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, default='scheduled')
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
 
 
 class AppointmentListSerializer(serializers.ModelSerializer):
     client_name = serializers.CharField(source='client.name', read_only=True)
     team_member_name = serializers.CharField(source='team_member.name', read_only=True)
-    services_list = serializers.SerializerMethodField()
-    total_duration = serializers.SerializerMethodField()
-    
-    def get_services_list(self, obj):
-        # Optimized: Use prefetched services to avoid additional queries
-        if hasattr(obj, '_prefetched_objects_cache') and 'services' in obj._prefetched_objects_cache:
-            return ", ".join([service.name for service in obj._prefetched_objects_cache['services']])
-        return obj.get_services_list()
-    
-    def get_total_duration(self, obj):
-        # Optimized: Use prefetched services to avoid additional queries
-        if hasattr(obj, '_prefetched_objects_cache') and 'services' in obj._prefetched_objects_cache:
-            return sum(service.duration_minutes for service in obj._prefetched_objects_cache['services'])
-        return obj.calculate_total_duration()
+    services_list = serializers.CharField(source='services_summary', read_only=True)
+    total_duration = serializers.IntegerField(source='total_duration_minutes', read_only=True)
     
     class Meta:
         model = Appointment
         fields = ['id', 'client_name', 'team_member_name', 'services_list', 'appointment_date', 
                  'appointment_time', 'status', 'total_price', 'total_duration']
+
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    client = serializers.PrimaryKeyRelatedField(queryset=Client.objects.all())
+    team_member = serializers.PrimaryKeyRelatedField(queryset=Team.objects.filter(is_active=True))
+    services = serializers.PrimaryKeyRelatedField(
+        many=True,
+        allow_empty=False,
+        queryset=Service.objects.filter(is_active=True)
+    )
+
+    class Meta:
+        model = AppointmentSeries
+        fields = ['id', 'client', 'team_member', 'services', 'appointment_time', 'frequency',
+                  'start_date', 'until', 'count', 'notes', 'materialized_until', 'is_active',
+                  'created_at', 'updated_at']
+        read_only_fields = ['id', 'materialized_until', 'is_active', 'created_at', 'updated_at']
+
+    def validate(self, data):
+        if data.get('until') is None and data.get('count') is None:
+            raise serializers.ValidationError("Informe a data final (until) ou o número de ocorrências (count).")
+        if data.get('until') and data['until'] < data['start_date']:
+            raise serializers.ValidationError("A data final deve ser posterior à data inicial.")
+        if data.get('count') == 0:
+            raise serializers.ValidationError("O número de ocorrências deve ser maior que zero.")
+
+        team_specialties = set(data['team_member'].specialties.values_list('id', flat=True))
+        if not {service.id for service in data['services']}.issubset(team_specialties):
+            raise serializers.ValidationError(
+                "O profissional selecionado não oferece todos os serviços solicitados."
+            )
+        return data
+
+
+class FollowingOccurrencesSerializer(serializers.Serializer):
+    """Body of the "this and following" actions of a series"""
+    from_date = serializers.DateField()
+    appointment_time = serializers.TimeField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True)
@@ -1,12 +1,16 @@
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
 
+from core.cache import bump_generation
 from apps.clients.models import Client
 from apps.services.models import Service
 from apps.team.models import Team
-from .models import Appointment
+from .availability import refresh_day_availability
+from .models import Appointment, refresh_service_summaries
+from .rollups import ROLLUP_FIELDS, apply_rollup_changes, fold_team_member_rollups, rollup_state
 
 
 DEMO_SALON_DATA_DIRTY_FLAG = "demo_salon_data_dirty"
@@ -48,6 +52,26 @@ def mark_demo_data_dirty_on_team_delete(sender, instance, **kwargs):
     _mark_demo_data_dirty()
 
 
+def bump_appointments_generation(sender, **kwargs):
+    # Appointment responses embed client, professional and service names, so
+    # writes to any of them change the appointments data version. Bumped once
+    # the write is committed: a request served in between would otherwise
+    # cache the old rows under the new generation
+    transaction.on_commit(lambda: bump_generation("appointments"))
+
+
+for _model in (Appointment, Client, Service, Team):
+    post_save.connect(bump_appointments_generation, sender=_model, dispatch_uid=f"bump_appointments_{_model.__name__}")
+    post_delete.connect(bump_appointments_generation, sender=_model, dispatch_uid=f"bump_appointments_del_{_model.__name__}")
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_clients_generation_on_appointment_change(sender, **kwargs):
+    # Client responses carry each client's appointment count and last date
+    transaction.on_commit(lambda: bump_generation("clients"))
+
+
 @receiver(pre_save, sender=Team)
 def _cache_previous_active_status(sender, instance, **kwargs):
     if instance.pk:
@@ -72,3 +96,99 @@ def delete_appointments_when_team_inactivated(sender, instance, created, **kwarg
 def delete_nonfinal_appointments_on_team_delete(sender, instance, **kwargs):
     Appointment.objects.filter(team_member=instance).exclude(status__in=["completed", "cancelled"]).delete()
 
+
+AVAILABILITY_FIELDS = {"team_member", "appointment_date", "appointment_time", "status", "total_duration_minutes"}
+
+
+def _refresh_availability_for_appointments(appointment_ids):
+    refresh_day_availability(
+        Appointment.objects.filter(id__in=list(appointment_ids)).values_list("team_member_id", "appointment_date")
+    )
+
+
+@receiver(pre_save, sender=Appointment)
+def _cache_previous_state(sender, instance, update_fields=None, **kwargs):
+    instance._previous_state = None
+    tracked = AVAILABILITY_FIELDS | ROLLUP_FIELDS
+    if not instance.pk or (update_fields is not None and not tracked.intersection(update_fields)):
+        return
+    instance._previous_state = (
+        Appointment.objects.filter(pk=instance.pk)
+        .values_list("team_member_id", "appointment_date", "status", "total_price")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Appointment)
+def refresh_availability_on_appointment_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not AVAILABILITY_FIELDS.intersection(update_fields):
+        return
+    keys = {(instance.team_member_id, instance.appointment_date)}
+    previous = getattr(instance, "_previous_state", None)
+    if previous:
+        keys.add(previous[:2])
+    refresh_day_availability(keys)
+
+
+@receiver(post_save, sender=Appointment)
+def update_rollups_on_appointment_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not ROLLUP_FIELDS.intersection(update_fields):
+        return
+    previous = getattr(instance, "_previous_state", None)
+    # A row saved with a pk but absent from the table is an insert as well
+    apply_rollup_changes(removed=[previous] if previous else [], added=[rollup_state(instance)])
+
+
+@receiver(post_delete, sender=Appointment)
+def refresh_availability_on_appointment_delete(sender, instance, **kwargs):
+    refresh_day_availability([(instance.team_member_id, instance.appointment_date)])
+
+
+@receiver(post_delete, sender=Appointment)
+def update_rollups_on_appointment_delete(sender, instance, **kwargs):
+    apply_rollup_changes(removed=[rollup_state(instance)])
+
+
+@receiver(post_delete, sender=Team)
+def fold_rollups_on_team_delete(sender, instance, **kwargs):
+    fold_team_member_rollups(instance.id)
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+def _capture_appointments_before_clear(sender, instance, action, reverse, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_appointment_ids = list(instance.appointments.values_list("id", flat=True))
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+def refresh_services_summary_on_services_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        if instance.refresh_services_summary():
+            refresh_day_availability([(instance.team_member_id, instance.appointment_date)])
+            transaction.on_commit(lambda: bump_generation("appointments"))
+        return
+    appointment_ids = getattr(instance, "_cleared_appointment_ids", []) if action == "post_clear" else pk_set
+    if refresh_service_summaries(appointment_ids):
+        _refresh_availability_for_appointments(appointment_ids)
+        transaction.on_commit(lambda: bump_generation("appointments"))
+
+
+@receiver(pre_save, sender=Service)
+def _cache_previous_service_summary_fields(sender, instance, **kwargs):
+    instance._previous_summary_fields = None
+    if instance.pk:
+        instance._previous_summary_fields = (
+            Service.objects.filter(pk=instance.pk).values_list("name", "duration_minutes").first()
+        )
+
+
+@receiver(post_save, sender=Service)
+def refresh_services_summary_on_service_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_summary_fields", None)
+    if created or previous is None or previous == (instance.name, instance.duration_minutes):
+        return
+    appointment_ids = list(instance.appointments.values_list("id", flat=True))
+    if refresh_service_summaries(appointment_ids) and previous[1] != instance.duration_minutes:
+        _refresh_availability_for_appointments(appointment_ids)
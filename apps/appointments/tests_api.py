@@ -35,7 +35,7 @@ def test_create_appointment_success_no_overlap(api_client, client_factory, team_
     assert resp.status_code == 201, resp.content
     created = resp.json()
     assert created["client"] == client.id
-    assert created["team_member"]["id"] == team.id
+    assert created["team_member"] == team.id
 
     # Sanity: ensure total duration method works (via model helper)
     appt = Appointment.objects.get(id=created["id"])  # type: ignore[index]
@@ -90,7 +90,7 @@ def test_create_appointment_overlap_rejected(api_client, client_factory, team_fa
 def test_appointments_today_endpoint_returns_today_appointments(
     api_client, client_factory, team_factory, service_factory
 ):
-    today = timezone.now().date()
+    today = timezone.localdate()
     other_day = today + dt.timedelta(days=3)
 
     client = client_factory()
@@ -130,7 +130,7 @@ def test_appointments_today_endpoint_returns_today_appointments(
 def test_appointments_upcoming_endpoint_returns_next_7_days(
     api_client, client_factory, team_factory, service_factory
 ):
-    today = timezone.now().date()
+    today = timezone.localdate()
     within_range = today + dt.timedelta(days=3)
     outside_range = today + dt.timedelta(days=10)
 
@@ -169,7 +169,7 @@ def test_appointments_upcoming_endpoint_returns_next_7_days(
 def test_appointments_stats_endpoint_aggregates_data(
     api_client, client_factory, team_factory, service_factory
 ):
-    today = timezone.now().date()
+    today = timezone.localdate()
 
     client = client_factory()
     team = team_factory()
@@ -230,3 +230,929 @@ def test_available_slots_excludes_occupied_times(
     # Neighboring slots should still be available
     assert "09:00" in slots
     assert "11:00" in slots
+
+
+@pytest.mark.django_db
+def test_appointments_list_cache_is_invalidated_by_writes(
+    api_client, client_factory, team_factory, service_factory, django_capture_on_commit_callbacks
+):
+    date = timezone.now().date() + dt.timedelta(days=2)
+
+    client = client_factory()
+    team = team_factory()
+    service = service_factory(duration_minutes=30)
+    team.specialties.set([service])
+
+    # Warm the cache, then reorder the query params: both must hit the same entry
+    params = {"start_date": date.isoformat(), "end_date": date.isoformat()}
+    assert api_client.get("/api/appointments/", params).json() == []
+    reordered = f"/api/appointments/?end_date={date.isoformat()}&start_date={date.isoformat()}"
+    assert api_client.get(reordered).json() == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resp = api_client.post(
+            "/api/appointments/",
+            data={
+                "client": client.id,
+                "team_member": team.id,
+                "services": [service.id],
+                "appointment_date": date.isoformat(),
+                "appointment_time": "10:00",
+                "status": "scheduled",
+            },
+            format="json",
+        )
+    assert resp.status_code == 201, resp.content
+
+    assert len(api_client.get(reordered).json()) == 1
+
+
+@pytest.mark.django_db
+def test_cache_generations_are_bumped_when_the_write_commits(
+    client_factory, team_factory, django_capture_on_commit_callbacks
+):
+    from core.cache import get_generation
+
+    team = team_factory()
+    client = client_factory()
+    before = {namespace: get_generation(namespace) for namespace in ("appointments", "clients")}
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        Appointment.objects.create(
+            client=client, team_member=team, appointment_date=timezone.localdate(),
+            appointment_time=dt.time(10, 0), status="scheduled",
+        )
+        # A read before the commit would cache the old rows under a new generation
+        assert {namespace: get_generation(namespace) for namespace in before} == before
+
+    for callback in callbacks:
+        callback()
+    assert all(get_generation(namespace) > generation for namespace, generation in before.items())
+
+
+def test_normalize_query_params_ignores_parameter_order():
+    from django.http import QueryDict
+
+    from core.cache import normalize_query_params
+
+    first = QueryDict("status=scheduled&start_date=2025-01-01&team_member=2")
+    second = QueryDict("team_member=2&start_date=2025-01-01&status=scheduled")
+    assert normalize_query_params(first) == normalize_query_params(second)
+
+
+@pytest.mark.django_db
+def test_appointments_list_cursor_pagination_walks_all_pages(
+    api_client, client_factory, team_factory, service_factory
+):
+    date = timezone.now().date() + dt.timedelta(days=1)
+
+    client = client_factory()
+    team = team_factory()
+    service = service_factory(duration_minutes=30)
+    created_ids = []
+    for hour in (9, 10, 11, 12, 13):
+        appt = Appointment.objects.create(
+            client=client,
+            team_member=team,
+            appointment_date=date,
+            appointment_time=dt.time(hour, 0),
+            status="scheduled",
+        )
+        appt.services.set([service])
+        created_ids.append(appt.id)
+
+    # Without a cursor the list stays unpaginated
+    assert isinstance(api_client.get("/api/appointments/").json(), list)
+
+    seen_ids = []
+    url = "/api/appointments/?cursor=&page_size=2"
+    while url:
+        page = api_client.get(url).json()
+        assert len(page["results"]) <= 2
+        seen_ids.extend(item["id"] for item in page["results"])
+        url = page["next"]
+
+    assert seen_ids == created_ids
+
+
+@pytest.mark.django_db
+def test_appointments_list_rejects_malformed_cursor(api_client):
+    resp = api_client.get("/api/appointments/", {"cursor": "not-a-cursor"})
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "position",
+    [
+        ["not-a-date", "09:00:00", 1],
+        ["2025-01-01", "09:00:00", "x"],
+        ["2025-01-01", None, 1],
+        ["2025-01-01", "09:00:00", {"id": 1}],
+    ],
+)
+def test_appointments_list_rejects_cursor_with_invalid_values(api_client, position):
+    import base64
+    import json
+
+    cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode("ascii")
+    resp = api_client.get("/api/appointments/", {"cursor": cursor})
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+def test_appointments_export_streams_ndjson_and_csv(
+    api_client, client_factory, team_factory, service_factory
+):
+    import json
+
+    date = timezone.now().date() + dt.timedelta(days=1)
+    outside = date + dt.timedelta(days=10)
+
+    client = client_factory(name="Maria")
+    team = team_factory()
+    s1 = service_factory(name="Corte", duration_minutes=30)
+    s2 = service_factory(name="Escova", duration_minutes=45)
+    for day, hour in ((date, 9), (date, 11), (outside, 9)):
+        appt = Appointment.objects.create(
+            client=client,
+            team_member=team,
+            appointment_date=day,
+            appointment_time=dt.time(hour, 0),
+            status="scheduled",
+        )
+        appt.services.set([s1, s2])
+
+    params = {"start_date": date.isoformat(), "end_date": date.isoformat()}
+    resp = api_client.get("/api/appointments/export/", params)
+    assert resp.status_code == 200
+    assert resp["Content-Type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in b"".join(resp.streaming_content).decode().splitlines()]
+    assert [r["appointment_time"] for r in records] == ["09:00:00", "11:00:00"]
+    assert records[0]["client_name"] == "Maria"
+    assert records[0]["services_list"] == "Corte, Escova"
+    assert records[0]["total_duration"] == 75
+
+    resp = api_client.get("/api/appointments/export/", {**params, "output": "csv"})
+    assert resp.status_code == 200
+    lines = b"".join(resp.streaming_content).decode().splitlines()
+    assert lines[0].startswith("id,appointment_date,appointment_time")
+    assert len(lines) == 3
+    assert resp["Content-Disposition"] == (
+        f'attachment; filename="agendamentos_{date.isoformat()}_{date.isoformat()}.csv"'
+    )
+
+    assert api_client.get("/api/appointments/export/", {"output": "xml"}).status_code == 400
+    # Raw params never reach the Content-Disposition header
+    resp = api_client.get("/api/appointments/export/", {"start_date": '2025-01-01"\r\nX-Injected: 1'})
+    assert resp.status_code == 400
+    assert "X-Injected" not in resp
+
+
+@pytest.mark.django_db
+def test_appointment_stores_time_range_from_services(client_factory, team_factory, service_factory):
+    date = timezone.now().date() + dt.timedelta(days=1)
+    service = service_factory(duration_minutes=45)
+
+    appt = Appointment.objects.create(
+        client=client_factory(),
+        team_member=team_factory(),
+        appointment_date=date,
+        appointment_time=dt.time(10, 0),
+    )
+    appt.services.set([service])
+    appt.refresh_from_db()
+
+    assert timezone.localtime(appt.starts_at).time() == dt.time(10, 0)
+    assert appt.ends_at - appt.starts_at == dt.timedelta(minutes=45)
+
+
+@pytest.mark.django_db
+def test_reactivating_cancelled_appointment_into_conflict_is_rejected(
+    api_client, client_factory, team_factory, service_factory
+):
+    date = timezone.now().date() + dt.timedelta(days=1)
+    client = client_factory()
+    team = team_factory()
+    service = service_factory(duration_minutes=60)
+
+    cancelled = Appointment.objects.create(
+        client=client, team_member=team, appointment_date=date,
+        appointment_time=dt.time(10, 0), status="cancelled",
+    )
+    cancelled.services.set([service])
+    active = Appointment.objects.create(
+        client=client, team_member=team, appointment_date=date,
+        appointment_time=dt.time(10, 30), status="scheduled",
+    )
+    active.services.set([service])
+
+    resp = api_client.patch(
+        f"/api/appointments/{cancelled.id}/update_status/", {"status": "confirmed"}, format="json"
+    )
+    assert resp.status_code == 400
+    cancelled.refresh_from_db()
+    assert cancelled.status == "cancelled"
+
+
+@pytest.mark.django_db
+def test_availability_endpoint_fits_duration_across_members_and_days(
+    api_client, client_factory, team_factory, service_factory
+):
+    start = timezone.now().date() + dt.timedelta(days=1)
+    end = start + dt.timedelta(days=1)
+
+    client = client_factory()
+    busy = team_factory(name="Ana")
+    free = team_factory(name="Bia")
+    team_factory(name="Inativa", is_active=False)
+    service = service_factory(duration_minutes=60)
+
+    # Ana is busy 10:00-11:00 on the first day
+    appt = Appointment.objects.create(
+        client=client, team_member=busy, appointment_date=start,
+        appointment_time=dt.time(10, 0), status="scheduled",
+    )
+    appt.services.set([service])
+
+    resp = api_client.get(
+        "/api/appointments/availability/",
+        {"start": start.isoformat(), "end": end.isoformat(), "duration": 60},
+    )
+    assert resp.status_code == 200, resp.content
+    data = resp.json()
+    rows = {(row["team_member"], row["date"]): row["slots"] for row in data["availability"]}
+    assert set(rows) == {
+        (busy.id, str(start)), (busy.id, str(end)), (free.id, str(start)), (free.id, str(end))
+    }
+
+    ana_day = rows[(busy.id, str(start))]
+    # A 60 minute service starting at 09:30 would run into the 10:00 appointment
+    assert "09:00" in ana_day
+    assert "09:30" not in ana_day
+    assert "10:00" not in ana_day and "10:30" not in ana_day
+    assert "11:00" in ana_day
+    # Must finish by closing time (21:00)
+    assert ana_day[-1] == "20:00"
+    assert "09:30" in rows[(free.id, str(start))]
+
+    only_bia = api_client.get(
+        "/api/appointments/availability/", {"start": start.isoformat(), "team_members": str(free.id)}
+    ).json()
+    assert [row["team_member"] for row in only_bia["availability"]] == [free.id]
+
+    assert api_client.get("/api/appointments/availability/").status_code == 400
+
+
+def test_fitting_starts_requires_consecutive_free_minutes():
+    from apps.appointments.availability import fitting_starts, interval_mask, iter_bits
+
+    free = interval_mask(0, 10) | interval_mask(15, 40)
+    assert list(iter_bits(fitting_starts(free, 25))) == [15]
+    assert list(iter_bits(fitting_starts(free, 10))) == [0] + list(range(15, 31))
+    assert fitting_starts(free, 26) == 0
+
+
+@pytest.mark.django_db
+def test_next_available_searches_qualified_members_and_stops_at_limit(
+    api_client, client_factory, team_factory, service_factory
+):
+    day = timezone.now().date() + dt.timedelta(days=1)
+    cut = service_factory(name="Corte", duration_minutes=60)
+    beard = service_factory(name="Barba", service_type="barba", duration_minutes=30)
+
+    both = team_factory(name="Ana")
+    both.specialties.set([cut, beard])
+    cut_only = team_factory(name="Bia")
+    cut_only.specialties.set([cut])
+
+    # Ana is booked all day long except 20:00-21:00 on the first day
+    appt = Appointment.objects.create(
+        client=client_factory(), team_member=both, appointment_date=day,
+        appointment_time=dt.time(7, 0), status="confirmed",
+    )
+    long_service = service_factory(name="Dia da noiva", duration_minutes=13 * 60)
+    appt.services.set([long_service])
+
+    resp = api_client.get(
+        "/api/appointments/next_available/",
+        {"services": f"{cut.id},{beard.id}", "limit": 3, "start": day.isoformat()},
+    )
+    assert resp.status_code == 200, resp.content
+    data = resp.json()
+    assert data["duration"] == 90
+    # Only Ana offers both services; 90 minutes no longer fit on the first day
+    assert all(result["team_member"] == both.id for result in data["results"])
+    assert [(r["date"], r["time"]) for r in data["results"]] == [
+        (str(day + dt.timedelta(days=1)), "07:00"),
+        (str(day + dt.timedelta(days=1)), "07:30"),
+        (str(day + dt.timedelta(days=1)), "08:00"),
+    ]
+
+    assert api_client.get("/api/appointments/next_available/").status_code == 400
+
+
+@pytest.mark.django_db
+def test_day_availability_table_follows_appointment_writes(
+    api_client, client_factory, team_factory, service_factory
+):
+    from django.core.management import call_command
+    from apps.appointments.availability import decode_mask, interval_mask
+    from apps.appointments.models import TeamDayAvailability
+
+    day = timezone.now().date() + dt.timedelta(days=1)
+    ana = team_factory(name="Ana")
+    bia = team_factory(name="Bia")
+    service = service_factory(duration_minutes=60)
+
+    def stored(member, date=day):
+        row = TeamDayAvailability.objects.filter(team_member=member, date=date).first()
+        return decode_mask(row.occupancy) if row else 0
+
+    appt = Appointment.objects.create(
+        client=client_factory(), team_member=ana, appointment_date=day,
+        appointment_time=dt.time(10, 0), status="scheduled",
+    )
+    appt.services.set([service])
+    assert stored(ana) == interval_mask(600, 660)
+
+    slots = api_client.get(
+        "/api/appointments/available_slots/", {"date": day.isoformat(), "team_member": ana.id}
+    ).json()["available_slots"]
+    assert "09:30" in slots and "10:00" not in slots and "10:30" not in slots and "11:00" in slots
+
+    # Moving the appointment to another member frees the old day
+    appt.team_member = bia
+    appt.save()
+    assert stored(ana) == 0
+    assert stored(bia) == interval_mask(600, 660)
+
+    # Cancelling frees the slot, a longer service widens it again
+    appt.status = "cancelled"
+    appt.save(update_fields=["status"])
+    assert stored(bia) == 0
+    appt.status = "confirmed"
+    appt.save(update_fields=["status"])
+    service.duration_minutes = 90
+    service.save()
+    assert stored(bia) == interval_mask(600, 690)
+
+    appt.delete()
+    assert stored(bia) == 0
+
+    # The rebuild command regenerates the table from scratch
+    other = Appointment.objects.create(
+        client=client_factory(), team_member=ana, appointment_date=day,
+        appointment_time=dt.time(8, 0), status="scheduled",
+    )
+    other.services.set([service])
+    TeamDayAvailability.objects.all().delete()
+    call_command("rebuild_team_availability", start=day.isoformat(), end=day.isoformat())
+    assert stored(ana) == interval_mask(480, 570)
+    assert TeamDayAvailability.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_bulk_create_reports_item_errors_and_checks_conflicts_in_batch(
+    api_client, client_factory, team_factory, service_factory, django_assert_max_num_queries
+):
+    from apps.appointments.availability import decode_mask, interval_mask
+    from apps.appointments.models import TeamDayAvailability
+
+    day = timezone.now().date() + dt.timedelta(days=1)
+    client = client_factory()
+    cut = service_factory(name="Corte", duration_minutes=60)
+    color = service_factory(name="Coloração", duration_minutes=90)
+    ana = team_factory(name="Ana")
+    ana.specialties.set([cut])
+
+    existing = Appointment.objects.create(
+        client=client, team_member=ana, appointment_date=day,
+        appointment_time=dt.time(14, 0), status="confirmed",
+    )
+    existing.services.set([cut])
+
+    def item(time, services=(cut.id,), **extra):
+        return {
+            "client": client.id, "team_member": ana.id, "services": list(services),
+            "appointment_date": day.isoformat(), "appointment_time": time, **extra,
+        }
+
+    payload = [
+        item("09:00"),
+        item("09:30"),                      # overlaps the 09:00 item of the batch
+        item("13:30"),                      # overlaps the existing 14:00 appointment
+        item("16:00", services=[color.id]),  # Ana does not offer this service
+        item("17:00", status="bogus"),
+        item("18:00"),
+    ]
+    with django_assert_max_num_queries(20):
+        resp = api_client.post("/api/appointments/bulk/", payload, format="json")
+    assert resp.status_code == 201, resp.content
+    data = resp.json()
+    assert [entry["index"] for entry in data["created"]] == [0, 5]
+    assert [entry["index"] for entry in data["errors"]] == [1, 2, 3, 4]
+
+    created = Appointment.objects.get(id=data["created"][0]["id"])
+    assert list(created.services.all()) == [cut]
+    assert str(created.total_price) == str(cut.price)
+    assert created.services_summary == "Corte"
+    assert created.ends_at - created.starts_at == dt.timedelta(minutes=60)
+    occupancy = decode_mask(TeamDayAvailability.objects.get(team_member=ana, date=day).occupancy)
+    assert occupancy == interval_mask(540, 600) | interval_mask(840, 900) | interval_mask(1080, 1140)
+
+    # Atomic mode creates nothing when one item fails
+    resp = api_client.post(
+        "/api/appointments/bulk/",
+        {"atomic": True, "appointments": [item("19:00"), item("19:30")]},
+        format="json",
+    )
+    assert resp.status_code == 400
+    assert resp.json()["created"] == []
+    assert not Appointment.objects.filter(appointment_time=dt.time(19, 0)).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_create_reports_slot_of_inactive_appointment_per_item(
+    api_client, client_factory, team_factory, service_factory
+):
+    from apps.appointments.booking import SLOT_TAKEN_MESSAGE
+
+    day = timezone.now().date() + dt.timedelta(days=1)
+    client = client_factory()
+    cut = service_factory(duration_minutes=30)
+    ana = team_factory()
+    ana.specialties.set([cut])
+    Appointment.objects.create(
+        client=client, team_member=ana, appointment_date=day,
+        appointment_time=dt.time(10, 0), status="cancelled",
+    )
+
+    payload = [
+        {
+            "client": client.id, "team_member": ana.id, "services": [cut.id],
+            "appointment_date": day.isoformat(), "appointment_time": time,
+        }
+        for time in ("10:00", "14:00")
+    ]
+    resp = api_client.post("/api/appointments/bulk/", payload, format="json")
+    assert resp.status_code == 201, resp.content
+    data = resp.json()
+    assert [entry["index"] for entry in data["created"]] == [1]
+    assert data["errors"] == [{"index": 0, "errors": [SLOT_TAKEN_MESSAGE]}]
+
+
+@pytest.mark.django_db
+def test_appointment_series_books_rolling_window_and_edits_following(
+    api_client, client_factory, team_factory, service_factory, settings
+):
+    from django.core.management import call_command
+    from apps.appointments.models import AppointmentSeries
+
+    settings.SALON_SERIES_WINDOW_DAYS = 20
+    start = timezone.localdate() + dt.timedelta(days=1)
+    client = client_factory()
+    cut = service_factory(name="Corte", duration_minutes=60)
+    ana = team_factory(name="Ana")
+    ana.specialties.set([cut])
+
+    # The third week is already taken at 10:30
+    blocker = Appointment.objects.create(
+        client=client_factory(name="Outro"), team_member=ana, appointment_date=start + dt.timedelta(weeks=2),
+        appointment_time=dt.time(10, 30), status="confirmed",
+    )
+    blocker.services.set([cut])
+
+    resp = api_client.post(
+        "/api/appointment-series/",
+        {
+            "client": client.id, "team_member": ana.id, "services": [cut.id],
+            "appointment_time": "10:00", "frequency": "weekly",
+            "start_date": start.isoformat(), "count": 6,
+        },
+        format="json",
+    )
+    assert resp.status_code == 201, resp.content
+    data = resp.json()
+    # Only the occurrences inside the 20 day window are booked
+    assert [o["date"] for o in data["occurrences"]["created"]] == [
+        str(start), str(start + dt.timedelta(weeks=1))
+    ]
+    assert [o["date"] for o in data["occurrences"]["skipped"]] == [str(start + dt.timedelta(weeks=2))]
+    series = AppointmentSeries.objects.get(id=data["id"])
+    assert series.materialized_until == timezone.localdate() + dt.timedelta(days=20)
+
+    # The daily job books the rest, and stops at count
+    call_command("extend_appointment_series", days=120)
+    occurrences = list(series.appointments.order_by("appointment_date").values_list("appointment_date", flat=True))
+    assert occurrences == [start + dt.timedelta(weeks=week) for week in (0, 1, 3, 4, 5)]
+
+    # Moving "this and following" splits the series at week 3
+    resp = api_client.post(
+        f"/api/appointment-series/{series.id}/update_following/",
+        {"from_date": str(start + dt.timedelta(weeks=3)), "appointment_time": "11:00", "notes": "Novo horário"},
+        format="json",
+    )
+    assert resp.status_code == 200, resp.content
+    assert resp.json()["updated"] == 3
+    successor = AppointmentSeries.objects.get(id=resp.json()["series"])
+    assert (successor.start_date, successor.count) == (start + dt.timedelta(weeks=3), 3)
+    assert successor.appointment_time == dt.time(11, 0)
+    series.refresh_from_db()
+    assert series.until == start + dt.timedelta(weeks=3) - dt.timedelta(days=1)
+    assert series.appointment_time == dt.time(10, 0)
+
+    moved = successor.appointments.get(appointment_date=start + dt.timedelta(weeks=4))
+    assert moved.appointment_time == dt.time(11, 0)
+    assert moved.notes == "Novo horário"
+    assert moved.ends_at - moved.starts_at == dt.timedelta(minutes=60)
+    assert timezone.localtime(moved.starts_at).time() == dt.time(11, 0)
+    assert series.appointments.get(appointment_date=start).appointment_time == dt.time(10, 0)
+
+    # 11:30 runs into a 12:00 appointment on week 1: the whole change is rejected
+    other = Appointment.objects.create(
+        client=client_factory(name="Mais um"), team_member=ana, appointment_date=start + dt.timedelta(weeks=1),
+        appointment_time=dt.time(12, 0), status="scheduled",
+    )
+    other.services.set([cut])
+    resp = api_client.post(
+        f"/api/appointment-series/{series.id}/update_following/",
+        {"from_date": str(start), "appointment_time": "11:30"},
+        format="json",
+    )
+    assert resp.status_code == 400
+    assert [c["date"] for c in resp.json()["conflicts"]] == [str(start + dt.timedelta(weeks=1))]
+    assert series.appointments.get(appointment_date=start).appointment_time == dt.time(10, 0)
+
+    resp = api_client.post(
+        f"/api/appointment-series/{successor.id}/cancel_following/",
+        {"from_date": str(start + dt.timedelta(weeks=4))},
+        format="json",
+    )
+    assert resp.json() == {"cancelled": 2}
+    successor.refresh_from_db()
+    assert successor.until == start + dt.timedelta(weeks=4) - dt.timedelta(days=1)
+    assert successor.appointments.filter(status="cancelled").count() == 2
+
+
+@pytest.mark.django_db
+def test_appointment_series_skips_and_rejects_slots_of_inactive_appointments(
+    api_client, client_factory, team_factory, service_factory
+):
+    from apps.appointments.booking import SLOT_TAKEN_MESSAGE
+
+    start = timezone.localdate() + dt.timedelta(days=1)
+    client = client_factory()
+    cut = service_factory(duration_minutes=30)
+    ana = team_factory()
+    ana.specialties.set([cut])
+    for week, time, status in ((1, dt.time(10, 0), "cancelled"), (0, dt.time(15, 0), "completed")):
+        Appointment.objects.create(
+            client=client, team_member=ana, appointment_date=start + dt.timedelta(weeks=week),
+            appointment_time=time, status=status,
+        )
+
+    resp = api_client.post(
+        "/api/appointment-series/",
+        {
+            "client": client.id, "team_member": ana.id, "services": [cut.id],
+            "appointment_time": "10:00", "frequency": "weekly",
+            "start_date": start.isoformat(), "count": 2,
+        },
+        format="json",
+    )
+    assert resp.status_code == 201, resp.content
+    occurrences = resp.json()["occurrences"]
+    assert [o["date"] for o in occurrences["created"]] == [str(start)]
+    assert occurrences["skipped"] == [{"date": str(start + dt.timedelta(weeks=1)), "errors": [SLOT_TAKEN_MESSAGE]}]
+
+    resp = api_client.post(
+        f"/api/appointment-series/{resp.json()['id']}/update_following/",
+        {"from_date": str(start), "appointment_time": "15:00"},
+        format="json",
+    )
+    assert resp.status_code == 400
+    assert resp.json()["conflicts"] == [{"date": str(start), "errors": [SLOT_TAKEN_MESSAGE]}]
+
+
+def test_monthly_occurrences_skip_short_months():
+    from apps.appointments.models import AppointmentSeries
+    from apps.appointments.recurrence import occurrence_dates
+
+    series = AppointmentSeries(frequency="monthly", start_date=dt.date(2025, 1, 31), count=3)
+    assert list(occurrence_dates(series, dt.date(2026, 1, 1))) == [
+        dt.date(2025, 1, 31), dt.date(2025, 3, 31), dt.date(2025, 5, 31)
+    ]
+    series = AppointmentSeries(frequency="biweekly", start_date=dt.date(2025, 1, 1), until=dt.date(2025, 2, 1))
+    assert list(occurrence_dates(series, dt.date(2026, 1, 1))) == [
+        dt.date(2025, 1, 1), dt.date(2025, 1, 15), dt.date(2025, 1, 29)
+    ]
+
+
+@pytest.mark.django_db
+def test_rollups_follow_appointment_changes_and_feed_section_stats(
+    api_client, client_factory, team_factory, service_factory
+):
+    from django.core.management import call_command
+    from django.db.models import Count, Sum
+    from apps.appointments.models import DailyAppointmentRollup
+
+    today = timezone.localdate()
+    client = client_factory()
+    ana = team_factory(name="Ana")
+    bia = team_factory(name="Bia")
+    service = service_factory(duration_minutes=30, price="40.00")
+    ana.specialties.set([service])
+    bia.specialties.set([service])
+
+    def rollups():
+        return {
+            (row.date, row.status, row.team_member_id): (row.appointment_count, row.revenue)
+            for row in DailyAppointmentRollup.objects.exclude(appointment_count=0, revenue=0)
+        }
+
+    def recomputed():
+        groups = (
+            Appointment.objects.order_by().values("appointment_date", "status", "team_member_id")
+            .annotate(count=Count("id"), revenue=Sum("total_price"))
+        )
+        return {
+            (g["appointment_date"], g["status"], g["team_member_id"] or 0): (g["count"], g["revenue"] or 0)
+            for g in groups
+        }
+
+    first = Appointment.objects.create(
+        client=client, team_member=ana, appointment_date=today,
+        appointment_time=dt.time(9, 0), status="confirmed", total_price=40,
+    )
+    second = Appointment.objects.create(
+        client=client, team_member=ana, appointment_date=today + dt.timedelta(days=1),
+        appointment_time=dt.time(9, 0), status="scheduled", total_price=60,
+    )
+    assert rollups() == recomputed()
+
+    # Re-dated, re-assigned, repriced and status changes move the counts
+    second.appointment_date = today
+    second.team_member = bia
+    second.status = "completed"
+    second.save()
+    first.total_price = 55
+    first.save(update_fields=["total_price"])
+    assert rollups() == recomputed()
+
+    resp = api_client.get("/api/appointments/section_stats/")
+    assert resp.json()["total_appointments"] == 2
+    assert resp.json()["today_appointments"] == 2
+    assert resp.json()["confirmed_appointments"] == 1
+    assert resp.json()["total_revenue"] == 115.0
+    assert api_client.get("/api/appointments/stats/").json()["today_revenue"] == 60.0
+
+    # Deleting a team member keeps its completed appointment under "no professional"
+    bia.delete()
+    first.delete()
+    assert rollups() == recomputed() == {(today, "completed", 0): (1, 60)}
+
+    DailyAppointmentRollup.objects.all().delete()
+    call_command("rebuild_appointment_rollups")
+    assert rollups() == recomputed()
+
+
+@pytest.mark.django_db
+def test_read_endpoints_answer_304_until_data_changes(
+    api_client, client_factory, team_factory, service_factory, django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    service = service_factory(name="Corte", duration_minutes=30)
+
+    for url in ("/api/appointments/today/", "/api/appointments/stats/", "/api/services/", "/api/team/"):
+        first = api_client.get(url)
+        assert first.status_code == 200
+        assert first["Cache-Control"] == "private, no-cache"
+        etag = first["ETag"]
+
+        with django_assert_num_queries(0):
+            again = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert again.status_code == 304
+        assert again["ETag"] == etag
+        assert api_client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code == 304
+
+    etag = api_client.get("/api/appointments/today/")["ETag"]
+    services_etag = api_client.get("/api/services/")["ETag"]
+    team_etag = api_client.get("/api/team/")["ETag"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Appointment.objects.create(
+            client=client_factory(), team_member=team_factory(), appointment_date=timezone.now().date(),
+            appointment_time=dt.time(10, 0), status="scheduled",
+        )
+    assert api_client.get("/api/appointments/today/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+    # A new team member changes the team list but not the services
+    assert api_client.get("/api/team/", HTTP_IF_NONE_MATCH=team_etag).status_code == 200
+    assert api_client.get("/api/services/", HTTP_IF_NONE_MATCH=services_etag).status_code == 304
+
+    service.name = "Corte masculino"
+    service.save()
+    assert api_client.get("/api/services/", HTTP_IF_NONE_MATCH=services_etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_daily_endpoints_roll_over_at_local_midnight(api_client, settings):
+    from unittest import mock
+
+    settings.TIME_ZONE = "America/Sao_Paulo"
+    utc = dt.timezone.utc
+
+    # 22:30 in São Paulo is already the next day in UTC
+    with mock.patch("django.utils.timezone.now", return_value=dt.datetime(2026, 3, 10, 1, 30, tzinfo=utc)):
+        evening = api_client.get("/api/appointments/stats/")
+        assert evening.json()["date"] == "2026-03-09"
+        assert api_client.get("/api/appointments/stats/", HTTP_IF_NONE_MATCH=evening["ETag"]).status_code == 304
+
+    with mock.patch("django.utils.timezone.now", return_value=dt.datetime(2026, 3, 10, 3, 30, tzinfo=utc)):
+        resp = api_client.get("/api/appointments/stats/", HTTP_IF_NONE_MATCH=evening["ETag"])
+        assert resp.status_code == 200
+        assert resp.json()["date"] == "2026-03-10"
+
+
+def test_cached_value_computes_a_missing_key_once_for_concurrent_callers():
+    import threading
+    import time
+
+    from core.cache import cached_value
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"total": 1}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cached_value("flight:1:key", compute, 60, 120)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"total": 1}] * 5
+
+
+@pytest.mark.django_db
+def test_stats_serves_previous_value_while_another_worker_recomputes(
+    api_client, client_factory, team_factory, settings, django_capture_on_commit_callbacks
+):
+    from django.core.cache import cache
+
+    from core.cache import COMPUTE_LOCK_KEY, versioned_key
+
+    settings.CACHE_SINGLE_FLIGHT_WAIT = 0.1
+    today = timezone.localdate()
+    assert api_client.get("/api/appointments/stats/").data["today_appointments_count"] == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Appointment.objects.create(
+            client=client_factory(), team_member=team_factory(), appointment_date=today,
+            appointment_time=dt.time(10, 0), status="scheduled",
+        )
+    # Another worker holds the lock on the new generation's entry
+    cache.add(COMPUTE_LOCK_KEY.format(versioned_key("appointments", "stats", today)), 1, 30)
+    previous = api_client.get("/api/appointments/stats/")
+    assert previous.data["today_appointments_count"] == 0
+    assert "ETag" not in previous
+
+    cache.delete(COMPUTE_LOCK_KEY.format(versioned_key("appointments", "stats", today)))
+    current = api_client.get("/api/appointments/stats/")
+    assert current.data["today_appointments_count"] == 1
+    assert "ETag" in current
+
+
+@pytest.mark.django_db
+def test_cache_metrics_count_hits_misses_and_invalidations(
+    api_client, client_factory, team_factory, django_capture_on_commit_callbacks
+):
+    from prometheus_client import REGISTRY
+
+    def sample(name, family):
+        return REGISTRY.get_sample_value(name, {"family": family}) or 0
+
+    before = {
+        name: sample(name, "appointments_today")
+        for name in ("salon_cache_hits_total", "salon_cache_misses_total", "salon_cache_sets_total")
+    }
+    invalidations = sample("salon_cache_invalidations_total", "appointments")
+    computes = sample("salon_cache_compute_seconds_count", "appointments_today")
+
+    api_client.get("/api/appointments/today/")
+    api_client.get("/api/appointments/today/")
+    with django_capture_on_commit_callbacks(execute=True):
+        Appointment.objects.create(
+            client=client_factory(), team_member=team_factory(), appointment_date=timezone.localdate(),
+            appointment_time=dt.time(10, 0), status="scheduled",
+        )
+
+    assert sample("salon_cache_misses_total", "appointments_today") == before["salon_cache_misses_total"] + 1
+    assert sample("salon_cache_hits_total", "appointments_today") == before["salon_cache_hits_total"] + 1
+    assert sample("salon_cache_sets_total", "appointments_today") == before["salon_cache_sets_total"] + 1
+    assert sample("salon_cache_compute_seconds_count", "appointments_today") == computes + 1
+    assert sample("salon_cache_invalidations_total", "appointments") > invalidations
+
+
+@pytest.mark.django_db
+def test_query_metrics_are_labelled_by_viewset_action(api_client, team_factory, settings, caplog):
+    from prometheus_client import REGISTRY
+
+    from core.middleware import normalize_sql
+
+    def observed(view):
+        return REGISTRY.get_sample_value("salon_db_queries_per_request_count", {"view": view}) or 0
+
+    before = observed("appointments.available_slots"), observed("clients.list")
+    member = team_factory()
+    api_client.get(f"/api/appointments/available_slots/?team_member={member.id}&date={timezone.localdate()}")
+    api_client.get("/api/clients/")
+    assert (observed("appointments.available_slots"), observed("clients.list")) == (before[0] + 1, before[1] + 1)
+
+    settings.DB_SLOW_LOG_SAMPLE_RATE = 1
+    settings.DB_SLOW_REQUEST_MS = 0
+    with caplog.at_level("WARNING", logger="core.middleware"):
+        api_client.get("/api/clients/?search=ana")
+    assert "clients.list" in caplog.text
+    assert "'ana'" not in caplog.text
+
+    assert normalize_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21') == (
+        "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?"
+    )
+
+
+@pytest.mark.django_db
+def test_seed_demo_salon_bulk_mode_builds_conflict_free_reproducible_schedule():
+    import io
+
+    from django.core.management import call_command
+    from django.db.models import Sum
+
+    from apps.appointments.models import DailyAppointmentRollup, TeamDayAvailability
+
+    def seed():
+        call_command(
+            "seed_demo_salon", delete_existing=True, clients=30, team=4, days=6, appointments_per_day=20, seed=7,
+            stdout=io.StringIO(),
+        )
+        return list(Appointment.objects.order_by("appointment_date", "appointment_time", "team_member__name").values_list(
+            "appointment_date", "appointment_time", "team_member__name", "client__name", "status", "services_summary",
+        ))
+
+    first = seed()
+    assert len(first) == 6 * 20
+    assert seed() == first
+
+    # Back-to-back appointments of a team member never overlap
+    by_member = {}
+    for appointment in Appointment.objects.order_by("team_member_id", "starts_at"):
+        previous = by_member.get(appointment.team_member_id)
+        assert previous is None or previous.ends_at <= appointment.starts_at
+        by_member[appointment.team_member_id] = appointment
+    assert all(appointment.services.exists() for appointment in Appointment.objects.all()[:10])
+
+    # The derived tables were rebuilt from the bulk inserts
+    assert DailyAppointmentRollup.objects.aggregate(total=Sum("appointment_count"))["total"] == len(first)
+    assert TeamDayAvailability.objects.exists()
+
+
+@pytest.mark.django_db
+def test_save_without_double_booking_only_maps_its_constraint():
+    from django.db import IntegrityError
+    from rest_framework.exceptions import ValidationError
+
+    from apps.appointments.constraints import CONSTRAINT_NAME
+    from apps.appointments.views import save_without_double_booking
+
+    def fail(message):
+        def save():
+            raise IntegrityError(message)
+        return save
+
+    with pytest.raises(ValidationError):
+        save_without_double_booking(fail(f'conflicting key value violates exclusion constraint "{CONSTRAINT_NAME}"'))
+    with pytest.raises(IntegrityError):
+        save_without_double_booking(fail('NOT NULL constraint failed: appointments_appointment.client_id'))
+
+
+def test_describe_overlaps_lists_conflicting_rows(settings):
+    from apps.appointments.constraints import describe_overlaps
+
+    settings.TIME_ZONE = "UTC"
+    utc = dt.timezone.utc
+
+    def at(hour, minute=0):
+        return dt.datetime(2026, 3, 10, hour, minute, tzinfo=utc)
+
+    text = describe_overlaps([(3, 12, at(10), at(11), 15, at(10, 30), at(11, 30))])
+    assert text == (
+        "  team member 3: appointment 12 (2026-03-10 10:00-11:00) "
+        "overlaps appointment 15 (2026-03-10 10:30-11:30)"
+    )
@@ -0,0 +1,112 @@
+import datetime as dt
+
+import pytest
+from django.utils import timezone
+
+from apps.appointments.models import Appointment, appointment_range
+from apps.clients.models import Client
+from apps.services.models import Service
+from apps.team.models import Team
+
+
+MEMBERS = 20
+SLOT_MINUTES = 10
+
+
+@pytest.fixture
+def appointment_seeder(db):
+    """
+    ``seed(n)`` grows today's agenda to ``n`` appointments spread over
+    MEMBERS team members in back-to-back slots, each for its own client and
+    with two services.
+    """
+    today = timezone.localdate()
+    members = Team.objects.bulk_create([
+        Team(name=f"Profissional {i}", phone="11988888888", hire_date=today) for i in range(MEMBERS)
+    ])
+    services = [
+        Service.objects.create(name=name, service_type="cabelo", duration_minutes=5, price="30.00")
+        for name in ("Corte", "Escova")
+    ]
+    for member in members:
+        member.specialties.set(services)
+
+    def seed(n):
+        start = Appointment.objects.count()
+        clients = Client.objects.bulk_create([
+            Client(name=f"Cliente {i}", phone=f"119{i:08d}") for i in range(start, n)
+        ])
+        appointments = []
+        for i, client in zip(range(start, n), clients):
+            time = (dt.datetime.combine(today, dt.time(7, 0)) + dt.timedelta(minutes=SLOT_MINUTES * (i // MEMBERS))).time()
+            starts_at, ends_at = appointment_range(today, time, SLOT_MINUTES)
+            appointments.append(Appointment(
+                client=client, team_member=members[i % MEMBERS], appointment_date=today, appointment_time=time,
+                status="scheduled", total_price="60.00", total_duration_minutes=SLOT_MINUTES,
+                services_summary="Corte, Escova", starts_at=starts_at, ends_at=ends_at,
+            ))
+        Appointment.objects.bulk_create(appointments)
+        Appointment.services.through.objects.bulk_create([
+            Appointment.services.through(appointment_id=appointment.id, service_id=service.id)
+            for appointment in appointments
+            for service in services
+        ])
+
+    seed.members = members
+    return seed
+
+
+@pytest.mark.parametrize("url", [
+    "/api/appointments/",
+    "/api/appointments/?cursor=&page_size=50",
+    "/api/appointments/today/",
+    "/api/appointments/upcoming/",
+    "/api/appointments/stats/",
+    "/api/appointments/section_stats/",
+])
+def test_agenda_endpoints_query_count_does_not_grow_with_rows(api_client, appointment_seeder, queries_per_scale, url):
+    counts = queries_per_scale(appointment_seeder, lambda: api_client.get(url))
+    assert len(set(counts)) == 1, counts
+
+
+def test_available_slots_query_count_does_not_grow_with_rows(api_client, appointment_seeder, queries_per_scale):
+    member = appointment_seeder.members[0]
+    url = f"/api/appointments/available_slots/?team_member={member.id}&date={timezone.localdate()}"
+    counts = queries_per_scale(appointment_seeder, lambda: api_client.get(url))
+    assert len(set(counts)) == 1, counts
+
+
+@pytest.mark.django_db
+def test_retrieve_query_count_does_not_grow_with_services_or_history(
+    api_client, client_factory, team_factory, queries_per_scale
+):
+    client = client_factory()
+    member = team_factory()
+    appointment = Appointment.objects.create(
+        client=client, team_member=member, appointment_date=timezone.localdate(),
+        appointment_time=dt.time(9, 0), status="scheduled",
+    )
+
+    def seed(n):
+        # n appointments in the client's history, n / 10 services on the appointment
+        start = client.appointments.count()
+        Appointment.objects.bulk_create([
+            Appointment(
+                client=client, appointment_date=timezone.localdate() - dt.timedelta(days=i + 1),
+                appointment_time=dt.time(9, 0), status="completed",
+            )
+            for i in range(start, n)
+        ])
+        have = appointment.services.count()
+        services = Service.objects.bulk_create([
+            Service(name=f"Servico {i}", service_type="cabelo", duration_minutes=0, price="10.00")
+            for i in range(have, n // 10)
+        ])
+        Appointment.services.through.objects.bulk_create([
+            Appointment.services.through(appointment_id=appointment.id, service_id=service.id)
+            for service in services
+        ])
+        member.specialties.add(*services)
+
+    counts = queries_per_scale(seed, lambda: api_client.get(f"/api/appointments/{appointment.id}/"))
+    assert len(set(counts)) == 1, counts
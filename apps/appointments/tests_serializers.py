@@ -66,3 +66,59 @@ def test_appointment_list_serializer_uses_prefetched_services_and_duration(
     assert "Corte" in data["services_list"]
     assert "Barba" in data["services_list"]
     assert data["total_duration"] == s1.duration_minutes + s2.duration_minutes
+
+
+@pytest.mark.django_db
+def test_denormalized_service_columns_follow_m2m_and_service_changes(
+    client_factory, team_factory, service_factory
+):
+    client = client_factory()
+    team = team_factory()
+    s1 = service_factory(name="Corte", duration_minutes=30)
+    s2 = service_factory(name="Barba", service_type="barba", duration_minutes=20)
+
+    appointment = Appointment.objects.create(
+        client=client,
+        team_member=team,
+        appointment_date=dt.date.today() + dt.timedelta(days=1),
+        appointment_time=dt.time(10, 0),
+    )
+    appointment.services.set([s1, s2])
+    appointment.refresh_from_db()
+    assert appointment.total_duration_minutes == 50
+    assert appointment.services_summary == "Barba, Corte"
+
+    # Reverse side of the relation
+    s2.appointments.remove(appointment)
+    appointment.refresh_from_db()
+    assert appointment.total_duration_minutes == 30
+    assert appointment.services_summary == "Corte"
+
+    # Editing a service refreshes the appointments using it
+    s1.duration_minutes = 40
+    s1.name = "Corte curto"
+    s1.save()
+    appointment.refresh_from_db()
+    assert appointment.total_duration_minutes == 40
+    assert appointment.services_summary == "Corte curto"
+
+
+@pytest.mark.django_db
+def test_backfill_appointment_services_command(client_factory, team_factory, service_factory):
+    from django.core.management import call_command
+
+    service = service_factory(name="Corte", duration_minutes=30)
+    appointment = Appointment.objects.create(
+        client=client_factory(),
+        team_member=team_factory(),
+        appointment_date=dt.date.today(),
+        appointment_time=dt.time(9, 0),
+    )
+    appointment.services.set([service])
+    Appointment.objects.filter(pk=appointment.pk).update(total_duration_minutes=0, services_summary="")
+
+    call_command("backfill_appointment_services", batch_size=10)
+
+    appointment.refresh_from_db()
+    assert appointment.total_duration_minutes == 30
+    assert appointment.services_summary == "Corte"
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AppointmentViewSet
+from .views import AppointmentSeriesViewSet, AppointmentViewSet
 
 router = DefaultRouter()
 router.register(r'appointments', AppointmentViewSet)
+router.register(r'appointment-series', AppointmentSeriesViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
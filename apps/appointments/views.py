@@ -1,19 +1,91 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db import models
-from django.db.models import Prefetch, Q, Sum
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from datetime import datetime, timedelta
-from .models import Appointment
-from .serializers import AppointmentSerializer, AppointmentCreateSerializer, AppointmentListSerializer
+from itertools import islice
+from core.cache import bump_generation, cached_value, normalize_query_params, versioned_key
+from core.conditional import conditional_on
+from core.pagination import KeysetPagination
+from .availability import (
+    available_starts,
+    format_minute,
+    iter_available_starts,
+    load_day_occupancy,
+    load_occupancy,
+    working_hours,
+)
+from .booking import book_appointments
+from .constraints import is_double_booking_violation
+from . import recurrence
+from .export import stream_csv, stream_ndjson
+from .models import Appointment, AppointmentSeries, DailyAppointmentRollup, conflicting_appointments
+from .serializers import (
+    AppointmentBulkItemSerializer,
+    AppointmentCreateSerializer,
+    AppointmentListSerializer,
+    AppointmentSerializer,
+    AppointmentSeriesSerializer,
+    FollowingOccurrencesSerializer,
+)
 from apps.services.models import Service
+from apps.team.models import Team
 
 
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+LIST_ACTIONS = {'list', 'today', 'upcoming'}
+
+# (soft, hard) TTLs in seconds of the cached responses: past the soft TTL the
+# entry is served stale while it is recomputed in the background
+LIST_CACHE_TTLS = (120, 600)
+TODAY_CACHE_TTLS = (60, 300)
+UPCOMING_CACHE_TTLS = (120, 600)
+STATS_CACHE_TTLS = (60, 300)
+
+# Longest date range accepted by the availability endpoint
+MAX_AVAILABILITY_DAYS = 31
+
+# Bounds of the next_available search
+MAX_NEXT_AVAILABLE_RESULTS = 50
+MAX_NEXT_AVAILABLE_HORIZON_DAYS = 90
+
+# Largest number of appointments accepted by one bulk request
+MAX_BULK_APPOINTMENTS = 500
+
+DOUBLE_BOOKING_MESSAGE = (
+    "Conflito de agendamento. O profissional já tem um compromisso nesse horário."
+)
+
+
+def save_without_double_booking(save):
+    """
+    Run a write in its own transaction and report a violated double-booking
+    constraint (a concurrent booking won the race) as a validation error.
+    Other integrity errors are not booking conflicts and propagate.
+    """
+    try:
+        with transaction.atomic():
+            return save()
+    except IntegrityError as error:
+        if not is_double_booking_violation(error):
+            raise
+        raise ValidationError(DOUBLE_BOOKING_MESSAGE)
+
 class AppointmentViewSet(viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
+    # Only used when the client asks for it with ?cursor=
+    pagination_class = KeysetPagination
+    keyset_ordering = ('appointment_date', 'appointment_time', 'id')
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -25,45 +97,39 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         Override list method to add caching for the main appointments list
-        Cache key is based on query parameters to ensure different filtered views have separate caches
+        Cache key is based on the normalized query parameters so different filtered views
+        have separate caches, regardless of the order the parameters were sent in
         """
-        # Create a cache key based on the query parameters
-        query_params = request.query_params.urlencode()
-        cache_key = f'appointments_list_{query_params}'
-        
-        # Also set a master key for cache invalidation
-        master_key = 'appointments_list_all'
-        
-        # Try to get from cache first
-        if cache.get(master_key) is None:
-            # If master key is missing, don't use any cached data
-            cached_data = None
-        else:
-            cached_data = cache.get(cache_key)
-            
-        if cached_data is not None:
-            return Response(cached_data)
-            
-        # If not in cache, proceed with normal list retrieval
-        response = super().list(request, *args, **kwargs)
-        
-        # Cache for 2 minutes (adjust based on how frequently your data changes)
-        cache.set(cache_key, response.data, 120)
-        
-        # Set or refresh the master key
-        cache.set(master_key, True, 120)
-        
-        return response
+        cache_key = versioned_key(
+            'appointments', 'list', normalize_query_params(request.query_params)
+        )
+
+        def compute():
+            return super(AppointmentViewSet, self).list(request, *args, **kwargs).data
+
+        return Response(cached_value(cache_key, compute, *LIST_CACHE_TTLS))
     
     def get_queryset(self):
         # Optimized queryset with efficient prefetching
         queryset = Appointment.objects.select_related(
             'client', 
             'team_member'
-        ).prefetch_related(
-            Prefetch('services', queryset=Service.objects.only('id', 'name', 'price', 'duration_minutes'))
         )
+
+        # List-style responses read the denormalized service columns; only the
+        # detail serializer nests the services themselves
+        if self.action not in LIST_ACTIONS:
+            queryset = queryset.prefetch_related('services')
         
+        # Apply all filters at once
+        filters = self._build_filters()
+        if filters:
+            queryset = queryset.filter(filters)
+            
+        return queryset.order_by('appointment_date', 'appointment_time')
+    
+    def _build_filters(self):
+        """Filters shared by the list and export endpoints, built from the query params"""
         # Build filters efficiently
         filters = Q()
         
@@ -85,49 +151,32 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         team_member = self.request.query_params.get('team_member')
         if team_member:
             filters &= Q(team_member_id=team_member)
-        
-        # Apply all filters at once
-        if filters:
-            queryset = queryset.filter(filters)
-            
-        return queryset.order_by('appointment_date', 'appointment_time')
-    
+
+        return filters
+
     def perform_create(self, serializer):
-        appointment = serializer.save()
-        # Calculate total price after saving (needed for M2M relationships)
-        if appointment.services.exists():
-            appointment.total_price = appointment.calculate_total_price()
-            appointment.save(update_fields=['total_price'])
-        
-        # Invalidate relevant caches when a new appointment is created
-        self._invalidate_appointment_caches(appointment)
+        # The serializer fills total_price and the service columns on insert;
+        # the post_save signal bumps the cache generations once it commits
+        save_without_double_booking(serializer.save)
+
+    def perform_update(self, serializer):
+        save_without_double_booking(serializer.save)
     
     @action(detail=False, methods=['get'])
+    @conditional_on('appointments', daily=True)
     def today(self, request):
         """Get today's appointments - optimized with caching"""
-        today = timezone.now().date()
-        cache_key = f'appointments_today_{today}'
-        
-        # Try to get from cache first
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            resp = Response(cached_data)
-            # Client caching: 60s, allow stale-while-revalidate
-            resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-            return resp
-
-        # Not cached: query database using optimized queryset
-        appointments = self.get_queryset().filter(appointment_date=today)
-        serializer = AppointmentListSerializer(appointments, many=True)
+        today = timezone.localdate()
 
-        # Cache the serialized data for 5 minutes
-        cache.set(cache_key, serializer.data, 300)
+        def compute():
+            appointments = self.get_queryset().filter(appointment_date=today)
+            return AppointmentListSerializer(appointments, many=True).data
 
-        resp = Response(serializer.data)
-        resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-        return resp
+        data = cached_value(versioned_key('appointments', 'today', today), compute, *TODAY_CACHE_TTLS)
+        return Response(data)
 
     @action(detail=False, methods=['get'])
+    @conditional_on('appointments', daily=True)
     def section_stats(self, request):
         """
         Stats for AppointmentsSection cards with caching:
@@ -136,35 +185,29 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         - confirmed_appointments: total count with status 'confirmed'
         - total_revenue: sum of total_price across all appointments
         """
-        today = timezone.now().date()
-        cache_key = f'appointments_section_stats_{today}'
-
-        cached = cache.get(cache_key)
-        if cached is not None:
-            resp = Response(cached)
-            resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-            return resp
-
-        total_appointments = Appointment.objects.count()
-        today_appointments = Appointment.objects.filter(appointment_date=today).count()
-        confirmed_appointments = Appointment.objects.filter(status='confirmed').count()
-        total_revenue = (
-            Appointment.objects.aggregate(total=Sum('total_price'))['total'] or 0
-        )
+        today = timezone.localdate()
 
-        data = {
-            'total_appointments': total_appointments,
-            'today_appointments': today_appointments,
-            'confirmed_appointments': confirmed_appointments,
-            'total_revenue': float(total_revenue),
-            'date': str(today),
-        }
+        def compute():
+            # One aggregate over the daily rollups instead of four scans of the appointments
+            totals = DailyAppointmentRollup.objects.aggregate(
+                total_appointments=Sum('appointment_count'),
+                today_appointments=Sum('appointment_count', filter=Q(date=today)),
+                confirmed_appointments=Sum('appointment_count', filter=Q(status='confirmed')),
+                total_revenue=Sum('revenue'),
+            )
+            return {
+                'total_appointments': totals['total_appointments'] or 0,
+                'today_appointments': totals['today_appointments'] or 0,
+                'confirmed_appointments': totals['confirmed_appointments'] or 0,
+                'total_revenue': float(totals['total_revenue'] or 0),
+                'date': str(today),
+            }
+
+        data = cached_value(versioned_key('appointments', 'section_stats', today), compute, *STATS_CACHE_TTLS)
+        return Response(data)
 
-        cache.set(cache_key, data, 60)
-        resp = Response(data)
-        resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-        return resp
     @action(detail=False, methods=['get'])
+    @conditional_on('appointments', daily=True)
     def stats(self, request):
         """
         Return dashboard stats with caching:
@@ -173,96 +216,149 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         - month_revenue: sum of total_price for current month's completed appointments
         - previous_month_revenue: sum of total_price for previous month's completed appointments
         """
-        today = timezone.now().date()
-        first_day_month = today.replace(day=1)
-        cache_key = f'appointments_stats_{today}'
-
-        cached = cache.get(cache_key)
-        if cached is not None:
-            resp = Response(cached)
-            resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-            return resp
-
-        # Today's appointments count (all statuses)
-        today_count = Appointment.objects.filter(appointment_date=today).count()
-
-        # Revenue only from completed appointments
-        today_rev = (
-            Appointment.objects
-            .filter(appointment_date=today, status='completed')
-            .aggregate(total=Sum('total_price'))['total'] or 0
-        )
+        today = timezone.localdate()
 
-        month_rev = (
-            Appointment.objects
-            .filter(appointment_date__gte=first_day_month,
-                    appointment_date__lte=today,
-                    status='completed')
-            .aggregate(total=Sum('total_price'))['total'] or 0
-        )
+        def compute():
+            first_day_month = today.replace(day=1)
+            # Previous month period
+            prev_month_last_day = first_day_month - timedelta(days=1)
+            prev_month_first_day = prev_month_last_day.replace(day=1)
 
-        # Previous month period
-        prev_month_last_day = first_day_month - timedelta(days=1)
-        prev_month_first_day = prev_month_last_day.replace(day=1)
-        prev_month_rev = (
-            Appointment.objects
-            .filter(appointment_date__gte=prev_month_first_day,
-                    appointment_date__lte=prev_month_last_day,
-                    status='completed')
-            .aggregate(total=Sum('total_price'))['total'] or 0
-        )
+            # Read from the daily rollups, restricted to the two months involved;
+            # revenue only counts completed appointments
+            completed = Q(status='completed')
+            totals = DailyAppointmentRollup.objects.filter(
+                date__gte=prev_month_first_day, date__lte=today
+            ).aggregate(
+                today_count=Sum('appointment_count', filter=Q(date=today)),
+                today_rev=Sum('revenue', filter=completed & Q(date=today)),
+                month_rev=Sum('revenue', filter=completed & Q(date__gte=first_day_month)),
+                prev_month_rev=Sum('revenue', filter=completed & Q(date__lte=prev_month_last_day)),
+            )
+            return {
+                'today_appointments_count': totals['today_count'] or 0,
+                'today_revenue': float(totals['today_rev'] or 0),
+                'month_revenue': float(totals['month_rev'] or 0),
+                'previous_month_revenue': float(totals['prev_month_rev'] or 0),
+                'date': str(today),
+            }
 
-        data = {
-            'today_appointments_count': today_count,
-            'today_revenue': float(today_rev),
-            'month_revenue': float(month_rev),
-            'previous_month_revenue': float(prev_month_rev),
-            'date': str(today),
-        }
+        data = cached_value(versioned_key('appointments', 'stats', today), compute, *STATS_CACHE_TTLS)
+        return Response(data)
 
-        # Cache for 60s
-        cache.set(cache_key, data, 60)
-        resp = Response(data)
-        resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-        return resp
-        
-        # If not in cache, query database
-        appointments = self.get_queryset().filter(appointment_date=today)
-        serializer = AppointmentListSerializer(appointments, many=True)
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, serializer.data, 300)
-        resp = Response(serializer.data)
-        resp['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=60'
-        return resp
-    
     @action(detail=False, methods=['get'])
+    @conditional_on('appointments', daily=True)
     def upcoming(self, request):
         """Get upcoming appointments (next 7 days) - optimized with caching"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         next_week = today + timedelta(days=7)
-        cache_key = f'appointments_upcoming_{today}_{next_week}'
-        
-        # Try to get from cache first
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            resp = Response(cached_data)
-            resp['Cache-Control'] = 'public, max-age=120, stale-while-revalidate=60'
-            return resp
-        
-        # If not in cache, query database
-        appointments = self.get_queryset().filter(
-            appointment_date__range=[today, next_week],
-            status__in=['scheduled', 'confirmed']
+
+        def compute():
+            appointments = self.get_queryset().filter(
+                appointment_date__range=[today, next_week],
+                status__in=['scheduled', 'confirmed']
+            )
+            return AppointmentListSerializer(appointments, many=True).data
+
+        data = cached_value(
+            versioned_key('appointments', 'upcoming', today, next_week), compute, *UPCOMING_CACHE_TTLS
         )
-        serializer = AppointmentListSerializer(appointments, many=True)
-        
-        # Cache for 10 minutes
-        cache.set(cache_key, serializer.data, 600)
-        resp = Response(serializer.data)
-        resp['Cache-Control'] = 'public, max-age=120, stale-while-revalidate=60'
-        return resp
-    
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every appointment matching the list filters (start_date, end_date,
+        status, team_member) as NDJSON, or as CSV with ?output=csv
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {'error': 'Formato de exportação inválido. Use ndjson ou csv'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # The filename is built from the parsed dates, never from the raw params
+        bounds = {}
+        for param, default in (('start_date', 'inicio'), ('end_date', 'fim')):
+            value = request.query_params.get(param)
+            try:
+                bounds[param] = datetime.strptime(value, '%Y-%m-%d').date().isoformat() if value else default
+            except ValueError:
+                return Response(
+                    {'error': 'Formato de data inválido. Use YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        queryset = Appointment.objects.filter(self._build_filters()).order_by(
+            'appointment_date', 'appointment_time', 'id'
+        )
+        stream = stream_csv(queryset) if output == 'csv' else stream_ndjson(queryset)
+
+        response = StreamingHttpResponse(stream, content_type=EXPORT_CONTENT_TYPES[output])
+        start, end = bounds['start_date'], bounds['end_date']
+        response['Content-Disposition'] = f'attachment; filename="agendamentos_{start}_{end}.{output}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many appointments in one request. The body is a list of
+        appointments, or {"appointments": [...], "atomic": true} to create
+        none of them unless all are valid. Otherwise the valid ones are
+        created and the others are reported by their index in the list.
+        """
+        payload = request.data
+        atomic = False
+        if isinstance(payload, dict):
+            atomic = str(payload.get('atomic', '')).lower() in ('true', '1')
+            payload = payload.get('appointments')
+        if not isinstance(payload, list) or not payload:
+            return Response(
+                {'error': 'Envie uma lista de agendamentos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(payload) > MAX_BULK_APPOINTMENTS:
+            return Response(
+                {'error': f'No máximo {MAX_BULK_APPOINTMENTS} agendamentos por requisição'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        errors = {}
+        items = {}
+        for index, entry in enumerate(payload):
+            serializer = AppointmentBulkItemSerializer(data=entry)
+            if serializer.is_valid():
+                items[index] = serializer.validated_data
+            else:
+                errors[index] = serializer.errors
+
+        created = []
+        if items and not (atomic and errors):
+            indexes = list(items)
+            try:
+                result = book_appointments([items[index] for index in indexes], atomic=atomic)
+            except IntegrityError:
+                # A concurrent booking took one of the slots after the check
+                raise ValidationError(DOUBLE_BOOKING_MESSAGE)
+            for position, messages in result.errors.items():
+                errors[indexes[position]] = messages
+            created = [
+                {'index': indexes[position], 'id': appointment.id}
+                for position, appointment in result.created
+            ]
+            if created:
+                bump_generation('appointments', 'clients')
+
+        return Response(
+            {
+                'created': created,
+                'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """Update appointment status"""
@@ -270,12 +366,22 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         new_status = request.data.get('status')
         
         if new_status in dict(Appointment.STATUS_CHOICES):
+            reactivating = (
+                new_status in Appointment.ACTIVE_STATUSES
+                and appointment.status not in Appointment.ACTIVE_STATUSES
+            )
+            if reactivating and appointment.team_member_id and conflicting_appointments(
+                appointment.team_member_id, appointment.starts_at, appointment.ends_at,
+                exclude_id=appointment.pk
+            ).exists():
+                return Response(
+                    {'error': DOUBLE_BOOKING_MESSAGE},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
             appointment.status = new_status
-            appointment.save(update_fields=['status'])
-            
-            # Invalidate caches when status changes
-            self._invalidate_appointment_caches(appointment)
-            
+            save_without_double_booking(lambda: appointment.save(update_fields=['status']))
+
             serializer = self.get_serializer(appointment)
             return Response(serializer.data)
         
@@ -304,84 +410,225 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Cache key for available slots
-        cache_key = f'available_slots_{team_member_id}_{date}'
-        cached_slots = cache.get(cache_key)
-        if cached_slots is not None:
-            return Response({'available_slots': cached_slots})
-        
-        # Get existing appointments to calculate occupied slots including duration
-        existing_appointments = Appointment.objects.filter(
-            team_member_id=team_member_id,
-            appointment_date=appointment_date,
-            status__in=['scheduled', 'confirmed', 'in_progress']
-        ).prefetch_related('services')
-
-        occupied_slots = set()
-        for app in existing_appointments:
-            start_time = app.appointment_time
-            duration = app.calculate_total_duration()
-            if duration > 0:
-                # Combine date and time for accurate calculations
-                start_datetime = datetime.combine(appointment_date, start_time)
-                end_datetime = start_datetime + timedelta(minutes=duration)
-
-                # Add all 30-minute intervals covered by the appointment to occupied_slots
-                current_slot_time = start_datetime
-                while current_slot_time < end_datetime:
-                    occupied_slots.add(current_slot_time.time())
-                    current_slot_time += timedelta(minutes=30)
-
-        # Pre-generate all possible slots
-        all_slots = [
-            f'{hour:02d}:{minute:02d}'
-            for hour in range(7, 21)  # Hours from 07:00 to 20:xx
-            for minute in [0, 30]
-        ]
-
-        # Filter out occupied slots
+        # Stored occupancy bitmap of the day, a single key lookup; a slot is
+        # free when the whole slot interval is
+        occupied = load_day_occupancy(team_member_id, appointment_date)
+        _, _, interval = hours = working_hours()
         available_slots = [
-            slot for slot in all_slots
-            if datetime.strptime(slot, '%H:%M').time() not in occupied_slots
+            format_minute(minute)
+            for minute in available_starts(occupied, interval, hours)
         ]
         
-        # Cache for 15 minutes
-        cache.set(cache_key, available_slots, 900)
         return Response({'available_slots': available_slots})
         
-    def update(self, request, *args, **kwargs):
-        """Override update to invalidate caches"""
-        response = super().update(request, *args, **kwargs)
-        self._invalidate_appointment_caches(self.get_object())
-        return response
-        
-    def destroy(self, request, *args, **kwargs):
-        """Override destroy to invalidate caches"""
-        appointment = self.get_object()
-        response = super().destroy(request, *args, **kwargs)
-        self._invalidate_appointment_caches(appointment)
-        return response
-        
-    def _invalidate_appointment_caches(self, appointment):
-        """Helper method to invalidate relevant caches when an appointment changes"""
-        # Clear today cache if the appointment is for today
-        today = timezone.now().date()
-        if appointment.appointment_date == today:
-            cache.delete(f'appointments_today_{today}')
-            
-        # Clear upcoming cache if appointment is in the next 7 days
-        next_week = today + timedelta(days=7)
-        if today <= appointment.appointment_date <= next_week:
-            cache.delete(f'appointments_upcoming_{today}_{next_week}')
-            
-        # Clear available slots cache for this team member and date
-        cache.delete(f'available_slots_{appointment.team_member_id}_{appointment.appointment_date}')
-        
-        # Clear list caches - using a simple approach that works with all cache backends
-        # In a production environment with many users, you might want a more targeted approach
-        # For now, we'll just invalidate all list caches with a single key
-        cache.delete('appointments_list_all')
-
-        # Invalidate stats cache (simple key per day)
-        cache.delete(f'appointments_stats_{timezone.now().date()}')
-        cache.delete(f'appointments_section_stats_{timezone.now().date()}')
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        Available start times for several team members over a date range:
+        ?team_members=1,2&start=YYYY-MM-DD&end=YYYY-MM-DD&duration=60
+        team_members defaults to every active professional, end to start and
+        duration to the slot interval. Only starts where the whole duration fits
+        inside working hours are returned.
+        """
+        params = request.query_params
+        try:
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(params.get('end', params['start']), '%Y-%m-%d').date()
+        except KeyError:
+            return Response(
+                {'error': 'A data inicial (start) é obrigatória'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Formato de data inválido. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end < start or (end - start).days >= MAX_AVAILABILITY_DAYS:
+            return Response(
+                {'error': f'O período deve ter entre 1 e {MAX_AVAILABILITY_DAYS} dias'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        _, _, interval = hours = working_hours()
+        try:
+            duration = int(params.get('duration', interval))
+            requested_ids = [
+                int(value)
+                for raw in params.getlist('team_members')
+                for value in raw.split(',') if value.strip()
+            ]
+        except ValueError:
+            return Response(
+                {'error': 'duration e team_members devem ser números inteiros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if duration <= 0:
+            return Response(
+                {'error': 'A duração deve ser maior que zero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        team_members = Team.objects.filter(is_active=True)
+        if requested_ids:
+            team_members = team_members.filter(id__in=requested_ids)
+        team_member_ids = list(team_members.order_by('name').values_list('id', flat=True))
+
+        occupied = load_occupancy(team_member_ids, start, end)
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        availability = [
+            {
+                'team_member': team_member_id,
+                'date': str(day),
+                'slots': [
+                    format_minute(minute)
+                    for minute in available_starts(occupied[(team_member_id, day)], duration, hours)
+                ],
+            }
+            for team_member_id in team_member_ids
+            for day in days
+        ]
+
+        return Response({
+            'start': str(start),
+            'end': str(end),
+            'duration': duration,
+            'slot_interval': interval,
+            'availability': availability,
+        })
+
+    @action(detail=False, methods=['get'])
+    def next_available(self, request):
+        """
+        Earliest start times for a set of services across every active professional
+        whose specialties cover all of them:
+        ?services=1,2&limit=5&horizon=14&start=YYYY-MM-DD
+        The search walks forward from start (default today) and stops as soon as
+        `limit` results are found or the horizon (in days) is exhausted.
+        """
+        params = request.query_params
+        try:
+            service_ids = {
+                int(value)
+                for raw in params.getlist('services')
+                for value in raw.split(',') if value.strip()
+            }
+            limit = min(max(int(params.get('limit', 5)), 1), MAX_NEXT_AVAILABLE_RESULTS)
+            horizon = min(max(int(params.get('horizon', 14)), 1), MAX_NEXT_AVAILABLE_HORIZON_DAYS)
+        except ValueError:
+            return Response(
+                {'error': 'services, limit e horizon devem ser números inteiros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not service_ids:
+            return Response(
+                {'error': 'Informe ao menos um serviço'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        now = timezone.localtime()
+        try:
+            first_day = datetime.strptime(params['start'], '%Y-%m-%d').date() if 'start' in params else now.date()
+        except ValueError:
+            return Response(
+                {'error': 'Formato de data inválido. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        first_day = max(first_day, now.date())
+
+        services = list(Service.objects.filter(id__in=service_ids, is_active=True).only('duration_minutes'))
+        if len(services) != len(service_ids):
+            return Response(
+                {'error': 'Serviço não encontrado ou inativo'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        duration = sum(service.duration_minutes for service in services)
+
+        # Professionals offering every requested service, in a stable order
+        team_members = dict(
+            Team.objects.filter(is_active=True)
+            .annotate(matched=Count('specialties', filter=Q(specialties__in=service_ids), distinct=True))
+            .filter(matched=len(service_ids))
+            .order_by('name', 'id')
+            .values_list('id', 'name')
+        )
+
+        earliest_minute = now.hour * 60 + now.minute + 1 if first_day == now.date() else 0
+        starts = iter_available_starts(
+            list(team_members), duration, first_day,
+            first_day + timedelta(days=horizon - 1), earliest_minute
+        )
+        results = [
+            {
+                'team_member': team_member_id,
+                'team_member_name': team_members[team_member_id],
+                'date': str(day),
+                'time': format_minute(minute),
+            }
+            for day, minute, team_member_id in islice(starts, limit)
+        ]
+        return Response({'duration': duration, 'results': results})
+
+
+class AppointmentSeriesViewSet(viewsets.ModelViewSet):
+    """
+    Recurring appointments. Creating a series books its occurrences up to
+    the rolling horizon; later ones are booked by extend_appointment_series.
+    Series are changed through the "this and following" actions only.
+    """
+    queryset = AppointmentSeries.objects.select_related('client', 'team_member').prefetch_related('services')
+    serializer_class = AppointmentSeriesSerializer
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            series = serializer.save()
+            dates, result = recurrence.materialize_series(series)
+        series.refresh_from_db()
+        data = self.get_serializer(series).data
+        data['occurrences'] = {
+            'created': [
+                {'date': str(appointment.appointment_date), 'id': appointment.id}
+                for _, appointment in result.created
+            ],
+            'skipped': [
+                {'date': str(dates[index]), 'errors': errors}
+                for index, errors in sorted(result.errors.items())
+            ],
+        }
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def update_following(self, request, pk=None):
+        """Change the time and/or notes of the occurrences from from_date on"""
+        series = self.get_object()
+        body = FollowingOccurrencesSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        target, updated, result = recurrence.reschedule_following(
+            series,
+            body.validated_data['from_date'],
+            appointment_time=body.validated_data.get('appointment_time'),
+            notes=body.validated_data.get('notes'),
+        )
+        if result.errors:
+            return Response(
+                {
+                    'error': 'O novo horário conflita com outros agendamentos',
+                    'conflicts': [
+                        {'date': str(day), 'errors': errors} for day, errors in sorted(result.errors.items())
+                    ],
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'series': target.id, 'updated': updated})
+
+    @action(detail=True, methods=['post'])
+    def cancel_following(self, request, pk=None):
+        """Cancel the occurrences from from_date on and end the series there"""
+        series = self.get_object()
+        body = FollowingOccurrencesSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        cancelled = recurrence.cancel_following(series, body.validated_data['from_date'])
+        return Response({'cancelled': cancelled})
@@ -0,0 +1,63 @@
+"""
+Upcoming birthdays.
+
+``Client.birthday_key`` holds the month and day of the birthday as
+month * 100 + day (704 for July 4th). ``Client.save`` keeps it up to date
+and it is indexed, so "whose birthday falls in the next N days" is one
+range on that index (two when the window crosses New Year) rather than a
+scan comparing dates. Clients born on February 29th have their birthday
+on February 28th in common years.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+
+DEFAULT_BIRTHDAY_WINDOW_DAYS = 14
+MAX_BIRTHDAY_WINDOW_DAYS = 365
+
+LEAP_DAY_KEY = 229
+
+
+def birthday_key(birthday):
+    """month * 100 + day of a date, None without one"""
+    return birthday.month * 100 + birthday.day if birthday else None
+
+
+def upcoming_birthdays(queryset, today, days):
+    """
+    Clients of ``queryset`` whose birthday falls between ``today`` and
+    ``days`` days later (both included), soonest first.
+    """
+    end = today + timedelta(days=days)
+    start_key, end_key = birthday_key(today), birthday_key(end)
+    if end_key == 228 and not calendar.isleap(end.year):
+        end_key = LEAP_DAY_KEY
+
+    if days < MAX_BIRTHDAY_WINDOW_DAYS and end.year == today.year:
+        return queryset.filter(birthday_key__gte=start_key, birthday_key__lte=end_key).order_by(
+            'birthday_key', 'name', 'id'
+        )
+
+    if days >= MAX_BIRTHDAY_WINDOW_DAYS:
+        condition = Q(birthday_key__isnull=False)
+    else:
+        condition = Q(birthday_key__gte=start_key) | Q(birthday_key__lte=end_key)
+    # Birthdays after New Year come last
+    return queryset.filter(condition).annotate(
+        birthday_next_year=Case(
+            When(birthday_key__gte=start_key, then=Value(0)), default=Value(1), output_field=IntegerField()
+        )
+    ).order_by('birthday_next_year', 'birthday_key', 'name', 'id')
+
+
+def next_birthday(birthday, today):
+    """The date of the first birthday on or after ``today``"""
+    for year in (today.year, today.year + 1):
+        try:
+            day = birthday.replace(year=year)
+        except ValueError:
+            day = date(year, 2, 28)
+        if day >= today:
+            return day
@@ -0,0 +1,236 @@
+"""
+Bulk client import.
+
+``import_clients`` reads CSV or NDJSON lines one record at a time and
+handles them in batches of IMPORT_BATCH_SIZE, so memory depends on the batch
+size and not on the file. Rows are validated with
+``ClientCreateUpdateSerializer`` and each batch is upserted by phone in one
+transaction: the batch's phones are resolved to existing clients with one
+query on the phone index, matches are updated by primary key and the rest
+are inserted with ``bulk_create``.
+
+Phones are compared by their 11 digits (punctuation and a leading 55
+country code are dropped). Within a file a later row for a phone overwrites
+the columns it has; a phone shared by several existing clients cannot be told
+apart and is reported as an error. Columns missing from a row keep the
+existing client's values.
+
+Bulk writes send no signals and skip ``Client.save``, so each batch fills
+search_name and birthday_key and updates the registration counters itself,
+and the cache namespaces are bumped once at the end.
+"""
+import csv
+import json
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.cache import bump_generation
+from .birthdays import birthday_key
+from .models import Client
+from .registrations import apply_registration_changes, registration_state
+from .search import normalize_search_text
+from .serializers import ClientCreateUpdateSerializer
+
+
+IMPORT_BATCH_SIZE = 1000
+# Row errors listed in the report; further ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_FIELDS = ('name', 'phone', 'email', 'address', 'birthday', 'gender')
+UPDATED_FIELDS = [*IMPORT_FIELDS, 'search_name', 'birthday_key', 'updated_at']
+
+AMBIGUOUS_PHONE_MESSAGE = 'Mais de um cliente cadastrado com este telefone.'
+NAME_REQUIRED_MESSAGE = 'O nome é obrigatório para novos clientes.'
+UNREADABLE_FILE_MESSAGE = 'Arquivo ilegível a partir desta linha; use CSV ou NDJSON em UTF-8.'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(value):
+    """The 11 digits of a Brazilian phone typed with punctuation or a +55 prefix"""
+    digits = _NON_DIGITS.sub('', str(value or ''))
+    if len(digits) == 13 and digits.startswith('55'):
+        digits = digits[2:]
+    return digits
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.error_count = 0
+
+    def add_error(self, row, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def iter_csv_records(lines):
+    """(row number, record) pairs of a CSV file with a header line; empty cells are left out"""
+    reader = csv.reader(lines)
+    header = [column.strip().lower() for column in next(reader, [])]
+    for number, values in enumerate(reader, start=1):
+        if not any(values):
+            continue
+        yield number, {column: value.strip() for column, value in zip(header, values) if value.strip()}
+
+
+def iter_ndjson_records(lines):
+    """(row number, record) pairs of an NDJSON file; invalid lines yield their error message"""
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, 'JSON inválido.'
+            continue
+        if not isinstance(record, dict):
+            yield number, 'Cada linha deve ser um objeto JSON.'
+            continue
+        yield number, {key: value for key, value in record.items() if value not in ('', None)}
+
+
+def import_clients(lines, input_format, batch_size=None):
+    """
+    Import the clients of ``lines`` (an iterable of text lines, in
+    ``input_format``: csv or ndjson) ``batch_size`` rows per transaction
+    (IMPORT_BATCH_SIZE by default) and return an ``ImportResult``.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    records = iter_csv_records(lines) if input_format == 'csv' else iter_ndjson_records(lines)
+    result = ImportResult()
+    batch = []
+    number = 0
+    try:
+        for number, record in records:
+            if isinstance(record, str):
+                result.add_error(number, {'non_field_errors': [record]})
+                continue
+            batch.append((number, record))
+            if len(batch) == batch_size:
+                _import_batch(batch, result)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as error:
+        # The rest of the file cannot be read; what was read is still imported
+        result.add_error(number + 1, {'non_field_errors': [f'{UNREADABLE_FILE_MESSAGE} ({error})']})
+    if batch:
+        _import_batch(batch, result)
+
+    if result.updated:
+        # Appointment responses embed client names
+        bump_generation('clients', 'appointments')
+    elif result.created:
+        bump_generation('clients')
+    return result
+
+
+def _import_batch(batch, result):
+    # One serializer for the whole batch, so its fields are built once;
+    # partial since rows updating a client may leave columns out
+    serializer = ClientCreateUpdateSerializer(partial=True)
+    required = serializer.fields['phone'].error_messages['required']
+    # Later rows for a phone overwrite the columns they have, as they
+    # would in a later batch
+    rows = {}
+    for number, record in batch:
+        record = {field: record[field] for field in IMPORT_FIELDS if field in record}
+        if 'phone' not in record:
+            result.add_error(number, {'phone': [required]})
+            continue
+        record['phone'] = normalize_phone(record['phone'])
+        try:
+            data = serializer.run_validation(record)
+        except ValidationError as error:
+            result.add_error(number, error.detail)
+            continue
+        previous = rows.get(data['phone'])
+        rows[data['phone']] = (number, {**previous[1], **data} if previous else data)
+    if rows:
+        _upsert(rows, result)
+
+
+def _upsert(rows, result):
+    existing = {}
+    for client in Client.objects.filter(phone__in=rows).order_by('id'):
+        existing.setdefault(client.phone, []).append(client)
+
+    now = timezone.now()
+    created, updated, removed, added = [], [], [], []
+    for phone, (number, data) in rows.items():
+        matches = existing.get(phone, [])
+        if len(matches) > 1:
+            result.add_error(number, {'phone': [AMBIGUOUS_PHONE_MESSAGE]})
+            continue
+        if not matches and 'name' not in data:
+            result.add_error(number, {'name': [NAME_REQUIRED_MESSAGE]})
+            continue
+        client = matches[0] if matches else Client()
+        if matches:
+            if all(getattr(client, field) == value for field, value in data.items()):
+                # Re-imports of the same file rewrite nothing
+                result.unchanged += 1
+                continue
+            removed.append(registration_state(client.created_at, client.gender))
+        for field, value in data.items():
+            setattr(client, field, value)
+        client.search_name = normalize_search_text(client.name)
+        client.birthday_key = birthday_key(client.birthday)
+        if matches:
+            client.updated_at = now
+            added.append(registration_state(client.created_at, client.gender))
+            updated.append(client)
+        else:
+            created.append(client)
+
+    with transaction.atomic():
+        _update_rows(updated)
+        Client.objects.bulk_create(created)
+        apply_registration_changes(
+            removed=removed,
+            added=added + [registration_state(client.created_at, client.gender) for client in created],
+        )
+    result.created += len(created)
+    result.updated += len(updated)
+
+
+def _update_rows(clients):
+    """
+    Write UPDATED_FIELDS of ``clients`` with one parameterized UPDATE by
+    primary key run through ``executemany``. ``bulk_update`` builds a CASE
+    expression per field over the whole batch, which is slower to compile and
+    to run than the batch's rows one by one.
+    """
+    if not clients:
+        return
+    fields = [Client._meta.get_field(name) for name in UPDATED_FIELDS]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+        quote(Client._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(Client._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(client, field.attname), connection) for field in fields] + [client.pk]
+        for client in clients
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
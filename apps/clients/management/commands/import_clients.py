@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.clients.importer import IMPORT_BATCH_SIZE, IMPORT_FORMATS, import_clients
+
+
+class Command(BaseCommand):
+    help = "Import clients from a CSV (with a header line) or NDJSON file, updating the ones whose phone is known."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import")
+        parser.add_argument(
+            "--input", choices=IMPORT_FORMATS, help="File format (default: from the extension, .csv or .ndjson)"
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows written per transaction")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        input_format = options["input"] or {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(
+            path.suffix.lower()
+        )
+        if input_format is None:
+            raise CommandError("Cannot tell the format from the extension; use --input csv or --input ndjson")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        try:
+            with path.open(encoding="utf-8-sig", newline="") as lines:
+                result = import_clients(lines, input_format, options["batch_size"])
+        except OSError as error:
+            raise CommandError(f"Cannot read {path}: {error}")
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... and {result.error_count - len(result.errors)} more rows with errors")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.created}, updated {result.updated} and left {result.unchanged} clients unchanged; "
+            f"{result.error_count} rows with errors."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.clients.registrations import rebuild_registration_counts
+from core.cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = "Recompute the monthly client registration counters used by the stats endpoint from the clients."
+
+    def handle(self, *args, **options):
+        rows = rebuild_registration_counts()
+        bump_generation("clients")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} registration counter rows."))
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.contrib.postgres.indexes import OpClass
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+import apps.clients.search
+
+
+def populate_search_names(apps, schema_editor):
+    from apps.clients.search import normalize_search_text
+
+    Client = apps.get_model('clients', 'Client')
+    batch = []
+    for client in Client.objects.only('id', 'name').iterator(chunk_size=1000):
+        client.search_name = normalize_search_text(client.name)
+        batch.append(client)
+        if len(batch) == 1000:
+            Client.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    Client.objects.bulk_update(batch, ['search_name'])
+
+
+def install_search_index(apps, schema_editor):
+    from apps.clients.search import install_search_index
+
+    install_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from apps.clients.search import drop_search_index
+
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_client_clients_cli_name_5ab7bc_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['search_name'], name='clients_search_name_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(populate_search_names, migrations.RunPython.noop),
+        apps.clients.search.PostgresTrigramExtension(),
+        migrations.AddIndex(
+            model_name='client',
+            index=apps.clients.search.PostgresGinIndex(OpClass('search_name', name='gin_trgm_ops'), name='clients_search_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=apps.clients.search.PostgresGinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='clients_email_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=apps.clients.search.PostgresGinIndex(OpClass('phone', name='gin_trgm_ops'), name='clients_phone_trgm'),
+        ),
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:16
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def populate_registration_counts(apps, schema_editor):
+    Client = apps.get_model('clients', 'Client')
+    ClientRegistrationCount = apps.get_model('clients', 'ClientRegistrationCount')
+
+    groups = (
+        Client.objects.order_by()
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values_list('month', 'gender')
+        .annotate(client_count=Count('id'))
+    )
+    counts = Counter()
+    for month, gender, client_count in groups:
+        counts[month, gender or ''] += client_count
+    ClientRegistrationCount.objects.bulk_create(
+        [
+            ClientRegistrationCount(month=month, gender=gender, client_count=count)
+            for (month, gender), count in counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0007_client_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientRegistrationCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('gender', models.CharField(blank=True, default='', max_length=1)),
+                ('client_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('month', 'gender')},
+            },
+        ),
+        migrations.RunPython(populate_registration_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:18
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+def populate_birthday_keys(apps, schema_editor):
+    Client = apps.get_model('clients', 'Client')
+    Client.objects.filter(birthday__isnull=False).update(
+        birthday_key=ExtractMonth('birthday') * 100 + ExtractDay('birthday')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_clientregistrationcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='birthday_key',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['birthday_key'], name='clients_cli_birthda_e28157_idx'),
+        ),
+        migrations.RunPython(populate_birthday_keys, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,10 @@
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models import Count, Max
+from django.db.models.functions import Upper
+
+from .birthdays import birthday_key
+from .search import PostgresGinIndex, normalize_search_text
 from django.core.validators import RegexValidator
 
 
@@ -27,9 +33,22 @@ class Client(models.Model):
         null=True,
         help_text="Client's gender"
     )
+    # Lowercase name without accents, kept in sync on save; see search.py
+    search_name = models.CharField(max_length=100, default='', editable=False)
+    # month * 100 + day of the birthday, kept in sync on save; see birthdays.py
+    birthday_key = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_text(self.name)
+        self.birthday_key = birthday_key(self.birthday)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = {'name': 'search_name', 'birthday': 'birthday_key'}
+            kwargs['update_fields'] = {*update_fields, *(derived[f] for f in update_fields if f in derived)}
+        super().save(*args, **kwargs)
+
     def formatted_phone(self):
         """Format phone number as (xx) xxxxx-xxxx"""
         if len(self.phone) == 11:
@@ -49,4 +68,43 @@ class Client(models.Model):
             models.Index(fields=['updated_at']),
             models.Index(fields=['birthday']),
             models.Index(fields=['gender']),
+            # Prefix searches; the opclass only applies on PostgreSQL
+            models.Index(fields=['search_name'], name='clients_search_name_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['birthday_key']),
+            # Substring searches on PostgreSQL (see search.py); email is
+            # indexed as UPPER(email), the expression icontains compares
+            PostgresGinIndex(OpClass('search_name', name='gin_trgm_ops'), name='clients_search_name_trgm'),
+            PostgresGinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='clients_email_trgm'),
+            PostgresGinIndex(OpClass('phone', name='gin_trgm_ops'), name='clients_phone_trgm'),
         ]
+
+
+class ClientRegistrationCount(models.Model):
+    """
+    Number of clients registered per month and gender, kept up to date by
+    client creations, deletions and gender changes (see registrations.py)
+    so the stats endpoint never scans the clients table.
+
+    gender is '' for clients without one: NULLs would not be unique.
+    """
+    month = models.DateField(help_text="First day of the month")
+    gender = models.CharField(max_length=1, blank=True, default='')
+    client_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.gender or '-'}: {self.client_count}"
+
+    class Meta:
+        unique_together = ['month', 'gender']
+
+
+def with_appointment_stats(queryset):
+    """
+    Annotate each client with ``appointments_total`` and
+    ``last_appointment_date``, computed by the database in the same query
+    instead of loading the client's appointments.
+    """
+    return queryset.annotate(
+        appointments_total=Count('appointments'),
+        last_appointment_date=Max('appointments__appointment_date'),
+    )
@@ -0,0 +1,105 @@
+"""
+Monthly client registration counters.
+
+``ClientRegistrationCount`` holds how many clients were registered per
+(month, gender). Client creations, deletions and gender changes are turned
+into +1/-1 deltas applied with ``F()`` expressions as the change is saved,
+so the stats endpoint reads a few rows per month whatever the number of
+clients. Writes that send no signals (``bulk_create``,
+``QuerySet.update``) must call ``apply_registration_changes`` themselves or
+be followed by ``rebuild_registration_counts``.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Client, ClientRegistrationCount
+
+
+# Client fields the counter keys are made of
+REGISTRATION_FIELDS = {'created_at', 'gender'}
+
+MONTHS_IN_STATS = 12
+
+
+def registration_state(created_at, gender):
+    """The (month, gender) key a client registered at ``created_at`` counts under"""
+    return timezone.localtime(created_at).date().replace(day=1), gender or ''
+
+
+def apply_registration_changes(removed=(), added=()):
+    """Move clients out of and into the counters; both arguments are iterables of (month, gender) keys"""
+    deltas = Counter()
+    deltas.subtract(removed)
+    deltas.update(added)
+    changes = {key: delta for key, delta in deltas.items() if delta}
+    if not changes:
+        return
+
+    with transaction.atomic():
+        ClientRegistrationCount.objects.bulk_create(
+            [ClientRegistrationCount(month=month, gender=gender) for month, gender in changes],
+            ignore_conflicts=True,
+        )
+        # Sorted so concurrent writers touching several keys lock them in the same order
+        for (month, gender), delta in sorted(changes.items()):
+            ClientRegistrationCount.objects.filter(month=month, gender=gender).update(
+                client_count=F('client_count') + delta
+            )
+
+
+def rebuild_registration_counts():
+    """Recompute every counter from the clients table"""
+    groups = (
+        Client.objects.order_by()
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values_list('month', 'gender')
+        .annotate(client_count=Count('id'))
+    )
+    counts = Counter()
+    for month, gender, client_count in groups:
+        # NULL and '' genders are counted together
+        counts[month, gender or ''] += client_count
+    with transaction.atomic():
+        ClientRegistrationCount.objects.all().delete()
+        ClientRegistrationCount.objects.bulk_create(
+            [
+                ClientRegistrationCount(month=month, gender=gender, client_count=count)
+                for (month, gender), count in counts.items()
+            ],
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+def registration_stats(today=None):
+    """
+    Total clients, clients per gender and registrations in each of the last
+    MONTHS_IN_STATS months (current one included), from the counters.
+    """
+    today = today or timezone.localdate()
+    first_month = today.replace(day=1)
+    for _ in range(MONTHS_IN_STATS - 1):
+        first_month = (first_month - timedelta(days=1)).replace(day=1)
+
+    by_gender = (
+        ClientRegistrationCount.objects.order_by('gender').values('gender').annotate(count=Sum('client_count'))
+    )
+    by_month = (
+        ClientRegistrationCount.objects.filter(month__gte=first_month)
+        .order_by('month').values('month').annotate(count=Sum('client_count'))
+    )
+    gender_distribution = [
+        {'gender': row['gender'] or None, 'count': row['count']} for row in by_gender if row['count']
+    ]
+    return {
+        'total_clients': sum(row['count'] for row in gender_distribution),
+        'gender_distribution': gender_distribution,
+        'monthly_registrations': [
+            {'month': f"{row['month']:%Y-%m}", 'count': row['count']} for row in by_month if row['count']
+        ],
+    }
@@ -0,0 +1,273 @@
+"""
+Indexed client search.
+
+Names are matched on ``Client.search_name``, a lowercase copy of the name
+without accents. Substring matches of three or more characters go through a
+trigram index: GIN ``gin_trgm_ops`` indexes on PostgreSQL (which serve
+Django's ``contains``/``icontains`` lookups as they are), and an FTS5 table
+with the trigram tokenizer on SQLite, kept in sync by triggers. Shorter
+terms are prefix matches on B-tree indexes: ``search_name`` has a
+pattern-ops index on PostgreSQL, and phones, which only hold digits, are
+looked up as a [prefix, next prefix) range on the phone index.
+
+The PostgreSQL indexes are declared in ``Client.Meta.indexes`` through
+``PostgresGinIndex``, which creates nothing on other databases.
+``install_search_index`` creates the SQLite part; without it (or on other
+databases) the same conditions fall back to plain lookups.
+"""
+import re
+import unicodedata
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# Trigram indexes can only serve terms of at least this many characters
+MIN_TRIGRAM_LENGTH = 3
+
+SEARCH_RESULT_LIMIT = 20
+MAX_SEARCH_RESULT_LIMIT = 100
+
+FTS_TABLE = 'clients_client_fts'
+FTS_COLUMNS = ('search_name', 'email', 'phone')
+
+_COLUMNS = ', '.join(FTS_COLUMNS)
+_NEW = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+_OLD = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+
+SQLITE_CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_COLUMNS}, content='clients_client', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON clients_client BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMNS}) VALUES (new.id, {_NEW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON clients_client BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMNS}) VALUES ('delete', old.id, {_OLD});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE ON clients_client BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMNS}) VALUES ('delete', old.id, {_OLD});
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMNS}) VALUES (new.id, {_NEW});
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+FTS_MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+
+_NON_DIGITS = re.compile(r'\D')
+_PHONE_QUERY = re.compile(r'^[\d\s().+-]+$')
+
+
+def normalize_search_text(value):
+    """Lowercase, accent-free, single-spaced form of a name"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+class PostgresGinIndex(GinIndex):
+    """
+    A ``GinIndex`` that is a no-op on databases other than PostgreSQL.
+    Schema editors execute whatever SQL an index returns, so elsewhere it is
+    a comment rather than None.
+    """
+
+    def _skip_sql(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return f'-- {self.name}: PostgreSQL only'
+        return None
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        return self._skip_sql(schema_editor) or super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        return self._skip_sql(schema_editor) or super().remove_sql(model, schema_editor, **kwargs)
+
+
+class PostgresTrigramExtension(TrigramExtension):
+    """``TrigramExtension`` that can also be unapplied on other databases"""
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def install_search_index(connection):
+    """Create the FTS5 table and its triggers on SQLite"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                for statement in SQLITE_CREATE_SQL:
+                    cursor.execute(statement)
+            except OperationalError:
+                # SQLite built without FTS5 or older than 3.34 (no trigram
+                # tokenizer): searches use plain lookups
+                for statement in SQLITE_DROP_SQL:
+                    cursor.execute(statement)
+    _fts_tables.clear()
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for statement in SQLITE_DROP_SQL:
+                cursor.execute(statement)
+    _fts_tables.clear()
+
+
+# Per database alias, whether the FTS5 table exists
+_fts_tables = {}
+
+
+def _uses_fts():
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_tables:
+        _fts_tables[connection.alias] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[connection.alias]
+
+
+def _fts_match(column, term):
+    phrase = '"%s"' % term.replace('"', '""')
+    return Q(id__in=RawSQL(FTS_MATCH_SQL, [f'{column} : {phrase}']))
+
+
+def _contains(column, term):
+    """Rows whose ``column`` contains ``term``, through the trigram index when the term is long enough"""
+    if len(term) >= MIN_TRIGRAM_LENGTH and _uses_fts():
+        return _fts_match(column, term)
+    lookup = 'icontains' if column == 'email' else 'contains'
+    return Q(**{f'{column}__{lookup}': term})
+
+
+def _range_prefix(column, prefix):
+    """``column`` starts with ``prefix``, as a range any B-tree index can scan"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{column}__gte': prefix, f'{column}__lt': upper})
+
+
+def _name_prefix(prefix):
+    if connection.vendor == 'postgresql':
+        # Served by the varchar_pattern_ops index
+        return Q(search_name__startswith=prefix)
+    return _range_prefix('search_name', prefix)
+
+
+def name_condition(value):
+    """Filter for names containing every word of ``value``, accents and case ignored"""
+    condition = Q()
+    for word in normalize_search_text(value).split():
+        condition &= _contains('search_name', word)
+    return condition
+
+
+def phone_condition(value):
+    """Filter for phones containing the digits of ``value``"""
+    digits = _NON_DIGITS.sub('', value)
+    return _contains('phone', digits) if digits else Q()
+
+
+def email_condition(value):
+    value = value.strip()
+    return _contains('email', value) if value else Q()
+
+
+def _fts_rowids(expression, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(FTS_MATCH_SQL + ' LIMIT %s', [expression, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fts_phrases(column, terms):
+    return ' AND '.join(f'{column} : "%s"' % term.replace('"', '""') for term in terms)
+
+
+def _tier_ids(queryset, condition, ordering, limit, seen):
+    """Up to ``limit`` ids matching ``condition`` that are not in ``seen``"""
+    queryset = queryset.filter(condition).order_by(*ordering).values_list('id', flat=True)
+    return [client_id for client_id in queryset[:limit + len(seen)] if client_id not in seen][:limit]
+
+
+def search_clients(query, limit=SEARCH_RESULT_LIMIT):
+    """
+    Return the ids of the clients matching a search-box query, best first.
+
+    A query made of digits (and phone punctuation) looks up phones: phones
+    starting with it, then containing it. Anything else matches names by
+    words, accents and case ignored: names starting with the query, then
+    names with a later word starting with its first word, then any name
+    (or, for a single word, email) containing every word. Terms shorter
+    than MIN_TRIGRAM_LENGTH are prefix matches only.
+
+    Ranking is done by tiers, each fetched with its own limit and stopping
+    once ``limit`` ids are found, so a common name costs the same as a rare
+    one: the prefix tiers are ordered range scans, the others stop at the
+    first matches in the trigram index (in id order).
+    """
+    from .models import Client
+
+    clients = Client.objects.all()
+    if _PHONE_QUERY.match(query):
+        digits = _NON_DIGITS.sub('', query)
+        if not digits:
+            return []
+        tiers = [(_range_prefix('phone', digits), ('phone', 'id'), None)]
+        if len(digits) >= MIN_TRIGRAM_LENGTH:
+            tiers.append((phone_condition(digits), ('id',), _fts_phrases('phone', [digits])))
+    else:
+        normalized = normalize_search_text(query)
+        words = normalized.split()
+        if not words:
+            return []
+        tiers = [(_name_prefix(normalized), ('search_name', 'id'), None)]
+        if len(normalized) >= MIN_TRIGRAM_LENGTH:
+            first, rest = f' {words[0]}', words[1:]
+            tiers.append((
+                _contains('search_name', first) & name_condition(' '.join(rest)),
+                ('id',),
+                _fts_phrases('search_name', [first, *rest]),
+            ))
+            if len(words) == 1:
+                email = query.strip()
+                tiers.append((
+                    name_condition(normalized) | email_condition(email),
+                    ('id',),
+                    '(%s) OR (%s)' % (_fts_phrases('search_name', words), _fts_phrases('email', [email])),
+                ))
+            else:
+                tiers.append((name_condition(normalized), ('id',), _fts_phrases('search_name', words)))
+
+    ids = []
+    for condition, ordering, fts_expression in tiers:
+        remaining = limit - len(ids)
+        if remaining <= 0:
+            break
+        seen = set(ids)
+        if fts_expression is not None and _uses_fts():
+            # Straight from the FTS table, which can stop at the first matches
+            ids += [
+                client_id for client_id in _fts_rowids(fts_expression, remaining + len(seen))
+                if client_id not in seen
+            ][:remaining]
+        else:
+            ids += _tier_ids(clients, condition, ordering, remaining, seen)
+    return ids
+
+
+def search_limit(value):
+    """The number of results to return for a ``limit`` query parameter"""
+    try:
+        return max(1, min(int(value), MAX_SEARCH_RESULT_LIMIT))
+    except (TypeError, ValueError):
+        return SEARCH_RESULT_LIMIT
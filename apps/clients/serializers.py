@@ -9,20 +9,15 @@ class ClientSerializer(serializers.ModelSerializer):
     
     def get_appointments_count(self, obj):
         """Get total number of appointments for this client"""
-        # Use prefetched data if available to avoid N+1 queries
-        if hasattr(obj, '_prefetched_objects_cache') and 'appointments' in obj._prefetched_objects_cache:
-            return len(obj._prefetched_objects_cache['appointments'])
+        # Use the aggregate annotated by the viewset querysets (with_appointment_stats)
+        if hasattr(obj, 'appointments_total'):
+            return obj.appointments_total
         return obj.appointments.count()
     
     def get_last_appointment(self, obj):
         """Get the date of the last appointment"""
-        # Use prefetched data if available
-        if hasattr(obj, '_prefetched_objects_cache') and 'appointments' in obj._prefetched_objects_cache:
-            appointments = obj._prefetched_objects_cache['appointments']
-            if appointments:
-                last_apt = max(appointments, key=lambda x: x.appointment_date)
-                return last_apt.appointment_date
-            return None
+        if hasattr(obj, 'last_appointment_date'):
+            return obj.last_appointment_date
         
         last_appointment = obj.appointments.order_by('-appointment_date').first()
         return last_appointment.appointment_date if last_appointment else None
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_generation
+from .models import Client
+from .registrations import REGISTRATION_FIELDS, apply_registration_changes, registration_state
+
+
+@receiver(pre_save, sender=Client)
+def _cache_previous_registration(sender, instance, update_fields=None, **kwargs):
+    instance._previous_registration = None
+    if not instance.pk or (update_fields is not None and not REGISTRATION_FIELDS.intersection(update_fields)):
+        return
+    instance._previous_registration = (
+        Client.objects.filter(pk=instance.pk).values_list("created_at", "gender").first()
+    )
+
+
+@receiver(post_save, sender=Client)
+def update_registration_counts_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not REGISTRATION_FIELDS.intersection(update_fields):
+        return
+    previous = getattr(instance, "_previous_registration", None)
+    removed = [registration_state(*previous)] if previous else []
+    added = [registration_state(instance.created_at, instance.gender)]
+    if removed != added:
+        apply_registration_changes(removed=removed, added=added)
+
+
+@receiver(post_delete, sender=Client)
+def update_registration_counts_on_delete(sender, instance, **kwargs):
+    apply_registration_changes(removed=[registration_state(instance.created_at, instance.gender)])
+
+
+# Registered last so that cached stats are recomputed from updated counters
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def bump_clients_generation(sender, **kwargs):
+    # After the commit, so that no request caches the old rows under the new generation
+    transaction.on_commit(lambda: bump_generation("clients"))
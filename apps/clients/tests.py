@@ -1,4 +1,13 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -6,11 +15,16 @@ from django.utils import timezone
 from datetime import date, timedelta, time
 from django.core.exceptions import ValidationError
 
-from apps.clients.models import Client
+from apps.clients import importer
+from apps.clients.birthdays import next_birthday, upcoming_birthdays
+from apps.clients.models import Client, ClientRegistrationCount
+from apps.clients.registrations import rebuild_registration_counts
+from apps.clients.search import SEARCH_RESULT_LIMIT
 from apps.clients.serializers import ClientSerializer
 from apps.appointments.models import Appointment
 from apps.team.models import Team
 from apps.services.models import Service
+from core.cache import KeyLRU, versioned_key
 
 
 class ClientModelTests(TestCase):
@@ -142,12 +156,47 @@ class ClientAPITests(APITestCase):
         self.assertIn("Carlos", names)
         self.assertNotIn("Alice", names)
 
+    def test_list_clients_cursor_pagination(self):
+        url = reverse("client-list")
+        r1 = self.client.get(url, {"cursor": "", "page_size": 2})
+        self.assertEqual([c["name"] for c in r1.data["results"]], ["Alice", "Bruno"])
+        self.assertIsNotNone(r1.data["next"])
+
+        r2 = self.client.get(r1.data["next"])
+        self.assertEqual([c["name"] for c in r2.data["results"]], ["Carlos"])
+        self.assertIsNone(r2.data["next"])
+
     def test_search_action(self):
         url = reverse("client-search")
         r = self.client.get(url, {"q": "bru"})
         self.assertEqual(r.status_code, status.HTTP_200_OK)
         self.assertTrue(any(c["name"] == "Bruno" for c in r.data))
 
+    def test_search_ignores_accents_ranks_prefixes_first_and_limits(self):
+        Client.objects.create(name="José Antônio", phone="11955555555")
+        Client.objects.create(name="Maria Josefa", phone="11966666666")
+        url = reverse("client-search")
+
+        names = [c["name"] for c in self.client.get(url, {"q": "jose"}).data]
+        self.assertEqual(names, ["José Antônio", "Maria Josefa"])
+        self.assertEqual([c["name"] for c in self.client.get(url, {"q": "antonio"}).data], ["José Antônio"])
+        self.assertEqual(len(self.client.get(url, {"q": "jose", "limit": 1}).data), 1)
+
+        # Renames are picked up by the index
+        bruno = Client.objects.get(name="Bruno")
+        bruno.name = "Bruno Josué"
+        bruno.save()
+        self.assertIn("Bruno Josué", [c["name"] for c in self.client.get(url, {"q": "josue"}).data])
+
+    def test_search_by_phone_digits(self):
+        url = reverse("client-search")
+        # Short queries are prefixes, longer ones match anywhere, prefixes first
+        self.assertEqual(len(self.client.get(url, {"q": "11"}).data), 3)
+        names = [c["name"] for c in self.client.get(url, {"q": "(11) 922"}).data]
+        self.assertEqual(names, ["Bruno"])
+        names = [c["name"] for c in self.client.get(url, {"q": "3333"}).data]
+        self.assertEqual(names, ["Carlos"])
+
     def test_recent_action(self):
         url = reverse("client-recent")
         r = self.client.get(url)
@@ -177,5 +226,225 @@ class ClientAPITests(APITestCase):
         self.assertIn("monthly_registrations", r.data)
         self.assertGreaterEqual(r.data["total_clients"], 3)
 
+    def test_stats_read_registration_counters_kept_up_to_date(self):
+        url = reverse("client-stats")
+        this_month = f"{timezone.localdate():%Y-%m}"
+        # setUp backdates the clients with update(), which sends no signals
+        rebuild_registration_counts()
+        Client.objects.create(name="Dora", phone="11944444444")
+
+        with self.assertNumQueries(2):
+            data = self.client.get(url).data
+        self.assertEqual(data["total_clients"], 4)
+        self.assertEqual(data["gender_distribution"], [
+            {"gender": None, "count": 1}, {"gender": "F", "count": 1}, {"gender": "M", "count": 2},
+        ])
+        self.assertEqual(sum(row["count"] for row in data["monthly_registrations"]), 4)
+        self.assertEqual(data["monthly_registrations"][-1]["month"], this_month)
+
+        self.c2.gender = "O"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c2.save()
+            self.c3.delete()
+        data = self.client.get(url).data
+        self.assertEqual(data["total_clients"], 3)
+        self.assertEqual(
+            {row["gender"]: row["count"] for row in data["gender_distribution"]}, {None: 1, "F": 1, "O": 1}
+        )
+
+        # Saving other fields leaves the counters alone
+        counters = list(ClientRegistrationCount.objects.values_list("month", "gender", "client_count"))
+        self.c1.name = "Alice Souza"
+        self.c1.save(update_fields=["name"])
+        self.assertEqual(list(ClientRegistrationCount.objects.values_list("month", "gender", "client_count")), counters)
+
+        # The rebuild command recomputes the same counters from the clients
+        call_command("rebuild_client_registrations", stdout=StringIO())
+        self.assertCountEqual(
+            ClientRegistrationCount.objects.filter(client_count__gt=0).values_list("month", "gender", "client_count"),
+            [counter for counter in counters if counter[2]],
+        )
+
+    def test_list_reports_appointment_aggregates_in_one_query(self):
+        for day in (date(2025, 1, 10), date(2025, 3, 5), date(2025, 2, 1)):
+            Appointment.objects.create(
+                client=self.c1, team_member=self.team, appointment_date=day,
+                appointment_time=time(10, 0), status="completed",
+            )
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse("client-list"))
+        by_name = {c["name"]: c for c in resp.data}
+        self.assertEqual(by_name["Alice"]["appointments_count"], 3)
+        self.assertEqual(by_name["Alice"]["last_appointment"], date(2025, 3, 5))
+        self.assertEqual(by_name["Bruno"]["appointments_count"], 0)
+        self.assertIsNone(by_name["Bruno"]["last_appointment"])
+
+    def test_birthdays_lists_the_next_days_soonest_first(self):
+        today = timezone.localdate()
+        for name, offset in (("Dora", 20), ("Edu", 3), ("Fabi", 0), ("Gil", -1)):
+            birthday = today + timedelta(days=offset)
+            Client.objects.create(name=name, phone="11944444444", birthday=birthday.replace(year=1992))
+        url = reverse("client-birthdays")
+
+        data = self.client.get(url).data
+        self.assertEqual([c["name"] for c in data], ["Fabi", "Edu"])
+        self.assertEqual(data[1]["next_birthday"], today + timedelta(days=3))
+        self.assertEqual([c["name"] for c in self.client.get(url, {"days": 30}).data], ["Fabi", "Edu", "Dora"])
+        # The whole year comes back in order, yesterday's birthday last
+        self.assertEqual(
+            [c["name"] for c in self.client.get(url, {"days": 365}).data], ["Fabi", "Edu", "Dora", "Gil"]
+        )
+
+        # Changing a birthday moves the client
+        edu = Client.objects.get(name="Edu")
+        edu.birthday = None
+        with self.captureOnCommitCallbacks(execute=True):
+            edu.save(update_fields=["birthday"])
+        self.assertEqual([c["name"] for c in self.client.get(url).data], ["Fabi"])
+
+        self.assertEqual(self.client.get(url, {"days": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"days": 400}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upcoming_birthdays_wrap_across_new_year_and_leap_days(self):
+        for name, birthday in (
+            ("Ano Novo", date(1990, 1, 2)), ("Natal", date(1985, 12, 26)), ("Bissexto", date(1992, 2, 29)),
+        ):
+            Client.objects.create(name=name, phone="11944444444", birthday=birthday)
+
+        def names(today, days):
+            return [c.name for c in upcoming_birthdays(Client.objects.all(), today, days)]
+
+        self.assertEqual(names(date(2025, 12, 24), 14), ["Natal", "Ano Novo"])
+        self.assertEqual(names(date(2025, 12, 27), 6), ["Ano Novo"])
+        # February 29th birthdays are on the 28th in common years
+        self.assertEqual(names(date(2025, 2, 20), 8), ["Bissexto"])
+        self.assertEqual(names(date(2025, 3, 1), 5), [])
+        self.assertEqual(next_birthday(date(1992, 2, 29), date(2025, 2, 1)), date(2025, 2, 28))
+        self.assertEqual(next_birthday(date(1992, 2, 29), date(2027, 3, 1)), date(2028, 2, 29))
+
+    def test_import_csv_creates_updates_by_phone_and_reports_bad_rows(self):
+        url = reverse("client-import")
+        search, stats = reverse("client-search"), reverse("client-stats")
+        rebuild_registration_counts()
+        total = self.client.get(stats).data["total_clients"]
+        body = (
+            "name,phone,email,birthday,gender\n"
+            "Dora Lima,(11) 94444-4444,dora@example.com,1990-05-01,F\n"
+            "Bruno Costa,+55 11 92222-2222,,,\n"
+            "Sem Telefone,,,,\n"
+            "Edu,11955555555,nao-e-email,,\n"
+            "Dora Lima Souza,11944444444,,,\n"
+            ",11966666666,,,\n"
+        )
+        r = self.client.post(url, body, content_type="text/csv")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual((r.data["created"], r.data["updated"], r.data["error_count"]), (1, 1, 3))
+        self.assertEqual([error["row"] for error in r.data["errors"]], [3, 4, 6])
+        self.assertIn("email", r.data["errors"][1]["errors"])
+
+        # The later row for a phone wins; columns left empty keep their values
+        dora = Client.objects.get(phone="11944444444")
+        self.assertEqual((dora.name, dora.email, dora.birthday), ("Dora Lima Souza", "dora@example.com", date(1990, 5, 1)))
+        self.assertEqual(dora.birthday_key, 501)
+        self.c2.refresh_from_db()
+        self.assertEqual((self.c2.name, self.c2.email), ("Bruno Costa", "bruno@example.com"))
+
+        # Derived columns, counters and caches follow the bulk writes
+        self.assertEqual([c["name"] for c in self.client.get(search, {"q": "costa"}).data], ["Bruno Costa"])
+        self.assertEqual(self.client.get(stats).data["total_clients"], total + 1)
+
+        # Importing the same file again changes nothing
+        r = self.client.post(url, body, content_type="text/csv")
+        self.assertEqual((r.data["created"], r.data["updated"], r.data["unchanged"]), (0, 0, 2))
+
+    def test_import_ndjson_in_batches(self):
+        url = reverse("client-import")
+        lines = [json.dumps({"name": f"Cliente {i}", "phone": f"119000000{i:02d}"}) for i in range(5)]
+        lines.insert(2, "{not json")
+        with mock.patch("apps.clients.importer.IMPORT_BATCH_SIZE", 2), \
+                mock.patch("apps.clients.importer._upsert", wraps=importer._upsert) as upsert:
+            r = self.client.post(url + "?input=ndjson", "\n".join(lines), content_type="application/octet-stream")
+        self.assertEqual((r.data["created"], r.data["error_count"]), (5, 1))
+        self.assertEqual(upsert.call_count, 3)
+        self.assertEqual(r.data["errors"][0]["row"], 3)
+
+        r = self.client.post(url, "a,b\n", content_type="application/xml")
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        r = self.client.post(url, '{"phone": "123"}\n', content_type="application/x-ndjson")
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_clients_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+            handle.write("name,phone,gender\nFabi,11977777777,F\nCarlos Lima,(11) 93333-3333,\n")
+        self.addCleanup(os.remove, handle.name)
+
+        out = StringIO()
+        call_command("import_clients", handle.name, stdout=out)
+        self.assertIn("Created 1, updated 1", out.getvalue())
+        self.assertEqual(Client.objects.get(phone="11977777777").gender, "F")
+        self.assertEqual(Client.objects.get(pk=self.c3.pk).name, "Carlos Lima")
+
+    @override_settings(CACHE_BACKGROUND_REFRESH=False)
+    def test_stats_serves_stale_entry_while_refreshing(self):
+        url = reverse("client-stats")
+        total = self.client.get(url).data["total_clients"]
+        # bulk_create sends no signals, so the clients version stays the same
+        Client.objects.bulk_create([Client(name="Nova", phone="11900000000")])
+        rebuild_registration_counts()
+
+        # Still fresh: the cached value is served as is
+        self.assertEqual(self.client.get(url).data["total_clients"], total)
+
+        # Past the soft TTL the stale value is served once more and recomputed
+        key = versioned_key("clients", "stats")
+        _, value = cache.get(key)
+        cache.set(key, (0, value), 60)
+        self.assertEqual(self.client.get(url).data["total_clients"], total)
+        self.assertEqual(self.client.get(url).data["total_clients"], total + 1)
+
 
 # Create your tests here.
+
+    def test_client_and_appointment_writes_refresh_cached_results(self):
+        search, stats = reverse("client-search"), reverse("client-stats")
+        self.assertEqual(self.client.get(search, {"q": "alice"}).data[0]["appointments_count"], 0)
+        total = self.client.get(stats).data["total_clients"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                client=self.c1, team_member=self.team, appointment_date=date(2025, 3, 5),
+                appointment_time=time(10, 0), status="scheduled",
+            )
+        alice = self.client.get(search, {"q": "alice"}).data[0]
+        self.assertEqual(alice["appointments_count"], 1)
+        self.assertEqual(alice["last_appointment"], date(2025, 3, 5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(name="Alícia", phone="11944444444")
+        self.assertEqual(len(self.client.get(search, {"q": "alice"}).data), 1)
+        self.assertEqual(len(self.client.get(search, {"q": "alic"}).data), 2)
+        self.assertEqual(self.client.get(stats).data["total_clients"], total + 1)
+        self.assertIn("Alícia", [c["name"] for c in self.client.get(reverse("client-recent")).data])
+
+    def test_search_cache_evicts_least_recently_used_queries(self):
+        url = reverse("client-search")
+
+        def search_entry(query):
+            query_hash = hashlib.md5(query.encode()).hexdigest()
+            return cache.get(versioned_key("clients", "search", SEARCH_RESULT_LIMIT, query_hash))
+
+        with mock.patch("apps.clients.views.SEARCH_CACHE_LRU", KeyLRU(2)):
+            for query in ("ali", "bru", "ali", "car"):
+                self.client.get(url, {"q": query})
+            self.assertIsNotNone(search_entry("ali"))
+            self.assertIsNone(search_entry("bru"))
+            self.assertIsNotNone(search_entry("car"))
+
+            # Entries of a previous version are dropped once the query is used again
+            previous = versioned_key("clients", "search", SEARCH_RESULT_LIMIT, hashlib.md5(b"ali").hexdigest())
+            with self.captureOnCommitCallbacks(execute=True):
+                Client.objects.create(name="Alina", phone="11944444444")
+            self.assertEqual(len(self.client.get(url, {"q": "ali"}).data), 2)
+            self.assertIsNone(cache.get(previous))
+            self.assertIsNotNone(search_entry("ali"))
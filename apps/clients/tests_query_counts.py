@@ -0,0 +1,62 @@
+import datetime as dt
+
+import pytest
+from django.utils import timezone
+
+from apps.appointments.models import Appointment
+from apps.clients.models import Client
+
+
+@pytest.fixture
+def client_seeder(db):
+    """``seed(n)`` grows the client base to ``n`` clients named Ana, born today, with an appointment each"""
+    birthday = timezone.localdate().replace(year=1992)
+
+    def seed(n):
+        start = Client.objects.count()
+        clients = Client.objects.bulk_create([
+            Client(
+                name=f"Ana {i}", search_name=f"ana {i}", phone=f"119{i:08d}", gender="F" if i % 2 else "M",
+                birthday=birthday, birthday_key=birthday.month * 100 + birthday.day,
+            )
+            for i in range(start, n)
+        ])
+        Appointment.objects.bulk_create([
+            Appointment(
+                client=client, appointment_date=timezone.localdate() - dt.timedelta(days=1),
+                appointment_time=dt.time(9, 0), status="completed",
+            )
+            for client in clients
+        ])
+    return seed
+
+
+@pytest.mark.parametrize("url", [
+    "/api/clients/",
+    "/api/clients/?cursor=&page_size=50",
+    "/api/clients/search/?q=ana&limit=10",
+    "/api/clients/recent/",
+    "/api/clients/stats/",
+    "/api/clients/birthdays/?days=30",
+])
+def test_client_endpoints_query_count_does_not_grow_with_rows(api_client, client_seeder, queries_per_scale, url):
+    counts = queries_per_scale(client_seeder, lambda: api_client.get(url))
+    assert len(set(counts)) == 1, counts
+
+
+def test_client_retrieve_query_count_does_not_grow_with_history(api_client, client_seeder, queries_per_scale):
+    client_seeder(1)
+    client = Client.objects.get()
+
+    def seed(n):
+        start = client.appointments.count()
+        Appointment.objects.bulk_create([
+            Appointment(
+                client=client, appointment_date=timezone.localdate() - dt.timedelta(days=i),
+                appointment_time=dt.time(9, 0), status="completed",
+            )
+            for i in range(start, n)
+        ])
+
+    counts = queries_per_scale(seed, lambda: api_client.get(f"/api/clients/{client.id}/"))
+    assert len(set(counts)) == 1, counts
@@ -1,41 +1,71 @@
+import codecs
+import hashlib
+
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.db import models
 from django.db.models import Q
-from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
-from .models import Client
+from core.cache import KeyLRU, cached_value, versioned_key
+from core.pagination import KeysetPagination
+from .birthdays import (
+    DEFAULT_BIRTHDAY_WINDOW_DAYS, MAX_BIRTHDAY_WINDOW_DAYS, next_birthday, upcoming_birthdays,
+)
+from .importer import IMPORT_FORMATS, import_clients
+from .models import Client, with_appointment_stats
+from .registrations import registration_stats
+from .search import email_condition, name_condition, phone_condition, search_clients, search_limit
 from .serializers import ClientSerializer, ClientCreateUpdateSerializer
 
 
+# (soft, hard) TTLs in seconds of the cached responses: past the soft TTL the
+# entry is served stale while it is recomputed in the background
+SEARCH_CACHE_TTLS = (600, 1200)
+RECENT_CACHE_TTLS = (300, 600)
+STATS_CACHE_TTLS = (900, 1800)
+BIRTHDAYS_CACHE_TTLS = (300, 600)
+
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+# Every distinct query typed in the search box gets its own entry
+SEARCH_CACHE_LRU = KeyLRU(settings.CLIENT_SEARCH_CACHE_ENTRIES)
+
+
 class ClientViewSet(viewsets.ModelViewSet):
     queryset = Client.objects.all()  # Required for Django REST framework router
     serializer_class = ClientSerializer
+    # Only used when the client asks for it with ?cursor=
+    pagination_class = KeysetPagination
+    keyset_ordering = ('name', 'id')
     
     def get_queryset(self):
-        """Optimized queryset with efficient filtering and prefetching"""
-        # Prefetch appointments for better performance when serializing
-        queryset = Client.objects.prefetch_related('appointments')
+        """Optimized queryset with efficient filtering and appointment aggregates"""
+        # Appointment count and last date come from aggregates, so the
+        # response does not grow with each client's history
+        queryset = with_appointment_stats(Client.objects.all())
         
         # Build filters efficiently
         filters = Q()
         
-        # Filter by name
+        # Filter by name, phone and email, served by the search indexes
         name = self.request.query_params.get('name')
         if name:
-            filters &= Q(name__icontains=name)
+            filters &= name_condition(name)
             
-        # Filter by phone
         phone = self.request.query_params.get('phone')
         if phone:
-            filters &= Q(phone__icontains=phone)
+            filters &= phone_condition(phone)
             
-        # Filter by email
         email = self.request.query_params.get('email')
         if email:
-            filters &= Q(email__icontains=email)
+            filters &= email_condition(email)
             
         # Filter by gender
         gender = self.request.query_params.get('gender')
@@ -85,84 +115,100 @@ class ClientViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search clients by name or phone - optimized with caching"""
+        """
+        Search clients by name, phone or email - ranked, limited (?limit=,
+        default 20) and served by the search indexes, see search.py
+        """
         query = request.query_params.get('q', '').strip()
         if not query:
             return Response([])
-            
-        # Cache key for search results
-        cache_key = f'clients_search_{query.lower()}'
-        cached_results = cache.get(cache_key)
-        if cached_results is not None:
-            return Response(cached_results)
-        
-        # Optimized search query with prefetching
-        clients = Client.objects.filter(
-            Q(name__icontains=query) | 
-            Q(phone__icontains=query) |
-            Q(email__icontains=query)
-        ).prefetch_related('appointments').order_by('name')
-        
-        serializer = self.get_serializer(clients, many=True)
-        
-        # Cache for 10 minutes
-        cache.set(cache_key, serializer.data, 600)
-        return Response(serializer.data)
+        limit = search_limit(request.query_params.get('limit'))
+
+        def compute():
+            # Rank and limit first, then aggregate the appointments of the
+            # returned clients only
+            ids = search_clients(query, limit)
+            clients = with_appointment_stats(Client.objects.filter(id__in=ids)).in_bulk()
+            return self.get_serializer([clients[client_id] for client_id in ids], many=True).data
+
+        # The clients namespace is bumped by client and appointment writes
+        # (see signals.py), so results never outlive the data they show
+        query_hash = hashlib.md5(query.lower().encode()).hexdigest()
+        data = cached_value(
+            versioned_key('clients', 'search', limit, query_hash), compute, *SEARCH_CACHE_TTLS, lru=SEARCH_CACHE_LRU
+        )
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Get recently created clients - optimized with caching"""
-        cache_key = 'clients_recent'
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        # Get clients created in the last 30 days with prefetching
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_clients = Client.objects.filter(
-            created_at__gte=thirty_days_ago
-        ).prefetch_related('appointments').order_by('-created_at')[:20]
-        
-        serializer = self.get_serializer(recent_clients, many=True)
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, serializer.data, 300)
-        return Response(serializer.data)
+        def compute():
+            # Get clients created in the last 30 days with appointment aggregates
+            thirty_days_ago = timezone.now() - timedelta(days=30)
+            recent_clients = with_appointment_stats(Client.objects.filter(
+                created_at__gte=thirty_days_ago
+            )).order_by('-created_at')[:20]
+            return self.get_serializer(recent_clients, many=True).data
+
+        return Response(cached_value(versioned_key('clients', 'recent'), compute, *RECENT_CACHE_TTLS))
     
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def bulk_import(self, request):
+        """
+        Import clients from the request body, CSV with a header line or
+        NDJSON (from the Content-Type, or ?input=csv|ndjson): new phones
+        are created, known ones updated. The body is read as a stream and
+        written in batches, see importer.py. Rows with errors are reported
+        by their number and skipped.
+        """
+        input_format = request.query_params.get('input') or IMPORT_CONTENT_TYPES.get(
+            request.content_type.split(';')[0].strip()
+        )
+        if input_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': 'Formato de importação inválido. Envie text/csv ou application/x-ndjson'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = import_clients(codecs.iterdecode(request.stream or [], 'utf-8-sig'), input_format)
+        imported = result.created or result.updated or result.unchanged
+        return Response(
+            result.as_dict(),
+            status=status.HTTP_200_OK if imported else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, methods=['get'])
+    def birthdays(self, request):
+        """
+        Clients whose birthday falls in the next ?days= days (default 14,
+        today included), soonest first - a range scan on birthday_key, see
+        birthdays.py
+        """
+        try:
+            days = int(request.query_params.get('days', DEFAULT_BIRTHDAY_WINDOW_DAYS))
+        except ValueError:
+            return Response(
+                {'error': 'O número de dias (days) deve ser um inteiro'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 <= days <= MAX_BIRTHDAY_WINDOW_DAYS:
+            return Response(
+                {'error': f'O número de dias (days) deve estar entre 0 e {MAX_BIRTHDAY_WINDOW_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        today = timezone.localdate()
+
+        def compute():
+            clients = list(with_appointment_stats(upcoming_birthdays(Client.objects.all(), today, days)))
+            return [
+                {**data, 'next_birthday': next_birthday(client.birthday, today)}
+                for client, data in zip(clients, self.get_serializer(clients, many=True).data)
+            ]
+
+        return Response(cached_value(versioned_key('clients', 'birthdays', today, days), compute, *BIRTHDAYS_CACHE_TTLS))
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get client statistics - optimized with caching"""
-        cache_key = 'clients_stats'
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
-        
-        # Calculate statistics efficiently
-        from django.db.models import Count
-        
-        total_clients = Client.objects.count()
-        
-        # Gender distribution
-        gender_stats = Client.objects.values('gender').annotate(
-            count=Count('gender')
-        ).order_by('gender')
-        
-        # Clients by month (last 12 months)
-        twelve_months_ago = timezone.now() - timedelta(days=365)
-        monthly_stats = Client.objects.filter(
-            created_at__gte=twelve_months_ago
-        ).extra(
-            select={'month': "strftime('%%Y-%%m', created_at)"}
-        ).values('month').annotate(
-            count=Count('id')
-        ).order_by('month')
-        
-        stats_data = {
-            'total_clients': total_clients,
-            'gender_distribution': list(gender_stats),
-            'monthly_registrations': list(monthly_stats)
-        }
-        
-        # Cache for 15 minutes
-        cache.set(cache_key, stats_data, 900)
-        return Response(stats_data)
+        """Get client statistics, read from the registration counters (see registrations.py)"""
+        return Response(cached_value(versioned_key('clients', 'stats'), registration_stats, *STATS_CACHE_TTLS))
+
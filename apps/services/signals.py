@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import bump_generation
+from .models import Service
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def bump_services_generation(sender, **kwargs):
+    bump_generation("services")
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import models
+from core.conditional import conditional_on
 from .models import Service
 from .serializers import ServiceSerializer, ServiceCreateUpdateSerializer
 
@@ -15,6 +16,10 @@ class ServiceViewSet(viewsets.ModelViewSet):
             return ServiceCreateUpdateSerializer
         return ServiceSerializer
     
+    @conditional_on('services')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         """Create a new service and return full service data"""
         serializer = self.get_serializer(data=request.data)
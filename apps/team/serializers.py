@@ -42,6 +42,9 @@ class TeamListSerializer(serializers.ModelSerializer):
     formatted_phone = serializers.CharField(read_only=True)
     
     def get_specialties_count(self, obj):
+        # Use prefetched specialties if available to avoid one query per member
+        if hasattr(obj, '_prefetched_objects_cache') and 'specialties' in obj._prefetched_objects_cache:
+            return len(obj._prefetched_objects_cache['specialties'])
         return obj.specialties.count()
     
     class Meta:
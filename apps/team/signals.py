@@ -0,0 +1,12 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import bump_generation
+from .models import Team
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(m2m_changed, sender=Team.specialties.through)
+def bump_team_generation(sender, **kwargs):
+    bump_generation("team")
@@ -0,0 +1,40 @@
+import pytest
+from django.utils import timezone
+
+from apps.services.models import Service
+from apps.team.models import Team
+
+
+@pytest.fixture
+def team_seeder(db):
+    """``seed(n)`` grows the team to ``n`` active members, each offering two services"""
+    services = [
+        Service.objects.create(name=name, service_type="cabelo", duration_minutes=30, price="50.00")
+        for name in ("Corte", "Escova")
+    ]
+
+    def seed(n):
+        start = Team.objects.count()
+        members = Team.objects.bulk_create([
+            Team(name=f"Profissional {i}", phone="11988888888", hire_date=timezone.localdate())
+            for i in range(start, n)
+        ])
+        Team.specialties.through.objects.bulk_create([
+            Team.specialties.through(team_id=member.id, service_id=service.id)
+            for member in members
+            for service in services
+        ])
+
+    seed.services = services
+    return seed
+
+
+def test_team_list_query_count_does_not_grow_with_members(api_client, team_seeder, queries_per_scale):
+    counts = queries_per_scale(team_seeder, lambda: api_client.get("/api/team/"))
+    assert len(set(counts)) == 1, counts
+
+
+def test_available_for_service_query_count_does_not_grow_with_members(api_client, team_seeder, queries_per_scale):
+    url = f"/api/team/available_for_service/?service_id={team_seeder.services[0].id}"
+    counts = queries_per_scale(team_seeder, lambda: api_client.get(url))
+    assert len(set(counts)) == 1, counts
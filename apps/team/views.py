@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import models
+from core.conditional import conditional_on
 from .models import Team
 from .serializers import TeamSerializer, TeamCreateUpdateSerializer, TeamListSerializer
 
@@ -17,6 +18,11 @@ class TeamViewSet(viewsets.ModelViewSet):
         # This is needed for appointments modal to filter services by team member specialties
         return TeamSerializer
     
+    # Team members are listed with their specialties, hence the services version
+    @conditional_on('team', 'services')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         """Create a new team member and return full team data"""
         serializer = self.get_serializer(data=request.data)
@@ -51,7 +57,7 @@ class TeamViewSet(viewsets.ModelViewSet):
             team_members = Team.objects.filter(
                 specialties__id=service_id,
                 is_active=True
-            ).distinct()
+            ).distinct().prefetch_related('specialties')
             serializer = TeamListSerializer(team_members, many=True)
             return Response(serializer.data)
         return Response([])
@@ -1,5 +1,10 @@
 import datetime as dt
+import uuid
+
 import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from rest_framework.test import APIClient
 
 from apps.services.models import Service
@@ -7,6 +12,34 @@ from apps.clients.models import Client
 from apps.team.models import Team
 
 
+@pytest.fixture(scope="session", autouse=True)
+def private_cache():
+    # The configured cache (the on-disk one by default) is shared with the dev
+    # server, deploys and other test runs; tests get their own in-memory one
+    caches = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": f"tests-{uuid.uuid4().hex}",
+        }
+    }
+    with override_settings(CACHES=caches):
+        yield
+
+
+@pytest.fixture(scope="session")
+def django_db_setup(private_cache, django_db_setup):
+    # Migrations run against the private cache too
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(private_cache):
+    # Start every test from an empty cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -51,3 +84,31 @@ def team_factory(db):
         defaults.update(kwargs)
         return Team.objects.create(**defaults)
     return make_team
+
+
+# Row counts the query-count tests seed the database with
+QUERY_COUNT_SCALES = (10, 100, 1000)
+
+
+@pytest.fixture
+def queries_per_scale(db):
+    """
+    Return a function that grows the data with ``seed(n)`` to each of
+    QUERY_COUNT_SCALES rows, runs ``request()`` on an empty cache and returns
+    the number of queries it made at each scale. An endpoint without N+1
+    queries makes the same number at every scale.
+    """
+    def measure(seed, request):
+        counts = []
+        # Unmeasured first request, for the once-per-process lookups
+        seed(QUERY_COUNT_SCALES[0])
+        request()
+        for n in QUERY_COUNT_SCALES:
+            seed(n)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            assert response.status_code == 200, response.content
+            counts.append(len(queries))
+        return counts
+    return measure
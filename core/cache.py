@@ -0,0 +1,322 @@
+"""
+Cache helpers shared by the API viewsets.
+
+Cached entries are grouped into namespaces (``appointments``, ``clients``...).
+Each namespace has a generation counter stored in the shared cache and every
+key built with ``versioned_key`` embeds the current generation, so bumping the
+counter invalidates the whole namespace for every worker at once without
+having to track which keys exist.
+
+``cached_value`` adds server-side stale-while-revalidate on top: entries carry
+a soft TTL after which they are still served, while a background thread
+recomputes them, and a hard TTL after which the cache drops them. Misses are
+single-flight: one request per key computes the value while the others wait
+for it, or get the value stored before the last invalidation. Threads of a
+worker share an in-process event; workers take a ``cache.add`` lock, which
+only excludes them all when the backend's ``add`` is atomic, as with the Redis
+backend selected through CACHE_URL. The default file-based cache
+checks for the key and then writes it, so two workers missing the same key
+at the same moment may both compute it: the duplicated work is the only
+cost, since they store the same value. The same applies to the lock that
+keeps a stale entry from being refreshed by several workers. Hits,
+misses, computations and invalidations are exported as Prometheus metrics
+(see core.metrics).
+
+Families with an unbounded set of keys (one per search query) pass a
+``KeyLRU`` to ``cached_value``, which deletes the least recently used of
+them once there are more than its ``max_entries``.
+"""
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .metrics import (
+    CACHE_COMPUTE_SECONDS, CACHE_HITS, CACHE_INVALIDATIONS, CACHE_MISSES, CACHE_PAYLOAD_BYTES, CACHE_SETS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+GENERATION_KEY = 'generation:{}'
+REFRESH_LOCK_KEY = 'refreshing:{}'
+COMPUTE_LOCK_KEY = 'computing:{}'
+LATEST_KEY = '{}:latest:{}'
+COMPUTE_LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+MAX_KEY_SUFFIX_LENGTH = 200
+
+
+def _clock_generation():
+    # Generations are seeded from the clock so that a counter evicted from the
+    # cache never restarts at a value some stale entry was stored under.
+    return time.time_ns() // 1000
+
+
+def get_generation(namespace):
+    """Return the current generation of a namespace, creating it if needed."""
+    key = GENERATION_KEY.format(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _clock_generation(), None)
+        generation = cache.get(key)
+    return generation if generation is not None else _clock_generation()
+
+
+def bump_generation(*namespaces):
+    """Invalidate every entry stored under the given namespaces."""
+    for namespace in namespaces:
+        key = GENERATION_KEY.format(namespace)
+        current = cache.get(key) or 0
+        cache.set(key, max(current + 1, _clock_generation()), None)
+        CACHE_INVALIDATIONS.labels(namespace).inc()
+
+
+def normalize_query_params(query_params, exclude=()):
+    """
+    Encode query parameters in a canonical order so that ``?a=1&b=2`` and
+    ``?b=2&a=1`` map to the same cache entry.
+    """
+    items = sorted(
+        (key, value)
+        for key in query_params
+        if key not in exclude
+        for value in query_params.getlist(key)
+    )
+    return urlencode(items)
+
+
+def versioned_key(namespace, *parts):
+    """Build a cache key bound to the current generation of ``namespace``."""
+    suffix = ':'.join(str(part) for part in parts)
+    if len(suffix) > MAX_KEY_SUFFIX_LENGTH:
+        suffix = hashlib.md5(suffix.encode()).hexdigest()
+    return f'{namespace}:{get_generation(namespace)}:{suffix}'
+
+
+def _latest_key(key):
+    """
+    Key holding the last value computed for a ``versioned_key``, whatever its
+    generation, or None for unversioned keys.
+    """
+    parts = key.split(':', 2)
+    if len(parts) == 3 and parts[1].isdigit():
+        return LATEST_KEY.format(parts[0], parts[2])
+    return None
+
+
+def key_family(key):
+    """
+    Metrics label of a key: ``<namespace>_<first part>`` for a
+    ``versioned_key`` (``appointments_today``), the key itself otherwise.
+    """
+    parts = key.split(':', 2)
+    if len(parts) == 3 and parts[1].isdigit():
+        return f"{parts[0]}_{parts[2].split(':', 1)[0]}"
+    return key
+
+
+def _instrumented(compute, family):
+    def timed_compute():
+        started = time.perf_counter()
+        value = compute()
+        CACHE_COMPUTE_SECONDS.labels(family).observe(time.perf_counter() - started)
+        CACHE_PAYLOAD_BYTES.labels(family).observe(len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        CACHE_SETS.labels(family).inc()
+        return value
+    return timed_compute
+
+
+# Set when cached_value answered with a value from before the last
+# invalidation, so that callers do not label it with the current version
+served_previous = ContextVar('served_previous', default=False)
+
+
+# Keys being refreshed by this process, so one stale entry starts one thread
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _store(key, value, soft_ttl, hard_ttl):
+    cache.set(key, (time.time() + soft_ttl, value), hard_ttl)
+    latest = _latest_key(key)
+    if latest:
+        cache.set(latest, value, hard_ttl)
+    return value
+
+
+def _cached_entry(key):
+    entry = cache.get(key)
+    if isinstance(entry, tuple) and len(entry) == 2:
+        return entry
+    return None
+
+
+def _refresh(key, compute, soft_ttl, hard_ttl, background):
+    try:
+        _store(key, compute(), soft_ttl, hard_ttl)
+    except Exception:
+        logger.exception('Background refresh of %s failed', key)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY.format(key))
+        with _refreshing_lock:
+            _refreshing.discard(key)
+        if background:
+            # The thread opened its own database connections
+            connections.close_all()
+
+
+def _schedule_refresh(key, compute, soft_ttl, hard_ttl):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    # Only one worker across processes refreshes a given entry
+    if not cache.add(REFRESH_LOCK_KEY.format(key), 1, max(soft_ttl, 30)):
+        with _refreshing_lock:
+            _refreshing.discard(key)
+        return
+
+    if settings.CACHE_BACKGROUND_REFRESH:
+        threading.Thread(
+            target=_refresh, args=(key, compute, soft_ttl, hard_ttl, True), daemon=True
+        ).start()
+    else:
+        _refresh(key, compute, soft_ttl, hard_ttl, False)
+
+
+# Keys being computed by this process, and the event their waiters block on
+_computing = {}
+_computing_lock = threading.Lock()
+
+
+def _wait_for_entry(key, timeout):
+    """Poll the cache until another worker stores ``key`` or ``timeout`` passes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _cached_entry(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _fallback(key, compute, soft_ttl, hard_ttl):
+    """
+    The wait for another computation timed out: serve the value stored before
+    the last invalidation if there is one, otherwise compute it here.
+    """
+    latest = _latest_key(key)
+    previous = cache.get(latest) if latest else None
+    if previous is not None:
+        served_previous.set(True)
+        return previous
+    return _store(key, compute(), soft_ttl, hard_ttl)
+
+
+def _compute_once(key, compute, soft_ttl, hard_ttl):
+    with _computing_lock:
+        event = _computing.get(key)
+        leader = event is None
+        if leader:
+            event = _computing[key] = threading.Event()
+
+    if not leader:
+        event.wait(settings.CACHE_SINGLE_FLIGHT_WAIT)
+        entry = _cached_entry(key)
+        if entry is not None:
+            return entry[1]
+        return _fallback(key, compute, soft_ttl, hard_ttl)
+
+    try:
+        # Excludes the other workers only on backends with an atomic add
+        lock_key = COMPUTE_LOCK_KEY.format(key)
+        if cache.add(lock_key, 1, COMPUTE_LOCK_TIMEOUT):
+            try:
+                return _store(key, compute(), soft_ttl, hard_ttl)
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is computing it
+        entry = _wait_for_entry(key, settings.CACHE_SINGLE_FLIGHT_WAIT)
+        if entry is not None:
+            return entry[1]
+        return _fallback(key, compute, soft_ttl, hard_ttl)
+    finally:
+        with _computing_lock:
+            del _computing[key]
+        event.set()
+
+
+class KeyLRU:
+    """
+    Recency of the keys of one family in this process. Keys of different
+    generations of the same ``versioned_key`` share a slot, so an entry left
+    behind by an invalidation is deleted as soon as its successor is used.
+    Evicting a slot deletes its entry and the value kept for fallbacks (see
+    ``_latest_key``). Each worker tracks the keys it used, so the cache holds
+    at most ``max_entries`` of the family per worker.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, key):
+        """Mark ``key`` as used and delete the entries it pushed out of the cache"""
+        # Versioned keys are tracked under their fallback key, which is
+        # the same for every generation
+        slot = _latest_key(key) or key
+        stale = []
+        with self._lock:
+            previous = self._keys.pop(slot, None)
+            if previous is not None and previous != key:
+                stale.append(previous)
+            self._keys[slot] = key
+            while len(self._keys) > self.max_entries:
+                evicted_slot, evicted = self._keys.popitem(last=False)
+                stale.append(evicted)
+                if evicted_slot != evicted:
+                    stale.append(evicted_slot)
+        if stale:
+            cache.delete_many(stale)
+
+
+def cached_value(key, compute, soft_ttl, hard_ttl, family=None, lru=None):
+    """
+    Return the value cached under ``key``, computing and storing it with
+    ``compute()`` on a miss. Once older than ``soft_ttl`` seconds the cached
+    value is still returned right away, and a background thread recomputes
+    it; after ``hard_ttl`` seconds it is gone and the next call computes it.
+
+    Only one caller computes a missing key at a time. Concurrent callers wait
+    up to CACHE_SINGLE_FLIGHT_WAIT seconds for its result, then fall back to
+    the value of the key's previous generation (flagging ``served_previous``)
+    or, when there is none, compute it themselves.
+
+    Hits, misses and computations are counted under ``family`` (by default
+    derived from the key, see ``key_family``). With an ``lru`` (a ``KeyLRU``)
+    the use of ``key`` is recorded there, which may evict other keys.
+    """
+    family = family or key_family(key)
+    if lru is not None:
+        lru.touch(key)
+    compute = _instrumented(compute, family)
+    entry = _cached_entry(key)
+    if entry is not None:
+        CACHE_HITS.labels(family).inc()
+        fresh_until, value = entry
+        if time.time() >= fresh_until:
+            _schedule_refresh(key, compute, soft_ttl, hard_ttl)
+        return value
+    CACHE_MISSES.labels(family).inc()
+    return _compute_once(key, compute, soft_ttl, hard_ttl)
@@ -0,0 +1,79 @@
+"""
+Conditional GET for read endpoints.
+
+A response's validators are derived from the generation counters of the
+cache namespaces it is built from (see core.cache): the ETag hashes those
+generations with the URL, and Last-Modified is the time of the latest bump,
+since generations are seeded from a microsecond clock. Both are known from a
+couple of cache reads, so a client that already has the current version
+gets its 304 before any database access or serialization. Responses built
+from a value of a previous generation (see ``cached_value``) get no
+validators.
+"""
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_generation, normalize_query_params, served_previous
+
+
+# Clients may keep responses but must revalidate them on every use, which is
+# a cheap 304 as long as nothing changed
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+
+def version_validators(request, namespaces, daily=False):
+    """
+    Return the (ETag, Last-Modified timestamp) of a response. ``daily``
+    responses also depend on the current date, so they change at midnight
+    even without writes.
+    """
+    generations = [get_generation(namespace) for namespace in namespaces]
+    last_modified = max(generations) // 1_000_000
+    fingerprint = [request.path, normalize_query_params(request.query_params), *map(str, generations)]
+    if daily:
+        today = timezone.localdate()
+        midnight = timezone.make_aware(datetime.combine(today, time.min))
+        last_modified = max(last_modified, int(midnight.timestamp()))
+        fingerprint.append(str(today))
+    etag = '"%s"' % hashlib.md5('|'.join(fingerprint).encode()).hexdigest()
+    return etag, last_modified
+
+
+def _stamp(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response
+
+
+def conditional_on(*namespaces, daily=False):
+    """
+    Decorate a view method so that it answers 304 Not Modified when the
+    request's If-None-Match / If-Modified-Since still match the data version
+    of ``namespaces``, and stamps ETag, Last-Modified and Cache-Control on
+    the responses it does produce.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = version_validators(request, namespaces, daily)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return _stamp(not_modified, etag, last_modified)
+
+            served_previous.set(False)
+            response = method(self, request, *args, **kwargs)
+            if served_previous.get():
+                # Built before the last write: it must not be remembered
+                # under the current version
+                response['Cache-Control'] = 'no-cache'
+            elif response.status_code == 200:
+                _stamp(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
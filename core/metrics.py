@@ -0,0 +1,42 @@
+"""
+Application metrics exported on /metrics next to django_prometheus' own.
+
+Cache metrics are labelled by key family: the namespace and first part of a
+``versioned_key`` (``appointments_today``, ``appointments_stats``...) or the
+family passed to ``cached_value``, never the full key, to keep the label
+cardinality bounded. Invalidations are per namespace, as generation bumps are.
+Database metrics (see core.middleware) are labelled by view.
+"""
+from prometheus_client import Counter, Histogram
+
+
+CACHE_HITS = Counter(
+    'salon_cache_hits_total', 'Cached values served, fresh or stale', ['family']
+)
+CACHE_MISSES = Counter(
+    'salon_cache_misses_total', 'Cache lookups that found no entry', ['family']
+)
+CACHE_SETS = Counter(
+    'salon_cache_sets_total', 'Values computed and stored in the cache', ['family']
+)
+CACHE_INVALIDATIONS = Counter(
+    'salon_cache_invalidations_total', 'Generation bumps invalidating a namespace', ['family']
+)
+CACHE_COMPUTE_SECONDS = Histogram(
+    'salon_cache_compute_seconds', 'Time spent computing a value to cache', ['family']
+)
+CACHE_PAYLOAD_BYTES = Histogram(
+    'salon_cache_payload_bytes', 'Pickled size of the values stored in the cache', ['family'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+DB_QUERIES = Histogram(
+    'salon_db_queries_per_request', 'SQL queries run by a request', ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_TIME_SECONDS = Histogram(
+    'salon_db_time_seconds', 'Total database time of a request', ['view']
+)
+DB_SLOWEST_QUERY_SECONDS = Histogram(
+    'salon_db_slowest_query_seconds', 'Duration of the slowest statement of a request', ['view']
+)
@@ -0,0 +1,131 @@
+"""
+Per-view database instrumentation.
+
+``QueryMetricsMiddleware`` wraps every query of a request (through
+``connection.execute_wrapper``) to count them and time them, and exports
+the query count, total database time and slowest statement of the request
+as Prometheus histograms labelled by view: ``<resource>.<action>`` for DRF
+viewsets (``appointments.available_slots``, ``clients.list``), the module
+and function name otherwise.
+
+The per-query cost is a counter and two clock reads. The SQL text is only
+kept for the requests picked by DB_SLOW_LOG_SAMPLE_RATE; those are logged
+with their normalized statements when their database time exceeds
+DB_SLOW_REQUEST_MS, so repeated per-row queries stand out.
+"""
+import logging
+import random
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import DB_QUERIES, DB_SLOWEST_QUERY_SECONDS, DB_TIME_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+
+UNRESOLVED_VIEW = 'unresolved'
+LOGGED_STATEMENTS = 5
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Replace literals and parameter lists by placeholders so that per-row queries group together"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _snake_case(name):
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+@lru_cache(maxsize=None)
+def view_label(view_func, method):
+    """
+    ``<resource>.<action>`` for a DRF viewset: the resource is the app label
+    (``appointments``) unless the viewset is named after something else
+    (``appointment_series``). ``<module>.<function>`` for other views.
+    """
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if cls is not None and actions:
+        app_label = cls.__module__.split('.')[-2]
+        resource = _snake_case(cls.__name__.removesuffix('ViewSet'))
+        if resource.rstrip('s') == app_label.rstrip('s'):
+            resource = app_label
+        return f"{resource}.{actions.get(method.lower(), method.lower())}"
+    if cls is not None:
+        return f"{cls.__module__.split('.')[-2]}.{_snake_case(cls.__name__)}"
+    module = view_func.__module__.split('.')
+    return f"{module[-2] if len(module) > 1 else module[0]}.{view_func.__name__}"
+
+
+class QueryRecorder:
+    def __init__(self, keep_sql):
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+        self.statements = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            if elapsed > self.slowest:
+                self.slowest = elapsed
+                self.slowest_sql = sql
+            if self.keep_sql:
+                self.statements.append(sql)
+
+
+class QueryMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = settings.DB_SLOW_LOG_SAMPLE_RATE
+        recorder = QueryRecorder(keep_sql=sample_rate > 0 and random.random() < sample_rate)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        view = getattr(request, '_metrics_view', UNRESOLVED_VIEW)
+        DB_QUERIES.labels(view).observe(recorder.count)
+        DB_TIME_SECONDS.labels(view).observe(recorder.total)
+        DB_SLOWEST_QUERY_SECONDS.labels(view).observe(recorder.slowest)
+        if recorder.keep_sql and recorder.total * 1000 >= settings.DB_SLOW_REQUEST_MS:
+            self._log_slow_request(request, view, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_label(view_func, request.method)
+
+    def _log_slow_request(self, request, view, recorder):
+        repeated = Counter(normalize_sql(sql) for sql in recorder.statements).most_common(LOGGED_STATEMENTS)
+        logger.warning(
+            'Slow request %s %s (%s): %d queries, %.1f ms in the database, slowest %.1f ms: %s\n%s',
+            request.method,
+            request.path,
+            view,
+            recorder.count,
+            recorder.total * 1000,
+            recorder.slowest * 1000,
+            normalize_sql(recorder.slowest_sql or ''),
+            '\n'.join(f'  {count}x {sql}' for sql, count in repeated),
+        )
@@ -0,0 +1,115 @@
+"""
+Opt-in keyset (cursor) pagination.
+
+List endpoints stay unpaginated unless the client sends a ``cursor`` query
+parameter (empty for the first page). Each page continues strictly after the
+last row of the previous one over the view's ``keyset_ordering``, so fetching
+page N costs the same as fetching page 1 and no COUNT(*) is ever issued.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return None
+
+        self.request = request
+        self.ordering = tuple(view.keyset_ordering)
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_keyset_filter(self, position):
+        """
+        Expand ``(a, b, c) > (x, y, z)`` into ORed prefix comparisons. The
+        leading ``a >= x`` bound lets the database start an index range scan
+        at the cursor instead of evaluating the disjunction from the start.
+        """
+        keyset = Q()
+        for index, field in enumerate(self.ordering):
+            clause = Q(**{f'{field}__gt': position[index]})
+            for previous_field, previous_value in zip(self.ordering[:index], position[:index]):
+                clause &= Q(**{previous_field: previous_value})
+            keyset |= clause
+        return Q(**{f'{self.ordering[0]}__gte': position[0]}) & keyset
+
+    def decode_cursor(self, request, model):
+        """
+        The cursor's position, each value converted by its ordering field so
+        a tampered cursor is rejected here rather than by the database.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        values = []
+        for field_name, value in zip(self.ordering, position):
+            if isinstance(value, bool) or not isinstance(value, (str, int)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                values.append(model._meta.get_field(field_name).to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, instance):
+        position = [getattr(instance, field) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(position, default=str).encode()).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }